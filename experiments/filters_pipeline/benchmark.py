@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the original `generic` filter evaluation (one component at a time, solving the field names and walking the
+options for each component) against the compiled filters applied to the whole list, with the results memoized across
+outputs. Also checks both get the same results.
+
+We simulate a project with many components and a group of outputs using the same filters, like the fabrication
+outputs of a big project.
+
+Usage: benchmark.py [COMPONENTS] [OUTPUTS]
+"""
+import os
+import random
+import sys
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.mcpyrate import activate  # noqa: F401, E402
+from kibot.gs import GS  # noqa: E402
+GS.ki5 = False
+GS.ki6 = GS.ki7 = GS.ki8 = True
+GS.kicad_version_n = 8000000
+from kibot import log  # noqa: E402
+log.init()
+from kibot.fil_base import BaseFilter, reset_filters, apply_exclude_filter, apply_fitted_filter, _memo  # noqa: E402
+from kibot.kicad.v5_sch import SchematicComponent, SchematicField  # noqa: E402
+from kibot.optionable import Optionable  # noqa: E402
+from kibot.registrable import RegOutput  # noqa: E402
+import kibot.fil_generic  # noqa: F401, E402
+FILTERS = [{'name': 'no_tp', 'type': 'generic', 'exclude_refs': ['TP*', 'FID*'], 'exclude_not_on_board': True,
+            'exclude_any': [{'column': 'Footprint', 'regex': 'test.*point'}, {'column': 'Value', 'regex': '^DNI'}]},
+           {'name': 'only_lcsc', 'type': 'generic', 'include_only': [{'column': 'LCSC#', 'regex': r'^C\d+'}],
+            'keys': ['no_asm', 'dnf'], 'exclude_field': True, 'exclude_config': True, 'config_field': 'Config'}]
+PREFIXES = ['R', 'C', 'L', 'U', 'D', 'Q', 'J', 'TP', 'FID', '#PWR']
+
+
+def old_match(c, regs):
+    for reg in regs:
+        reg.column = Optionable.solve_field_name(reg.column)
+        if reg.skip_if_no_field and not c.is_field(reg.column):
+            continue
+        if reg.match_if_field and c.is_field(reg.column):
+            return True
+        if reg.match_if_no_field and not c.is_field(reg.column):
+            return True
+        res = reg.regex.search(c.get_field_value(reg.column))
+        if reg.invert:
+            res = not res
+        if res:
+            return True
+    return False
+
+
+def old_generic(self, comp):
+    """ The original code (without the debug messages) """
+    exclude = self.invert
+    value = comp.value.strip().lower()
+    if self.exclude_empty_val and (value == '' or value == '~'):
+        return exclude
+    if self.exclude_all_hash_ref and comp.ref and comp.ref[0] == '#':
+        return exclude
+    if self.exclude_virtual and comp.virtual:
+        return exclude
+    if self.exclude_smd and comp.smd:
+        return exclude
+    if self.exclude_tht and comp.tht:
+        return exclude
+    if self.exclude_top and not comp.bottom:
+        return exclude
+    if self.exclude_bottom and comp.bottom:
+        return exclude
+    if self.exclude_not_in_bom and not (comp.in_bom and comp.in_bom_pcb):
+        return exclude
+    if self.exclude_not_on_board and not comp.on_board:
+        return exclude
+    if self.exclude_refs and (comp.ref in self.exclude_refs or comp.ref_prefix+'*' in self.exclude_refs):
+        return exclude
+    keys = list(self._keys)
+    if keys:
+        if self.exclude_value and value in keys:
+            return exclude
+        if self.exclude_field:
+            for k in keys:
+                if k in comp.dfields:
+                    return exclude
+        if self.exclude_config:
+            config = comp.get_field_value(self.config_field).strip().lower()
+            if self.config_separators:
+                for sep in self.config_separators:
+                    for opt in config.split(sep):
+                        if opt.strip() in keys:
+                            return exclude
+            elif config in keys:
+                return exclude
+    if self.include_only and not old_match(comp, self.include_only):
+        return exclude
+    if self.exclude_any and old_match(comp, self.exclude_any):
+        return exclude
+    return not exclude
+
+
+def old_filter(f, comp):
+    """ The original chain evaluation, one component at a time """
+    if hasattr(f, 'filters'):
+        return all(old_filter(s, comp) for s in f.filters)
+    if hasattr(f, '_filter'):
+        return not old_filter(f._filter, comp)
+    return old_generic(f, comp)
+
+
+def add_field(c, name, value, number=-1):
+    f = SchematicField()
+    f.name = name
+    f.value = value
+    f.number = number
+    c.add_field(f)
+
+
+def components(n, seed=1):
+    rnd = random.Random(seed)
+    comps = []
+    for i in range(n):
+        c = SchematicComponent()
+        c.ref_prefix = rnd.choice(PREFIXES)
+        c.ref = c.f_ref = c.ref_prefix+str(i+1)
+        c.value = rnd.choice(['10k', '100nF', '~', 'DNI 1k', '4.7uF', 'LM358', 'BC547', '1N4148'])
+        add_field(c, 'Reference', c.ref, 0)
+        add_field(c, 'Value', c.value, 1)
+        add_field(c, 'Footprint', rnd.choice(['R_0603', 'C_0402', 'TestPoint_Pad_1.0mm', 'SOIC-8']), 2)
+        add_field(c, 'Datasheet', '~', 3)
+        if rnd.random() < 0.7:
+            add_field(c, 'LCSC#', 'C{}'.format(rnd.randrange(100000)))
+        if rnd.random() < 0.2:
+            add_field(c, 'Config', rnd.choice(['no_asm', 'default', 'dnf,opt1', 'opt1 opt2']))
+        if rnd.random() < 0.05:
+            add_field(c, 'DNF', '')
+        c.on_board = rnd.random() > 0.02
+        comps.append(c)
+    return comps
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    outputs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    for tree in FILTERS:
+        f = kibot.fil_generic.Generic()
+        f.set_tree(tree)
+        f.config(None)
+        RegOutput.add_filter(f)
+    comps = components(n)
+    # Original, we measure only the filters, not the reset
+    t_old = 0
+    for _ in range(outputs):
+        exclude = BaseFilter.solve_filter(['no_tp', '_mechanical'], 'bench')
+        dnf = BaseFilter.solve_filter(['only_lcsc', '!no_tp'], 'bench')
+        reset_filters(comps)
+        start = time.perf_counter()
+        for c in comps:
+            if c.included:
+                c.included = old_filter(exclude, c)
+        for c in comps:
+            if c.fitted:
+                c.set_fitted(old_filter(dnf, c))
+        t_old += time.perf_counter()-start
+    old = [(c.included, c.fitted) for c in comps]
+    # Compiled and memoized
+    _memo.clear()
+    t_new = 0
+    for _ in range(outputs):
+        exclude = BaseFilter.solve_filter(['no_tp', '_mechanical'], 'bench')
+        dnf = BaseFilter.solve_filter(['only_lcsc', '!no_tp'], 'bench')
+        reset_filters(comps)
+        start = time.perf_counter()
+        apply_exclude_filter(comps, exclude)
+        apply_fitted_filter(comps, dnf)
+        t_new += time.perf_counter()-start
+    new = [(c.included, c.fitted) for c in comps]
+    if old != new:
+        print('Different results!')
+        sys.exit(1)
+    print(f'{n} components, {outputs} outputs: original {t_old:.3f} s, compiled {t_new:.3f} s (x{t_old/t_new:.1f})')
+    print(f'Excluded: {sum(not i for i, _ in new)} Not fitted: {sum(not f for _, f in new)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the original PcbDraw board outline stitching (get_closest over all the segments) against the one using a
+spatial index of the end points. Also checks both generate the same path.
+
+We use the Edge.Cuts of a panel: a grid of boards with rounded corners, milled slots and mouse bites. The segments are
+shuffled and some of them reversed, like in the SVGs generated by KiCad. You can also pass an SVG with the Edge.Cuts
+layer of a real panel.
+
+Usage: benchmark.py [SVG]
+"""
+import os
+import random
+import re
+import sys
+import time
+from lxml import etree
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.PcbDraw.plot import get_board_polygon, extract_svg_content, read_svg_unique, SvgPathItem, get_closest  # noqa: E402
+# The old algorithm is O(n^2), skip it for bigger panels
+MAX_OLD = 20000
+
+
+def old_board_polygon(svg_elements):
+    """ The original code """
+    elements = []
+    path = ""
+    for group in svg_elements:
+        for svg_element in group:
+            if svg_element.tag == "path":
+                p = svg_element.attrib["d"]
+                # Check if this is a closed polygon (KiCad 7.0.1+)
+                polygon = re.fullmatch(r"M ((\d+\.\d+),(\d+\.\d+) )+Z", p)
+                if polygon:
+                    # Yes, decompose it in lines
+                    polygon = re.findall(r"(\d+\.\d+),(\d+\.\d+) ", p)
+                    start = polygon[0]
+                    # Close it
+                    polygon.append(polygon[0])
+                    # Add the lines
+                    for end in polygon[1:]:
+                        path = 'M'+start[0]+' '+start[1]+' L'+end[0]+' '+end[1]
+                        elements.append(SvgPathItem(path))
+                        start = end
+                else:
+                    elements.append(SvgPathItem(p))
+            elif svg_element.tag == "circle":
+                # Convert circle to path
+                att = svg_element.attrib
+                s = " M {0} {1} m-{2} 0 a {2} {2} 0 1 0 {3} 0 a {2} {2} 0 1 0 -{3} 0 ".format(
+                    att["cx"], att["cy"], att["r"], 2 * float(att["r"]))
+                path += s
+    while len(elements) > 0:
+        # Initiate seed for the outline
+        outline = [elements[0]]
+        elements = elements[1:]
+        size = 0
+        # Append new segments to the ends of outline until there is none to append.
+        while size != len(outline) and len(elements) > 0:
+            size = len(outline)
+
+            i = get_closest(outline[0].start, [x.end for x in elements])
+            if SvgPathItem.is_same(outline[0].start, elements[i].end):
+                outline.insert(0, elements[i])
+                del elements[i]
+                continue
+
+            i = get_closest(outline[0].start, [x.start for x in elements])
+            if SvgPathItem.is_same(outline[0].start, elements[i].start):
+                e = elements[i]
+                e.flip()
+                outline.insert(0, e)
+                del elements[i]
+                continue
+
+            i = get_closest(outline[-1].end, [x.start for x in elements])
+            if SvgPathItem.is_same(outline[-1].end, elements[i].start):
+                outline.insert(0, elements[i])
+                del elements[i]
+                continue
+
+            i = get_closest(outline[-1].end, [x.end for x in elements])
+            if SvgPathItem.is_same(outline[-1].end, elements[i].end):
+                e = elements[i]
+                e.flip()
+                outline.insert(0, e)
+                del elements[i]
+                continue
+        # ...then, append it to path.
+        first = True
+        for x in outline:
+            path += x.format(first)
+            first = False
+    e = etree.Element("path", d=path, style="fill-rule: evenodd;")
+    return e
+
+
+def line(x1, y1, x2, y2):
+    return f'M {x1:.4f} {y1:.4f} L {x2:.4f} {y2:.4f}'
+
+
+def arc(x1, y1, r, sweep, x2, y2):
+    return f'M {x1:.4f} {y1:.4f} A {r:.4f} {r:.4f} 0.0 0 {sweep} {x2:.4f} {y2:.4f}'
+
+
+def rounded_rect(x, y, w, h, r):
+    return [line(x+r, y, x+w-r, y), arc(x+w-r, y, r, 1, x+w, y+r),
+            line(x+w, y+r, x+w, y+h-r), arc(x+w, y+h-r, r, 1, x+w-r, y+h),
+            line(x+w-r, y+h, x+r, y+h), arc(x+r, y+h, r, 1, x, y+h-r),
+            line(x, y+h-r, x, y+r), arc(x, y+r, r, 1, x+r, y)]
+
+
+def panel(rows, cols, slots=6, w=50.0, h=30.0, gap=2.0):
+    """ Edge.Cuts for a panel, one list of segments for each closed outline """
+    outlines = []
+    for row in range(rows):
+        for col in range(cols):
+            x = 5+col*(w+gap)
+            y = 5+row*(h+gap)
+            outlines.append(rounded_rect(x, y, w, h, 1.0))
+            # Milled slots
+            for n in range(slots):
+                outlines.append(rounded_rect(x+5+n*7, y+h/2, 5, 1, 0.5))
+    outlines.append(rounded_rect(0, 0, 10+cols*(w+gap), 10+rows*(h+gap), 3.0))
+    return outlines
+
+
+def to_svg(outlines, seed=1):
+    rnd = random.Random(seed)
+    segments = []
+    for o in outlines:
+        for d in o:
+            if rnd.random() < 0.3:
+                # Reversed segment
+                s = SvgPathItem(d)
+                if s.type == 'L':
+                    d = line(*s.end, *s.start)
+                else:
+                    d = arc(*s.end, s.args[0], 1-int(s.args[4]), *s.start)
+            segments.append(d)
+    rnd.shuffle(segments)
+    group = etree.Element('g')
+    for d in segments:
+        etree.SubElement(group, 'path', d=d)
+    # A polygon (KiCad 7.0.1+)
+    etree.SubElement(group, 'path', d='M 1.0000,1.0000 4.0000,1.0000 4.0000,3.0000 Z')
+    # Mouse bites
+    for _ in range(len(outlines)):
+        etree.SubElement(group, 'circle', cx=f'{rnd.uniform(0, 500):.4f}', cy=f'{rnd.uniform(0, 500):.4f}', r='0.25')
+    return [group]
+
+
+def measure(func, svg):
+    start = time.perf_counter()
+    res = func(svg).attrib['d']
+    return time.perf_counter()-start, res
+
+
+def compare(name, svg, segments):
+    t_new, new = measure(get_board_polygon, svg)
+    if segments > MAX_OLD:
+        print(f'{name}: {segments} segments, index {t_new:.3f} s')
+        return
+    t_old, old = measure(old_board_polygon, svg)
+    if old != new:
+        print(f'{name}: different paths!')
+        sys.exit(1)
+    print(f'{name}: {segments} segments, get_closest {t_old:.3f} s, index {t_new:.3f} s (x{t_old/t_new:.1f})')
+
+
+def main():
+    if len(sys.argv) > 1:
+        svg = extract_svg_content(read_svg_unique(sys.argv[1], 'bench'))
+        segments = sum(1 for g in svg for e in g if e.tag == 'path')
+        compare(os.path.basename(sys.argv[1]), svg, segments)
+        return
+    for rows, cols in ((2, 2), (4, 4), (6, 8), (10, 12), (20, 25)):
+        outlines = panel(rows, cols)
+        compare(f'Panel {rows}x{cols}', to_svg(outlines), sum(len(o) for o in outlines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the original PDF joiner (all the pages in a PyPDF2 PdfFileWriter) against the streaming joiner used by
+`pdfunite` and `pcb_print`. Reports the time, the peak of memory allocated by Python and the size of the result.
+
+We join the first page of the PDFs found in the reference directory, repeated until we get the number of pages.
+
+Usage: benchmark.py [PAGES] [DIR_WITH_PDFS]
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.mcpyrate import activate  # noqa: F401,E402
+from kibot import PyPDF2  # noqa: E402
+from kibot.create_pdf import create_pdf_from_pages  # noqa: E402
+REF_DIR = os.path.join(ROOT, 'tests', 'reference', '8_0_0')
+
+
+def old_create_pdf_from_pages(input_files, output_fn, forced_width=None):
+    """ The original code """
+    output = PyPDF2.PdfFileWriter()
+    # Collect all pages
+    open_files = []
+    for filename in input_files:
+        file = open(filename, 'rb')
+        open_files.append(file)
+        pdf_reader = PyPDF2.PdfFileReader(file)
+        page_obj = pdf_reader.getPage(0)
+        if forced_width is not None:
+            width = float(page_obj.mediaBox.getWidth())*25.4/72
+            scale = round(forced_width/width, 4)
+            if abs(1.0-scale) > 0.0001:
+                page_obj.scaleBy(scale)
+        page_obj.compressContentStreams()
+        output.addPage(page_obj)
+    # Write all pages to a file
+    with open(output_fn, 'wb') as pdf_output:
+        output.write(pdf_output)
+    # Close the files
+    for f in open_files:
+        f.close()
+
+
+def measure(name, func, files, output):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(files, output)
+    elapsed = time.perf_counter()-start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    with open(output, 'rb') as f:
+        pages = PyPDF2.PdfFileReader(f).getNumPages()
+    print(f'{name}: {pages} pages, {elapsed:.2f} s, peak {peak/1e6:.1f} MB, result {os.path.getsize(output)/1e6:.2f} MB')
+
+
+def main(pages, src_dir):
+    src = sorted(f for f in glob.glob(os.path.join(src_dir, '*.pdf')) if os.path.getsize(f) < 2e6)
+    files = [src[n % len(src)] for n in range(pages)]
+    print(f'{pages} pages from {len(src)} different files ({sum(os.path.getsize(f) for f in files)/1e6:.1f} MB)')
+    with tempfile.TemporaryDirectory() as tmp:
+        measure('PdfFileWriter', old_create_pdf_from_pages, files, os.path.join(tmp, 'old.pdf'))
+        measure('Streaming    ', create_pdf_from_pages, files, os.path.join(tmp, 'new.pdf'))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300, sys.argv[2] if len(sys.argv) > 2 else REF_DIR)
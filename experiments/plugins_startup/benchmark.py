@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Measures the KiBot startup time with and without the plug-ins manifest.
+
+The first run imports all the plug-ins and creates the manifest, the next runs only import the plug-ins used by the
+configuration. A temporal HOME is used, so the manifest and caches of the user aren't affected.
+
+Usage: benchmark.py [CONFIG] [PCB]
+By default we list the outputs of a simple configuration using a KiCad 8 PCB from the tests.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+KIBOT = os.path.join(ROOT, 'src', 'kibot')
+CONFIG = os.path.join(ROOT, 'tests', 'yaml_samples', 'pcb_print_2.kibot.yaml')
+PCB = os.path.join(ROOT, 'tests', 'board_samples', 'kicad_8', 'light_control.kicad_pcb')
+
+
+def run(home, config, pcb):
+    env = dict(os.environ)
+    env['HOME'] = home
+    start = time.perf_counter()
+    subprocess.run([sys.executable, KIBOT, '-c', config, '-b', pcb, '--list'], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter()-start
+
+
+def main(config, pcb, reps=5):
+    with tempfile.TemporaryDirectory() as home:
+        manifest = os.path.join(home, '.cache', 'kibot', 'plugins_manifest.json')
+        cold = []
+        for _ in range(reps):
+            if os.path.isfile(manifest):
+                os.remove(manifest)
+            cold.append(run(home, config, pcb))
+        run(home, config, pcb)
+        warm = [run(home, config, pcb) for _ in range(reps)]
+    print(f'`--list` for {os.path.basename(config)}, best of {reps} runs')
+    print(f'Importing all the plug-ins: {min(cold):.2f} s')
+    print(f'Using the manifest:         {min(warm):.2f} s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else CONFIG, sys.argv[2] if len(sys.argv) > 2 else PCB)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the tracks, vias and drilled pads statistics computed by the `report` output using plain Python loops against
+the ones using NumPy arrays. Also checks both methods compute the same values.
+
+The board data is synthetic, like the one extracted from a dense 12 layers board: 200k track segments, 40k vias and
+20k drilled pads. Some of the pads and vias have problematic annular rings.
+
+Usage: benchmark.py [TRACKS]
+"""
+import os
+import random
+import sys
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.mcpyrate import activate  # noqa: F401,E402
+import numpy  # noqa: E402
+from kibot.gs import GS  # noqa: E402
+from kibot.kiplot import load_actions  # noqa: E402
+from kibot import out_report  # noqa: E402
+from kibot.out_report import ReportOptions, INF  # noqa: E402
+TRACK_WIDTHS = [0.1, 0.127, 0.15, 0.2, 0.25, 0.3, 0.5, 1.0]
+VIAS = [(0.2, 0.4), (0.2, 0.45), (0.3, 0.6), (0.4, 0.8), (0.15, 0.3)]
+HOLES = [0.3, 0.6, 0.8, 1.0, 1.2, 3.2]
+
+
+class Size(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Pad(object):
+    """ Only used for the warnings """
+    def __init__(self, n, drill, size):
+        self.pos = Size(n, n)
+        self.drill = drill
+        self.size = size
+
+    def GetPosition(self):
+        return self.pos
+
+    def GetLayer(self):
+        return 0
+
+    def GetDrillSize(self):
+        return self.drill
+
+    def GetSize(self):
+        return self.size
+
+
+def board_data(tracks, seed=1):
+    rnd = random.Random(seed)
+    mm = GS.from_mm
+    track_widths = [mm(rnd.choice(TRACK_WIDTHS)) for _ in range(tracks)]
+    vias = [rnd.choice(VIAS) for _ in range(tracks//5)]
+    via_drills = [mm(v[0]) for v in vias]
+    via_widths = [mm(v[1]) for v in vias]
+    pads = []
+    for n in range(tracks//10):
+        dx = dy = mm(rnd.choice(HOLES))
+        if rnd.random() < 0.1:
+            # Slot
+            dy = mm(rnd.choice(HOLES)*3)
+        is_pth = rnd.random() < 0.9
+        # A few pads without copper or with a small ring
+        ring = 0 if rnd.random() < 0.001 else mm(0.05 if rnd.random() < 0.005 else rnd.choice((0.15, 0.2, 0.3, 0.5)))
+        sx = dx+2*ring
+        sy = dy+2*ring
+        pads.append((Pad(n, Size(dx, dy), Size(sx, sy)), dx, dy, is_pth, sx, sy))
+    return track_widths, via_drills, via_widths, list(zip(*pads))
+
+
+def stats(np, data):
+    track_widths, via_drills, via_widths, (pads, drill_x, drill_y, pads_pth, size_x, size_y) = data
+    o = ReportOptions()
+    o.oar_vias = o.oar_vias_ec = o.track = INF
+    o._vias = {}
+    o._vias_ec = {}
+    o._tracks_m = {}
+    o._drills_real = {}
+    o._drills_ec = {}
+    o._drills = {}
+    o._drills_oval = {}
+    o.oar_pads = o.oar_pads_ec = o.pad_drill = o.pad_drill_real = o.pad_drill_real_ec = INF
+    o.pad_drill_pth = o.pad_drill_pth_real = INF
+    o.pad_drill_npth = o.pad_drill_npth_real = INF
+    o.slot = INF
+    warnings = []
+    out_report.logger.warning = warnings.append
+    start = time.perf_counter()
+    if np is None:
+        o.track_stats_py(track_widths, via_drills, via_widths)
+        o.pad_stats_py(pads, drill_x, drill_y, pads_pth, size_x, size_y, GS.from_mm(0.1))
+    else:
+        o.track_stats_np(np, track_widths, via_drills, via_widths)
+        o.pad_stats_np(np, pads, drill_x, drill_y, pads_pth, size_x, size_y, GS.from_mm(0.1))
+    elapsed = time.perf_counter()-start
+    del out_report.logger.warning
+    res = {k: v for k, v in vars(o).items() if not callable(v) and k not in ('_tree', '_parent')}
+    res['warnings'] = warnings
+    return elapsed, res
+
+
+def main(tracks):
+    # Register the dependencies
+    load_actions()
+    GS.global_drill_size_increment = 0.05
+    GS.global_extra_pth_drill = 0.1
+    # Used by the warnings
+    GS.board = type('Board', (), {'GetLayerName': lambda self, layer: 'F.Cu'})()
+    data = board_data(tracks)
+    print(f'{tracks} tracks, {len(data[1])} vias, {len(data[3][0])} drilled pads')
+    t_py, res_py = stats(None, data)
+    t_np, res_np = stats(numpy, data)
+    if res_py != res_np:
+        for k, v in res_py.items():
+            if res_np.get(k) != v:
+                print(f'Different `{k}`: {v} vs {res_np.get(k)}')
+        sys.exit(1)
+    print(f'{len(res_py["warnings"])} warnings')
+    print(f'Loop: {t_py:.3f} s, NumPy: {t_np:.3f} s (x{t_py/t_np:.1f})')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
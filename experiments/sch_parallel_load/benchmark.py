@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Measures the speed-up of the parallel schematic load (`sch_parse_jobs` global option) against the number of processes.
+
+We create a hierarchy using a top sheet with N sub-sheets, each one is a copy of a flat schematic. Half of the sheets
+use the same file, to check that repeated files are parsed only once. The loaded components are compared against the
+serial load.
+
+Usage: benchmark.py [SHEETS] [FLAT_SCHEMATIC]
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.mcpyrate import activate  # noqa: F401,E402
+from kibot.gs import GS  # noqa: E402
+from kibot.kicad.v6_sch import SchematicV6  # noqa: E402
+FLAT = os.path.join(ROOT, 'tests', 'board_samples', 'kicad_8', 'light_control.kicad_sch')
+FLAT_UUID = 'e6521bef-4109-48f7-8b88-4121b0468927'
+FLAT_PROJECT = 'light_control'
+PROJECT = 'bench'
+REF_REGEX = re.compile(r'\(reference "([^"\d]+)(\d+)"\)')
+
+
+def sheet(n, sheet_uuid, fname, root_uuid):
+    pos = f'(at {25*(n % 10)} {15*(n // 10)}'
+    font = '(effects (font (size 1.27 1.27)))'
+    return (f'\t(sheet {pos}) (size 20 10) (uuid "{sheet_uuid}")\n'
+            f'\t\t(property "Sheetname" "S{n}" {pos} 0) {font})\n'
+            f'\t\t(property "Sheetfile" "{fname}" {pos} 0) {font})\n'
+            f'\t\t(instances (project "{PROJECT}" (path "/{root_uuid}" (page "{n+2}"))))\n'
+            '\t)\n')
+
+
+def instance(text, path, n):
+    """ Adapts the instance data of the flat schematic, the references are unique for each sheet """
+    text = text.replace(f'(path "/{FLAT_UUID}"', f'(path "{path}"')
+    return REF_REGEX.sub(lambda m: f'(reference "{m.group(1)}{m.group(2)}{n:03d}")', text)
+
+
+def create_hierarchy(dest, sheets, flat):
+    with open(flat, 'rt') as f:
+        flat_text = f.read().replace(f'"{FLAT_PROJECT}"', f'"{PROJECT}"')
+    root_uuid = str(uuid.uuid4())
+    body = []
+    shared = []
+    for n in range(sheets):
+        sheet_uuid = str(uuid.uuid4())
+        path = f'/{root_uuid}/{sheet_uuid}'
+        # The odd sheets share the same file
+        if n % 2:
+            fname = 'shared.kicad_sch'
+            shared.append((path, n))
+        else:
+            fname = f'sheet_{n}.kicad_sch'
+            with open(os.path.join(dest, fname), 'wt') as f:
+                f.write(instance(flat_text, path, n))
+        body.append(sheet(n, sheet_uuid, fname, root_uuid))
+    # The shared file has one instance for each sheet using it
+    text = flat_text
+    pos = 0
+    while True:
+        pos = text.find(f'(path "/{FLAT_UUID}"', pos)
+        if pos < 0:
+            break
+        end = text.index('\n\t\t\t\t)', pos)+6
+        new = '\n\t\t\t\t'.join(instance(text[pos:end], path, n) for path, n in shared)
+        text = text[:pos]+new+text[end:]
+        pos += len(new)
+    with open(os.path.join(dest, 'shared.kicad_sch'), 'wt') as f:
+        f.write(text)
+    root = os.path.join(dest, PROJECT+'.kicad_sch')
+    with open(root, 'wt') as f:
+        f.write(f'(kicad_sch (version 20231120) (generator "eeschema") (generator_version "8.0")\n'
+                f'\t(uuid "{root_uuid}")\n\t(paper "A4")\n\t(lib_symbols)\n'+''.join(body) +
+                '\t(sheet_instances (path "/" (page "1")))\n)\n')
+    return root
+
+
+def load(root, jobs, reps=3):
+    best = None
+    for _ in range(reps):
+        sch = SchematicV6()
+        start = time.perf_counter()
+        sch.load(root, PROJECT, jobs=jobs)
+        elapsed = time.perf_counter()-start
+        best = elapsed if best is None else min(best, elapsed)
+    comps = sorted((c.ref, c.sheet_path, c.unit, c.value) for c in sch.get_components())
+    return best, comps
+
+
+def main(sheets, flat):
+    # Used for the sheets without a title block
+    GS.global_date_time_format = '%Y-%m-%d_%H-%M-%S'
+    dest = tempfile.mkdtemp()
+    try:
+        root = create_hierarchy(dest, sheets, flat)
+        t_ref, ref = load(root, 1)
+        print(f'{sheets} sheets, {len(ref)} components, {os.cpu_count()} CPUs')
+        print(f'Serial load:  {t_ref:.2f} s')
+        jobs = 2
+        while True:
+            t, comps = load(root, jobs)
+            if comps != ref:
+                print(f'{jobs} processes: different components!')
+                sys.exit(1)
+            print(f'{jobs:3d} processes: {t:.2f} s (x{t_ref/t:.2f})')
+            if jobs >= (os.cpu_count() or 1):
+                break
+            jobs = min(jobs*2, os.cpu_count())
+    finally:
+        shutil.rmtree(dest)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32, sys.argv[2] if len(sys.argv) > 2 else FLAT)
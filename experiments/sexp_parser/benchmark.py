@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Compares the original recursive s-expression parser against the tokenizer based one.
+Also checks both parsers generate the same tree.
+
+Usage: benchmark.py [FILES...]
+By default all the KiCad schematics and PCBs from the tests are used.
+"""
+from glob import glob
+import os
+import sys
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+from kibot.kicad.sexpdata import Parser, FastParser, UseFullParser  # noqa: E402
+
+
+def measure(cls, text, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        res = cls(text).parse()
+    return time.perf_counter()-start, res
+
+
+def main(files, reps=3):
+    t_old = t_new = 0
+    size = 0
+    for f in files:
+        with open(f, 'rt') as fh:
+            text = fh.read()
+        try:
+            t_n, new = measure(FastParser, text, reps)
+        except UseFullParser:
+            print(f'{f}: not supported by the fast parser')
+            continue
+        t_o, old = measure(Parser, text, reps)
+        if old != new:
+            print(f'{f}: different trees!')
+            sys.exit(1)
+        t_old += t_o
+        t_new += t_n
+        size += len(text)
+    print(f'{len(files)} files, {size/1e6:.1f} MB, {reps} repetitions')
+    print(f'Recursive parser: {t_old:.2f} s')
+    print(f'Tokenizer parser: {t_new:.2f} s')
+    print(f'Speed-up: {t_old/t_new:.2f}x')
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        base = os.path.join(ROOT, 'tests', 'board_samples')
+        files = sorted(glob(os.path.join(base, '*', '*.kicad_sch')) + glob(os.path.join(base, '*', '*.kicad_pcb')))
+    main(files)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Measures the time to normalize component values that the regex can't solve (so we use the electro-grammar), with an
+empty cache (first run) and using the persistent cache of parsed values (next runs). Also checks both runs get the same
+results.
+
+Usage: benchmark.py [VALUES]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+BASE = ['100nF 50V X7R 0402', '4k7 1% 0603', '10uF 16V 10%', '1k 5% 1/4W', '22pF C0G 50V', '100nF, 16V', '2u2 6V3 0805',
+        '0R1 1% 2512', '47uF 25V 20%', '10k 0.1% 0402']
+
+
+def run(values, cache_file):
+    """ Runs in a separated process, so we start with an empty memory cache """
+    from kibot.mcpyrate import activate  # noqa: F401
+    from kibot.bom import parse_cache
+    parse_cache.cache_file = cache_file
+    from kibot.bom.units import comp_match
+    vals = [v+' ' for v in BASE]*(values//len(BASE))
+    # Different values, like the ones found in different projects
+    vals = [v+str(n) for n, v in enumerate(vals)]
+    start = time.perf_counter()
+    res = [str(comp_match(v, 'C' if 'F' in v else 'R', relax_severity=True)) for v in vals]
+    elapsed = time.perf_counter()-start
+    parse_cache.save()
+    print(elapsed)
+    print(hash(tuple(res)))
+
+
+def main(values):
+    if len(sys.argv) > 2:
+        run(values, sys.argv[2])
+        return
+    cache_file = os.path.join(tempfile.mkdtemp(), 'values.pickle')
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    res = []
+    for name in ('Empty cache', 'Persistent cache'):
+        out = subprocess.run([sys.executable, __file__, str(values), cache_file], env=env, capture_output=True, text=True,
+                             check=True).stdout.split()
+        res.append(out[1])
+        print(f'{name}: {values} values {float(out[0]):.3f} s')
+    os.remove(cache_file)
+    if res[0] != res[1]:
+        print('Different results!')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+from collections import deque
 from copy import deepcopy
 import json
 import math
@@ -20,6 +21,7 @@ from .unit import read_resistance
 from lxml import etree, objectify # type: ignore
 from .pcbnew_transition import isV6, isV7, isV8, isV9, pcbnew # type: ignore
 from ..gs import GS
+from ..fp_snapshot import FootprintSnapshot, get_fp_snapshot
 
 T = TypeVar("T")
 Numeric = Union[int, float]
@@ -99,14 +101,16 @@ class SvgPathItem:
         else:
             raise SyntaxError("Unsupported path element " + path_elems[0])
 
+    @staticmethod
+    def tolerance() -> float:
+        return 0.01 if isV7() or isV8() or isV9() else 100
+
     @staticmethod
     def is_same(p1: Point, p2: Point) -> bool:
         dx = p1[0] - p2[0]
         dy = p1[1] - p2[1]
         pseudo_distance = dx*dx + dy*dy
-        if isV7() or isV8() or isV9():
-            return pseudo_distance < 0.01 ** 2
-        return pseudo_distance < 100 ** 2
+        return pseudo_distance < SvgPathItem.tolerance() ** 2
 
     def format(self, first: bool) -> str:
         ret = ""
@@ -144,6 +148,50 @@ def get_closest(reference: Point, elems: List[Point]) -> int:
     except ValueError:
         return int(np.argmin([pseudo_distance(reference, x) for x in elems]))
 
+class EndpointIndex:
+    """
+    Spatial hash for the start or end points of the outline segments. The
+    cells are as big as the tolerance used by SvgPathItem.is_same, so the
+    points matching a reference are in the 3x3 cells around it.
+    """
+    def __init__(self, points: List[Point], cell: float) -> None:
+        self.points = points
+        self.cell = cell
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, p in enumerate(points):
+            self.cells.setdefault(self.key(p), []).append(i)
+
+    def key(self, p: Point) -> Tuple[int, int]:
+        return (math.floor(p[0] / self.cell), math.floor(p[1] / self.cell))
+
+    def remove(self, i: int) -> None:
+        self.cells[self.key(self.points[i])].remove(i)
+
+    def find(self, reference: Point) -> Optional[int]:
+        """
+        Same result as get_closest + SvgPathItem.is_same: the first point
+        equal to the reference, or else the closest one (if close enough)
+        """
+        kx, ky = self.key(reference)
+        exact = closest = None
+        closest_d = 0.0
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i in self.cells.get((kx + dx, ky + dy), ()):
+                    p = self.points[i]
+                    if p == reference:
+                        if exact is None or i < exact:
+                            exact = i
+                        continue
+                    d = pseudo_distance(reference, p)
+                    if closest is None or d < closest_d or (d == closest_d and i < closest):
+                        closest, closest_d = i, d
+        if exact is not None:
+            return exact
+        if closest is not None and SvgPathItem.is_same(reference, self.points[closest]):
+            return closest
+        return None
+
 def extract_arg(args: List[Any], index: int, default: Any=None) -> Any:
     """
     Return n-th element of array or default if out of range
@@ -446,47 +494,54 @@ def get_board_polygon(svg_elements: etree.Element) -> etree.Element:
                 s = " M {0} {1} m-{2} 0 a {2} {2} 0 1 0 {3} 0 a {2} {2} 0 1 0 -{3} 0 ".format(
                     att["cx"], att["cy"], att["r"], 2 * float(att["r"]))
                 path += s
-    while len(elements) > 0:
+    # Index the end points, so we don't need to scan all the elements
+    starts = EndpointIndex([x.start for x in elements], SvgPathItem.tolerance())
+    ends = EndpointIndex([x.end for x in elements], SvgPathItem.tolerance())
+    used = [False] * len(elements)
+    seed = 0
+
+    def take(i: int, flip: bool) -> SvgPathItem:
+        starts.remove(i)
+        ends.remove(i)
+        used[i] = True
+        e = elements[i]
+        if flip:
+            e.flip()
+        return e
+
+    while seed < len(elements):
         # Initiate seed for the outline
-        outline = [elements[0]]
-        elements = elements[1:]
-        size = 0
+        outline = deque([take(seed, False)])
         # Append new segments to the ends of outline until there is none to append.
-        while size != len(outline) and len(elements) > 0:
-            size = len(outline)
-
-            i = get_closest(outline[0].start, [x.end for x in elements])
-            if SvgPathItem.is_same(outline[0].start, elements[i].end):
-                outline.insert(0, elements[i])
-                del elements[i]
+        while True:
+            i = ends.find(outline[0].start)
+            if i is not None:
+                outline.appendleft(take(i, False))
                 continue
 
-            i = get_closest(outline[0].start, [x.start for x in elements])
-            if SvgPathItem.is_same(outline[0].start, elements[i].start):
-                e = elements[i]
-                e.flip()
-                outline.insert(0, e)
-                del elements[i]
+            i = starts.find(outline[0].start)
+            if i is not None:
+                outline.appendleft(take(i, True))
                 continue
 
-            i = get_closest(outline[-1].end, [x.start for x in elements])
-            if SvgPathItem.is_same(outline[-1].end, elements[i].start):
-                outline.insert(0, elements[i])
-                del elements[i]
+            # Note: segments connected to the end are also inserted at the beginning
+            i = starts.find(outline[-1].end)
+            if i is not None:
+                outline.appendleft(take(i, False))
                 continue
 
-            i = get_closest(outline[-1].end, [x.end for x in elements])
-            if SvgPathItem.is_same(outline[-1].end, elements[i].end):
-                e = elements[i]
-                e.flip()
-                outline.insert(0, e)
-                del elements[i]
+            i = ends.find(outline[-1].end)
+            if i is not None:
+                outline.appendleft(take(i, True))
                 continue
+            break
         # ...then, append it to path.
         first = True
         for x in outline:
             path += x.format(first)
             first = False
+        while seed < len(elements) and used[seed]:
+            seed += 1
     e = etree.Element("path", d=path, style="fill-rule: evenodd;")
     return e
 
@@ -1119,23 +1174,30 @@ class PcbPlotter():
         The position is adjusted based on what side we are rendering
         """
         render_back = not self.render_back if invert_side else self.render_back
-        for footprint in self.board.GetFootprints():
-            if (str(footprint.GetLayerName()) in ["Back", "B.Cu"] and not render_back) or \
-               (str(footprint.GetLayerName()) in ["Top", "F.Cu"]  and     render_back):
+        # Data collected by KiBot in one pass
+        fps = get_fp_snapshot() if self.board is GS.board else FootprintSnapshot(self.board)
+        for i, footprint in enumerate(fps.modules):
+            if (fps.layers[i] == pcbnew.B_Cu and not render_back) or \
+               (fps.layers[i] == pcbnew.F_Cu and     render_back):
                 continue
-            lib = str(footprint.GetFPID().GetLibNickname()).strip()
-            name = str(footprint.GetFPID().GetLibItemName()).strip()
-            value = footprint.GetValue().strip()
+            lib = fps.lib_nicknames[i].strip()
+            name = fps.fp_names[i].strip()
+            value = fps.values[i].strip()
             if not LEGACY_KICAD:
                 # Look for a tolerance in the properties
                 prop = GS.get_fields(footprint)
                 tol = next(filter(lambda x: x, map(prop.get, GS.global_field_tolerance)), None)
                 if tol:
                     value = value+' '+tol.strip()
-            ref = footprint.GetReference().strip()
-            center = footprint.GetPosition()
-            orient = math.radians(footprint.GetOrientation().AsDegrees())
-            pos = (center.x, center.y, orient)
+            ref = fps.refs[i].strip()
+            if LEGACY_KICAD:
+                # The snapshot uses the center
+                center = footprint.GetPosition()
+                x, y = center.x, center.y
+            else:
+                x, y = fps.x[i], fps.y[i]
+            orient = math.radians(fps.rotations[i])
+            pos = (x, y, orient)
             callback(lib, name, ref, value, pos)
 
     def get_def_slot(self, tag_name: str, id: str) -> etree.SubElement:
@@ -12,9 +12,10 @@ Usage:
          [-q | -v...] [-L LOGFILE] [-C | -i | -n] [-m MKFILE] [-A] [-g DEF] ...
          [-E DEF] ... [--defs-from-env] [--defs-from-project] [-w LIST] [-D | -W]
          [--warn-ci-cd] [--banner N] [--gui | --internal-check] [-I INJECT]
-         [--variant VAR] ... [TARGET...]
+         [--variant VAR] ... [--variant-jobs VJOBS] [-j JOBS] [--refresh-deps]
+         [--timings FILE] [--profile DIR] [TARGET...]
   kibot [-v...] [-b BOARD] [-e SCHEMA] [-c PLOT_CONFIG] [--banner N]
-         [-E DEF] ... [--defs-from-env] [--config-outs]
+         [-E DEF] ... [--defs-from-env] [--config-outs] [--refresh-deps]
          [--only-pre|--only-groups] [--only-names] [--output-name-first] --list
   kibot [-v...] [-c PLOT_CONFIG] [--banner N] [-E DEF] ... [--only-names]
         [--sub-pcbs] --list-variants
@@ -59,6 +60,8 @@ Options:
   --internal-check                 Run some outputs internal checks
   -i, --invert-sel                 Generate the outputs not listed as targets
   -I, --gui-inject INJECT          Inject events to the GUI from INJECT file
+  -j JOBS, --jobs JOBS             Generate up to JOBS outputs in parallel.
+                                   Outputs using other outputs wait for them
   -l, --list                       List available outputs, preflights and
                                    groups (in the config file).
                                    You don't need to specify an SCH/PCB unless
@@ -76,9 +79,17 @@ Options:
   --only-pre                       Print only the preflights
   --output-name-first              Use the output name first when listing
   -P, --copy-and-expand            As -p but expand the list of layers
+  --profile DIR                    Profile each output using cProfile and
+                                   store the stats in DIR (one .pstats file
+                                   for each output)
   -q, --quiet                      Remove information logs
+  --refresh-deps                   Check the version of the tools again, don't
+                                   use the cached versions
   -s PRE, --skip-pre PRE           Skip preflights, comma separated or `all`
   --sub-pcbs                       When listing variants also include sub-PCBs
+  --timings FILE                   Store the time and memory used by each
+                                   preflight and output, and the time spent
+                                   running external tools, in FILE (JSON)
   -v, --verbose                    Show debugging information
   -V, --version                    Show program's version number and exit
   --variant VAR                    Generate the VAR variant. Can be specified
@@ -88,6 +99,10 @@ Options:
                                    If you also want to generate the default
                                    case, no variant, include NONE in the
                                    list of variants
+  --variant-jobs VJOBS             Generate up to VJOBS variants in parallel.
+                                   Each variant is generated in a sub-dir of
+                                   OUT_DIR, named as the variant (NONE for no
+                                   variant)
   -w, --no-warn LIST               Exclude the mentioned warnings (comma sep)
   -W, --stop-on-warnings           Stop on warnings
   --warn-ci-cd                     Don't disable warnings expected on CI/CD
@@ -148,15 +163,18 @@ if os.environ.get('KIAUS_USE_NIGHTLY'):  # pragma: no cover (nightly)
 from .banner import get_banner, BANNERS
 from .gs import GS
 from . import dep_downloader
+from . import timings
 from .misc import (EXIT_BAD_ARGS, W_VARCFG, NO_PCBNEW_MODULE, W_NOKIVER, hide_stderr, TRY_INSTALL_CHECK, W_ONWIN,
-                   FAILED_EXECUTE, W_ONMAC)
+                   FAILED_EXECUTE, W_ONMAC, W_NOPARALLEL)
 from .pre_base import BasePreFlight
 from .config_reader import (print_outputs_help, print_output_help, print_preflights_help, create_example, print_filters_help,
                             print_global_options_help, print_dependencies, print_variants_help, print_errors,
                             print_list_rotations, print_list_offsets)
 from .kiplot import (generate_outputs, load_actions, config_output, generate_makefile, generate_examples, solve_schematic,
-                     solve_board_file, solve_project_file, check_board_file, exec_with_retry, load_config)
+                     solve_board_file, solve_project_file, check_board_file, exec_with_retry, load_config,
+                     generate_variants, load_all_plugins, reset_outputs)
 from .registrable import RegOutput
+from .scheduler import parallel_available
 GS.kibot_version = __version__
 
 
@@ -476,6 +494,8 @@ def initialization(args, progress=None):
     # Disable auto-download if needed
     if args.no_auto_download:
         dep_downloader.disable_auto_download = True
+    if args.refresh_deps:
+        dep_downloader.refresh_versions_cache = True
 
     # Output dir: relative to CWD (absolute path overrides)
     GS.out_dir = os.path.join(os.getcwd(), args.out_dir)
@@ -484,6 +504,18 @@ def initialization(args, progress=None):
     load_actions(progress)
 
 
+def parse_jobs(value, option='jobs'):
+    if value is None:
+        return 1
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        GS.exit_with_error(f'The {option} option needs a positive integer ({value})', EXIT_BAD_ARGS)
+    return jobs
+
+
 def main():
     set_locale()
     ver = 'KiBot '+__version__+' - '+__copyright__+' - License: '+__license__
@@ -505,6 +537,7 @@ def main():
     logger.debug('KiBot {} verbose level: {} started on {}'.format(__version__, args.verbose, datetime.now()))
     apply_warning_filter(args)
     log.stop_on_warnings = args.stop_on_warnings
+    timings.init(args.timings, args.profile)
 
     # Now we have the debug level set we can check (and optionally inform) KiCad info
     logger.debug('Start of initialization')
@@ -541,6 +574,7 @@ def main():
         print_global_options_help(args.rst)
         sys.exit(0)
     if args.help_dependencies:
+        load_all_plugins()
         print_dependencies(args.markdown, args.json, args.rst)
         sys.exit(0)
     if args.help_list_rotations:
@@ -607,56 +641,56 @@ def main():
         from .GUI.analyze import analyze
         analyze()
     else:
-        if args.variant:
-            # One or more variants specified at the CLI
-            if 'ALL' in args.variant:
-                variants = list(RegOutput.get_variants().keys())
-                if 'NONE' in args.variant:
-                    variants.insert(0, 'NONE')
-                if not variants:
-                    GS.exit_with_error('Asking to generate ALL variants, but no variant defined', EXIT_BAD_ARGS)
-                args.variant = variants
-            logger.debug(f'Generating variants: {args.variant}')
-            # Check the list of variants is valid and find their objects
-            solved_variants = {}
-            for variant in args.variant:
-                if variant == 'NONE':
-                    solved_variants[''] = None
-                else:
-                    solved_variants[variant] = RegOutput.check_variant(variant)
-            # Now iterate all of them
-            first = True
-            for var_name, var_obj in solved_variants.items():
-                logger.info(f'Variant `{var_name}`:')
-                GS.variant = GS.global_variant = var_name
-                GS.solved_global_variant = var_obj
-                if first:
-                    first = False
-                else:
-                    # Reset all outputs
-                    for o in RegOutput.get_outputs():
-                        old_tree = o._tree
-                        o.__init__()
-                        o.set_tree(old_tree)
-                    # Preflights aren't "variantic", so skip all of them for the rest of variants
-                    args.skip_pre = 'all'
-                generate_outputs(args.target, args.invert_sel, args.skip_pre, args.cli_order, args.no_priority,
-                                 dont_stop=args.dont_stop)
-            return 0
-        else:
-            # Do all the job (preflight + outputs)
-            if False:
-                import cProfile
-                logger.error('Start')
-                with cProfile.Profile() as pr:
+        # The timings are stored even when we fail
+        try:
+            jobs = parse_jobs(args.jobs)
+            variant_jobs = parse_jobs(args.variant_jobs, 'variant jobs')
+            if args.variant:
+                # One or more variants specified at the CLI
+                if 'ALL' in args.variant:
+                    variants = list(RegOutput.get_variants().keys())
+                    if 'NONE' in args.variant:
+                        variants.insert(0, 'NONE')
+                    if not variants:
+                        GS.exit_with_error('Asking to generate ALL variants, but no variant defined', EXIT_BAD_ARGS)
+                    args.variant = variants
+                logger.debug(f'Generating variants: {args.variant}')
+                # Check the list of variants is valid and find their objects
+                solved_variants = {}
+                for variant in args.variant:
+                    if variant == 'NONE':
+                        solved_variants[''] = None
+                    else:
+                        solved_variants[variant] = RegOutput.check_variant(variant)
+                if variant_jobs > 1 and len(solved_variants) > 1:
+                    if parallel_available():
+                        generate_variants(solved_variants, variant_jobs, args.target, args.invert_sel, args.skip_pre,
+                                          args.cli_order, args.no_priority, dont_stop=args.dont_stop, jobs=jobs)
+                        logger.log_totals()
+                        return 0
+                    logger.warning(W_NOPARALLEL+'Parallel variants generation not available on this platform, using one job')
+                # Now iterate all of them
+                first = True
+                for var_name, var_obj in solved_variants.items():
+                    logger.info(f'Variant `{var_name}`:')
+                    GS.variant = GS.global_variant = var_name
+                    GS.solved_global_variant = var_obj
+                    if first:
+                        first = False
+                    else:
+                        # Reset all outputs
+                        reset_outputs()
+                        # Preflights aren't "variantic", so skip all of them for the rest of variants
+                        args.skip_pre = 'all'
                     generate_outputs(args.target, args.invert_sel, args.skip_pre, args.cli_order, args.no_priority,
-                                     dont_stop=args.dont_stop)
-                    pr.print_stats(sort='time')
-                    pr.print_stats(sort='cumulative')
-                logger.error('End')
+                                     dont_stop=args.dont_stop, jobs=jobs)
+                return 0
             else:
+                # Do all the job (preflight + outputs)
                 generate_outputs(args.target, args.invert_sel, args.skip_pre, args.cli_order, args.no_priority,
-                                 dont_stop=args.dont_stop)
+                                 dont_stop=args.dont_stop, jobs=jobs)
+        finally:
+            timings.write()
     # Print total warnings
     logger.log_totals()
 
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-# Copyright (c) 2020-2023 Salvador E. Tropea
-# Copyright (c) 2020-2023 Instituto Nacional de Tecnología Industrial
+# Copyright (c) 2020-2025 Salvador E. Tropea
+# Copyright (c) 2020-2025 Instituto Nacional de Tecnología Industrial
 # Copyright (c) 2016-2020 Oliver Henry Walters (@SchrodingersGat)
 # License: MIT
 # Project: KiBot (formerly KiPlot)
@@ -11,6 +11,7 @@ All the logic to convert a list of components into the rows and columns used to
 """
 import locale
 from copy import deepcopy
+from functools import partial
 from math import ceil
 from .units import compare_values, comp_match
 from .bom_writer import write_bom
@@ -459,8 +460,100 @@ def compute_multiple_stats(cfg, groups):
                          format(sch.name, sch.comp_total, sch.comp_fitted, sch.comp_build))
 
 
+class GroupsIndex(object):
+    """ Finds the group for a component without comparing it against all the groups.
+        Each grouping criteria computes a set of keys for a component, two components can match only if they share at
+        least one key for each criteria. A criteria returning None doesn't restrict the search, this is used for blank
+        fields when `merge_blank_fields` is enabled. Fields with fallbacks can't be expressed using keys, so they are
+        only checked by `compare_components`, like all the other criteria.
+        The groups are kept in creation order, so we get the same result we get comparing against all the groups. """
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.groups = []
+        # The buckets use the things that must be exactly the same: fitted, fixed and the reference when not grouping
+        self.buckets = {}
+        self.criteria = []
+        self.aliases = {}
+        for field, field_alt in zip(cfg.group_fields, cfg.group_fields_fallbacks):
+            if field_alt:
+                continue
+            if field == ColumnList.COL_VALUE_L:
+                self.criteria.append(self.value_keys)
+            elif field == ColumnList.COL_PART_L:
+                self.criteria.append(self.part_keys)
+            else:
+                self.criteria.append(partial(self.field_keys, field))
+
+    def value_keys(self, c):
+        """ Keys for `compare_value` """
+        value = c.value.strip().lower()
+        keys = [('value', '' if value == '~' else value)]
+        if c.value_sort:
+            keys.append(('parsed', str(c.value_sort)))
+        if self.cfg.group_connectors and 'connector' in c.lib.lower():
+            keys.append(('connector', ))
+        return keys
+
+    def part_keys(self, c):
+        """ Keys for `compare_part_name` """
+        name = c.name.lower()
+        keys = self.aliases.get(name)
+        if keys is None:
+            keys = self.aliases[name] = [name]+[n for n, alias in enumerate(self.cfg.component_aliases) if name in alias]
+        return keys
+
+    def field_keys(self, field, c):
+        """ Keys for `compare_field` """
+        value = c.get_field_value(field).lower()
+        if value == '':
+            if self.cfg.merge_blank_fields:
+                return None
+            if not self.cfg.merge_both_blank:
+                return ()
+        return (value, )
+
+    def add(self, c):
+        """ Add the component to the first group that matches, or create a new one """
+        cfg = self.cfg
+        bucket_key = (c.fixed, None if cfg.group_not_fitted else c.fitted, c.ref if not cfg.group_fields else None)
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.buckets[bucket_key] = ([], [({}, set()) for _ in self.criteria])
+        b_groups, b_indexes = bucket
+        c_keys = [crit(c) for crit in self.criteria]
+        # Groups sharing keys for all the criteria, we start with the criteria that has less groups
+        restrictions = []
+        for keys, (index, wildcards) in zip(c_keys, b_indexes):
+            if keys is not None:
+                restrictions.append([index[k] for k in keys if k in index]+[wildcards])
+        candidates = None
+        if restrictions:
+            restrictions.sort(key=lambda sets: sum(map(len, sets)))
+            candidates = set().union(*restrictions[0])
+            for sets in restrictions[1:]:
+                if not candidates:
+                    break
+                candidates = {n for n in candidates if any(n in s for s in sets)}
+        for g in b_groups if candidates is None else (b_groups[n] for n in sorted(candidates)):
+            if g.match_component(c):
+                g.add_component(c)
+                return
+        # Create a new group
+        g = ComponentGroup(cfg)
+        g.add_component(c)
+        self.groups.append(g)
+        n = len(b_groups)
+        b_groups.append(g)
+        for keys, (index, wildcards) in zip(c_keys, b_indexes):
+            if keys is None:
+                wildcards.add(n)
+            else:
+                for k in keys:
+                    index.setdefault(k, set()).add(n)
+
+
 def group_components(cfg, components):
-    groups = []
+    index = GroupsIndex(cfg)
     # Iterate through each component, and test whether a group for these already exists
     for c in components:
         if not c.included:  # Skip components marked as excluded from BoM
@@ -470,18 +563,8 @@ def group_components(cfg, components):
             c.value_sort = comp_match(c.value, c.ref_prefix, c.ref, warn_extra=True)
         else:
             c.value_sort = None
-        # Try to add the component to an existing group
-        found = False
-        for g in groups:
-            if g.match_component(c):
-                g.add_component(c)
-                found = True
-                break
-        if not found:
-            # Create a new group
-            g = ComponentGroup(cfg)
-            g.add_component(c)
-            groups.append(g)
+        index.add(c)
+    groups = index.groups
     # Now unify the data from the components of each group
     decimal_point = None
     if cfg.normalize_locale:
@@ -9,6 +9,7 @@ from lark import Lark, Transformer
 import os
 from ..gs import GS
 from .. import log
+from . import parse_cache
 
 logger = log.get_logger()
 # Metric to imperial package sizes
@@ -198,24 +199,36 @@ def initialize():
         return
     with open(os.path.join(GS.get_resource_path('parsers'), 'electro.lark'), 'rt') as f:
         g = f.read()
+    # Note: the grammar is ambiguous, LALR can't be used
     parser = Lark(g, start='main')  # , debug=DEBUG)
+    parse_cache.load(g, __file__)
 
 
-def parse(text, with_extra=False, stronger=False):
-    initialize()
-    if stronger:
-        text = text.replace('+/-', ' +/-')
-        text = text.replace(' - ', ' ')
+def _parse(text):
+    """ Returns the parsed values and the extra information """
     try:
         tree = parser.parse(text)
     except Exception as e:
         logger.debugl(2, str(e))
-        return {}
+        return {}, {}
     logger.debugl(3, tree.pretty())
     res_o = ComponentTransformer()
     res = res_o.transform(tree)
     logger.debugl(3, res)
-    res = res_o.parsed
+    return res_o.parsed, res_o.extra
+
+
+def parse(text, with_extra=False, stronger=False):
+    initialize()
+    if stronger:
+        text = text.replace('+/-', ' +/-')
+        text = text.replace(' - ', ' ')
+    cached = parse_cache.get(text)
+    if cached is None:
+        cached = _parse(text)
+        parse_cache.put(text, cached)
+    parsed, extra = cached
+    res = dict(parsed)
     if with_extra:
-        res.update(res_o.extra)
+        res.update(extra)
     return res
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: MIT
+# Project: KiBot (formerly KiPlot)
+"""
+Persistent cache for the component values parsed using the electro-grammar
+
+The grammar is ambiguous, so Lark needs the Earley algorithm, and parsing a value takes ~10 ms. Most projects use the
+same values (i.e. `100nF 50V X7R 0402`) again and again, so we keep the results between runs.
+The key is the text we parse, it already contains the reference prefix and uses `.` as decimal point (the locale
+decimal point is converted before parsing). The cache is shared by all the users of `comp_match` (bom, kibom and the
+value related filters).
+The entries are discarded if the grammar or the transformer changes. When the cache grows too much we remove the least
+recently used entries.
+Only used when the `cache_values` global option is enabled, otherwise the parsed values are just kept during the run.
+The file is JSON, the `Decimal` values are stored as tagged strings.
+"""
+from decimal import Decimal
+import hashlib
+import json
+import os
+import tempfile
+from .. import __version__
+from ..gs import GS
+from .. import log
+
+logger = log.get_logger()
+# Change it if the format of the entries changes
+CACHE_VERSION = 2
+MAX_ENTRIES = 20000
+DECIMAL_TAG = '__decimal__'
+# Solved by load(), None when the persistent cache is disabled
+cache_file = None
+_stamp = None
+_cache = {}
+# Entries added during this run
+_new = {}
+# Keys found in the cache during this run
+_used = set()
+
+
+def get_cache_file():
+    if not GS.global_cache_values:
+        return None
+    if GS.global_cache_values_dir:
+        dir_name = os.path.abspath(os.path.expanduser(GS.global_cache_values_dir))
+    else:
+        dir_name = os.path.join(os.path.expanduser('~'), '.cache', 'kibot')
+    return os.path.join(dir_name, 'values.json')
+
+
+def load(grammar, transformer_file):
+    """ Loads the cache. The `grammar` and the transformer code are part of the stamp """
+    global _stamp, _cache, cache_file
+    h = hashlib.sha256(grammar.encode())
+    with open(transformer_file, 'rb') as f:
+        h.update(f.read())
+    _stamp = [CACHE_VERSION, __version__, h.hexdigest()]
+    cache_file = get_cache_file()
+    _cache = _read()
+    _new.clear()
+    _used.clear()
+    logger.debugl(2, f'- {len(_cache)} parsed values in the cache')
+
+
+def _encode(o):
+    if isinstance(o, Decimal):
+        return {DECIMAL_TAG: str(o)}
+    raise TypeError(f'Unsupported type in the parsed values cache: {type(o)}')
+
+
+def _decode(d):
+    if len(d) == 1 and DECIMAL_TAG in d:
+        return Decimal(d[DECIMAL_TAG])
+    return d
+
+
+def _read():
+    if cache_file is None:
+        return {}
+    try:
+        with open(cache_file, 'rt') as f:
+            cache = json.load(f, object_hook=_decode)
+        data = cache['data']
+        if cache['stamp'] == _stamp and isinstance(data, dict):
+            return data
+    except (OSError, ValueError, TypeError, KeyError, ArithmeticError):
+        pass
+    return {}
+
+
+def get(key):
+    """ The parsed value, None if not in the cache """
+    res = _cache.get(key)
+    if res is not None:
+        _used.add(key)
+    return res
+
+
+def put(key, res):
+    _cache[key] = res
+    if cache_file is not None:
+        _new[key] = res
+
+
+def save():
+    """ Stores the new entries. We read the file again because other KiBot instances could be running """
+    if not _new or cache_file is None:
+        return
+    try:
+        data = _read()
+        # The used entries go to the end, so they are the last to be removed
+        for key in _used:
+            res = data.pop(key, None)
+            if res is not None:
+                data[key] = res
+        data.update(_new)
+        if len(data) > MAX_ENTRIES:
+            data = dict(list(data.items())[-MAX_ENTRIES:])
+        dir_name = os.path.dirname(cache_file)
+        os.makedirs(dir_name, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wt', dir=dir_name, delete=False) as f:
+            json.dump({'stamp': _stamp, 'data': data}, f, default=_encode)
+        os.replace(f.name, cache_file)
+    except (OSError, TypeError) as e:
+        logger.debug(f'- Failed to save the parsed values cache ({e})')
+        return
+    logger.debugl(2, f'- Stored {len(_new)} new parsed values in the cache')
+    _new.clear()
+    _used.clear()
@@ -1,36 +1,206 @@
 # -*- coding: utf-8 -*-
-# Copyright (c) 2022 Salvador E. Tropea
-# Copyright (c) 2022 Instituto Nacional de Tecnología Industrial
+# Copyright (c) 2022-2025 Salvador E. Tropea
+# Copyright (c) 2022-2025 Instituto Nacional de Tecnología Industrial
 # Copyright (c) 2022 Albin Dennevi (create_pdf_from_pages)
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 # Base idea: https://gitlab.com/dennevi/Board2Pdf/ (Released as Public Domain)
+import hashlib
+from io import BytesIO
 from . import PyPDF2
+from .PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject,
+                             NullObject, NumberObject, RectangleObject, StreamObject)
 from . import log
 
 logger = log.get_logger()
+# Objects we never copy from the sources, they belong to the page tree of the source
+SKIP_TYPES = {'/Page', '/Pages', '/Catalog'}
+
+
+def serialize(obj):
+    buf = BytesIO()
+    obj.writeToStream(buf, None)
+    return buf.getvalue()
+
+
+class PDFJoiner(object):
+    """ Writes the pages to the output PDF as soon as they are added.
+        Only the objects used by the page are copied, and they are written when we finish with them. Objects with the
+        same content (i.e. fonts and images used by many pages) are written only once. The content streams that are
+        already compressed are copied verbatim.
+        So the memory usage doesn't depend on the number of pages. """
+    def __init__(self, stream):
+        self.stream = stream
+        self.offsets = {}
+        self.last_id = 0
+        # Digest of the content -> object number
+        self.digests = {}
+        self.kids = []
+        # Source object -> object number (None while we are copying it)
+        self.map = {}
+        self.reader = None
+        stream.write(b'%PDF-1.3\n%\xe2\xe3\xcf\xd3\n')
+        self.pages_id = self.reserve()
+
+    def reserve(self):
+        self.last_id += 1
+        return self.last_id
+
+    def write_object(self, idnum, data):
+        self.offsets[idnum] = self.stream.tell()
+        self.stream.write(b'%d 0 obj\n' % idnum)
+        self.stream.write(data)
+        self.stream.write(b'\nendobj\n')
+
+    def write_shared(self, data):
+        """ Writes an object that can be shared, returns its number """
+        digest = hashlib.sha1(data).digest()
+        idnum = self.digests.get(digest)
+        if idnum is None:
+            idnum = self.digests[digest] = self.reserve()
+            self.write_object(idnum, data)
+        return idnum
+
+    def copy(self, value):
+        """ Copy of a direct object, with the references translated to the output file """
+        if isinstance(value, IndirectObject):
+            return self.copy_ref(value)
+        if isinstance(value, DictionaryObject):
+            if isinstance(value, StreamObject):
+                new = value.__class__()
+                new._data = value._data
+            else:
+                new = DictionaryObject()
+            for k, v in dict.items(value):
+                new[k] = self.copy(v)
+            return new
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self.copy(v) for v in value)
+        return value
+
+    def copy_ref(self, ref):
+        key = (ref.idnum, ref.generation)
+        idnum = self.map.get(key)
+        if idnum is None:
+            if key in self.map:
+                # A reference to an object we are copying, it can't be shared
+                idnum = self.map[key] = self.reserve()
+            else:
+                try:
+                    obj = ref.getObject()
+                except (ValueError, PyPDF2.utils.PdfReadError):
+                    obj = None
+                if obj is None or (isinstance(obj, DictionaryObject) and obj.get('/Type') in SKIP_TYPES):
+                    return NullObject()
+                self.map[key] = None
+                data = serialize(self.copy(obj))
+                idnum = self.map[key]
+                if idnum is None:
+                    idnum = self.map[key] = self.write_shared(data)
+                else:
+                    self.write_object(idnum, data)
+        return IndirectObject(idnum, 0, None)
+
+    def copy_contents(self, page, scale):
+        """ The content streams of the page, compressed if needed """
+        contents = dict.get(page, '/Contents')
+        if contents is None:
+            return None
+        streams = contents.getObject()
+        refs = list(streams) if isinstance(streams, ArrayObject) else [contents]
+        new = []
+        for ref in refs:
+            stream = ref.getObject()
+            if '/Filter' in stream:
+                # Already compressed, copied verbatim
+                new.append(self.copy(ref))
+            else:
+                new.append(IndirectObject(self.write_shared(serialize(stream.flateEncode())), 0, None))
+        if scale is not None:
+            pre = DecodedStreamObject()
+            pre.setData('q\n{0} 0 0 {0} 0 0 cm\n'.format(scale).encode())
+            post = DecodedStreamObject()
+            post.setData(b'\nQ\n')
+            new.insert(0, IndirectObject(self.write_shared(serialize(pre)), 0, None))
+            new.append(IndirectObject(self.write_shared(serialize(post)), 0, None))
+        return new[0] if len(new) == 1 else ArrayObject(new)
+
+    @staticmethod
+    def scale_boxes(page, scale):
+        """ Same as PyPDF2 PageObject.scaleBy, but doesn't touch the contents """
+        box = page.mediaBox
+        page[NameObject('/MediaBox')] = RectangleObject([float(box.getLowerLeft_x())*scale,
+                                                         float(box.getLowerLeft_y())*scale,
+                                                         float(box.getUpperRight_x())*scale,
+                                                         float(box.getUpperRight_y())*scale])
+        if '/VP' in page:
+            viewport = page['/VP']
+            if isinstance(viewport, ArrayObject):
+                viewport = viewport[0]
+            viewport[NameObject('/BBox')] = RectangleObject([float(c)*scale for c in viewport['/BBox']])
+
+    def add_page(self, page, scale=None):
+        """ Copies a page from a PdfFileReader """
+        if page.pdf is not self.reader:
+            # The object numbers are only valid for the same source
+            self.reader = page.pdf
+            self.map = {}
+        if scale is not None:
+            self.scale_boxes(page, scale)
+        page_id = self.reserve()
+        if page.indirectRef is not None:
+            self.map[(page.indirectRef.idnum, page.indirectRef.generation)] = page_id
+        new = DictionaryObject()
+        for k, v in dict.items(page):
+            if k == '/Parent':
+                continue
+            v = self.copy_contents(page, scale) if k == '/Contents' else self.copy(v)
+            if v is not None:
+                new[k] = v
+        new[NameObject('/Parent')] = IndirectObject(self.pages_id, 0, None)
+        self.write_object(page_id, serialize(new))
+        self.kids.append(page_id)
+
+    def close(self):
+        """ Writes the page tree, the catalog and the cross-reference table """
+        pages = DictionaryObject()
+        pages[NameObject('/Type')] = NameObject('/Pages')
+        pages[NameObject('/Count')] = NumberObject(len(self.kids))
+        pages[NameObject('/Kids')] = ArrayObject(IndirectObject(k, 0, None) for k in self.kids)
+        self.write_object(self.pages_id, serialize(pages))
+        root = DictionaryObject()
+        root[NameObject('/Type')] = NameObject('/Catalog')
+        root[NameObject('/Pages')] = IndirectObject(self.pages_id, 0, None)
+        root_id = self.reserve()
+        self.write_object(root_id, serialize(root))
+        info = DictionaryObject()
+        info[NameObject('/Producer')] = PyPDF2.generic.createStringObject('KiBot')
+        info_id = self.reserve()
+        self.write_object(info_id, serialize(info))
+        xref = self.stream.tell()
+        size = self.last_id+1
+        self.stream.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        for idnum in range(1, size):
+            self.stream.write(b'%010d 00000 n \n' % self.offsets[idnum])
+        self.stream.write(b'trailer\n<<\n/Size %d\n/Root %d 0 R\n/Info %d 0 R\n>>\nstartxref\n%d\n%%%%EOF\n' %
+                          (size, root_id, info_id, xref))
 
 
 def create_pdf_from_pages(input_files, output_fn, forced_width=None):
-    output = PyPDF2.PdfFileWriter()
-    # Collect all pages
-    open_files = []
-    for filename in input_files:
-        file = open(filename, 'rb')
-        open_files.append(file)
-        pdf_reader = PyPDF2.PdfFileReader(file)
-        page_obj = pdf_reader.getPage(0)
-        if forced_width is not None:
-            width = float(page_obj.mediaBox.getWidth())*25.4/72
-            scale = round(forced_width/width, 4)
-            logger.debugl(1, 'PDF scale {} ({} -> {})'.format(scale, width, forced_width))
-            if abs(1.0-scale) > 0.0001:
-                page_obj.scaleBy(scale)
-        page_obj.compressContentStreams()
-        output.addPage(page_obj)
-    # Write all pages to a file
+    """ Joins the first page of each file """
     with open(output_fn, 'wb') as pdf_output:
-        output.write(pdf_output)
-    # Close the files
-    for f in open_files:
-        f.close()
+        output = PDFJoiner(pdf_output)
+        for filename in input_files:
+            # Only one input file is open at a time
+            with open(filename, 'rb') as file:
+                page_obj = PyPDF2.PdfFileReader(file).getPage(0)
+                scale = None
+                if forced_width is not None:
+                    width = float(page_obj.mediaBox.getWidth())*25.4/72
+                    scale = round(forced_width/width, 4)
+                    logger.debugl(1, 'PDF scale {} ({} -> {})'.format(scale, width, forced_width))
+                    if abs(1.0-scale) <= 0.0001:
+                        scale = None
+                output.add_page(page_obj, scale)
+        output.close()
+    logger.debugl(1, 'Joined {} pages using {} objects'.format(len(output.kids), output.last_id))
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-# Copyright (c) 2022-2023 Salvador E. Tropea
-# Copyright (c) 2022-2023 Instituto Nacional de Tecnología Industrial
+# Copyright (c) 2022-2025 Salvador E. Tropea
+# Copyright (c) 2022-2025 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 """
@@ -120,6 +120,7 @@ import stat
 import subprocess
 from sys import exit, stdout, modules
 import tarfile
+import tempfile
 from time import sleep
 from .misc import MISSING_TOOL, TRY_INSTALL_CHECK, W_DOWNTOOL, W_MISSTOOL, USER_AGENT, version_str2tuple
 from .gs import GS
@@ -135,6 +136,10 @@ EXEC_PERM = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_I
 last_stderr = None
 version_check_fail = False
 binary_tools_cache = {}
+# Persistent cache for the versions of the binaries, keyed by the file identity (mtime, size and inode)
+versions_cache_file = os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'tools_versions.json')
+versions_cache = None
+refresh_versions_cache = False
 disable_auto_download = False
 # Dependency templates, no roles
 base_deps = {}
@@ -639,6 +644,58 @@ def run_command(cmd, only_first_line=False, pre_ver_text=None, no_err_2=False):
     return None
 
 
+def _load_versions_cache():
+    try:
+        with open(versions_cache_file, 'rt') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return data
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _file_id(full_name):
+    st = os.stat(full_name)
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def get_cached_version(full_name, cmd):
+    """ Look for the version in the persistent cache, returns (found, version) """
+    global versions_cache
+    if refresh_versions_cache:
+        return False, None
+    if versions_cache is None:
+        versions_cache = _load_versions_cache()
+    entry = versions_cache.get(' '.join(cmd))
+    try:
+        if entry is None or entry['id'] != _file_id(full_name):
+            return False, None
+        version = entry['version']
+    except (OSError, KeyError, TypeError):
+        return False, None
+    if version is None:
+        # Old caches could contain failed probes
+        return False, None
+    return True, tuple(version)
+
+
+def store_cached_version(full_name, cmd, version):
+    """ Add the version to the persistent cache.
+        We read the file again because other KiBot instances could be running """
+    global versions_cache
+    try:
+        versions_cache = _load_versions_cache()
+        versions_cache[' '.join(cmd)] = {'id': _file_id(full_name), 'version': version}
+        dir_name = os.path.dirname(versions_cache_file)
+        os.makedirs(dir_name, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wt', dir=dir_name, delete=False) as f:
+            json.dump(versions_cache, f)
+        os.replace(f.name, versions_cache_file)
+    except OSError as e:
+        logger.debug('- Failed to save the tools versions cache ({})'.format(e))
+
+
 def check_tool_binary_version(full_name, dep, no_cache=False):
     logger.debugl(2, '- Checking version for `{}`'.format(full_name))
     global version_check_fail
@@ -665,9 +722,16 @@ def check_tool_binary_version(full_name, dep, no_cache=False):
         cmd = [full_name, dep.help_option]
         if dep.is_kicad_plugin:
             cmd.insert(0, 'python3')
-        version = run_command(cmd, no_err_2=dep.no_cmd_line_version_old)
+        found, version = (False, None) if no_cache else get_cached_version(full_name, cmd)
+        if found:
+            logger.debugl(2, '- Version from the persistent cache {}'.format(version))
+        else:
+            version = run_command(cmd, no_err_2=dep.no_cmd_line_version_old)
+            # Failed probes could be transient, don't remember them
+            if version is not None:
+                store_cached_version(full_name, cmd, version)
+            logger.debugl(2, '- Found version {}'.format(version))
         binary_tools_cache[full_name] = version
-        logger.debugl(2, '- Found version {}'.format(version))
     version_check_fail = version is None or version < needs
     return None if version_check_fail else full_name, version
 
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Download cache
+
+Downloads a group of URLs using a pool of threads. The connections are reused using a shared session and we limit the
+number of simultaneous downloads from the same host. The files are stored in a persistent cache, keyed by the URL, and
+revalidated using the ETag/Last-Modified headers, so a file that didn't change isn't transferred again.
+Each use of an entry touches its metadata file, when we finish we remove the entries not used for a long time and then
+the least recently used ones until the cache fits in the size limit.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from shutil import rmtree
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+import urllib.error
+import urllib.request
+import requests
+from .misc import USER_AGENT
+from . import log
+
+logger = log.get_logger()
+
+
+def get_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'datasheets')
+
+
+class Downloader(object):
+    def __init__(self, cache_dir, workers=8, per_host=2, timeout=20, max_size=None, max_age=None):
+        self.cache_dir = cache_dir
+        # Limits for the cache, in bytes and seconds, None means no limit
+        self.max_size = max_size
+        self.max_age = max_age
+        self.workers = max(workers, 1)
+        self.per_host = max(per_host, 1)
+        self.timeout = timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        # Used for the files we can't store in the cache
+        self._no_cache_dir = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def close(self):
+        self.session.close()
+        if self._no_cache_dir is not None:
+            rmtree(self._no_cache_dir, ignore_errors=True)
+        self.trim()
+
+    def trim(self):
+        """ Removes the entries not used in `max_age` seconds, and then the least recently used entries until the cache
+            size is below `max_size` bytes """
+        if self.max_size is None and self.max_age is None:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            meta_file = os.path.join(self.cache_dir, name)
+            data_file = meta_file[:-5]+'.data'
+            try:
+                mtime = os.path.getmtime(meta_file)
+                size = os.path.getsize(data_file)
+            except OSError:
+                continue
+            entries.append((mtime, size, data_file, meta_file))
+            total += size
+        too_old = time.time()-self.max_age if self.max_age is not None else None
+        for mtime, size, data_file, meta_file in sorted(entries):
+            if (too_old is None or mtime >= too_old) and (self.max_size is None or total <= self.max_size):
+                break
+            logger.debug('- Removing {} from the datasheets cache'.format(os.path.basename(data_file)))
+            for f in (meta_file, data_file):
+                try:
+                    os.remove(f)
+                except OSError:
+                    pass
+            total -= size
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            sem = self._hosts.get(host)
+            if sem is None:
+                sem = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+        return sem
+
+    def _entry(self, url):
+        base = os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest())
+        return base+'.data', base+'.json'
+
+    @staticmethod
+    def _load_meta(meta_file, data_file):
+        if not os.path.isfile(data_file):
+            return None
+        try:
+            with open(meta_file, 'rt') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _touch(meta_file):
+        """ Mark the entry as recently used """
+        try:
+            os.utime(meta_file)
+        except OSError:
+            pass
+
+    def _store(self, url, data, etag, last_modified):
+        data_file, meta_file = self._entry(url)
+        try:
+            # Write to temporal files and then rename them, other processes could be using the cache
+            for name, content in ((data_file, data),
+                                  (meta_file, json.dumps({'url': url, 'etag': etag,
+                                                          'last_modified': last_modified}).encode())):
+                fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp, name)
+            return data_file
+        except OSError as e:
+            logger.debug('- Failed to store {} in the cache ({})'.format(url, e))
+        # Not cached, the file is removed by close()
+        with self._lock:
+            if self._no_cache_dir is None:
+                self._no_cache_dir = tempfile.mkdtemp(prefix='kibot-datasheets-')
+        fd, name = tempfile.mkstemp(dir=self._no_cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return name
+
+    @staticmethod
+    def _validators(meta):
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def _get_urllib(self, url, headers):
+        """ Some sites (i.e. Digi-Key) refuse the requests module """
+        req = urllib.request.Request(url)
+        req.add_header('User-Agent', USER_AGENT)
+        for k, v in headers.items():
+            req.add_header(k, v)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                return 200, r.read(), r.headers.get('ETag'), r.headers.get('Last-Modified'), None
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, None, None, None
+            return None, None, None, None, 'Failed '+str(e)
+        except Exception as e:
+            return None, None, None, None, 'Failed '+str(e)
+
+    def _get_requests(self, url, headers):
+        try:
+            r = self.session.get(url, allow_redirects=True, headers=headers, timeout=self.timeout)
+        except requests.exceptions.ReadTimeout:
+            return None, None, None, None, 'Timeout'
+        except requests.exceptions.SSLError:
+            return None, None, None, None, 'SSL Error'
+        except requests.exceptions.TooManyRedirects:
+            return None, None, None, None, 'More than 30 redirections'
+        except requests.exceptions.ConnectionError:
+            return None, None, None, None, 'Connection'
+        except requests.exceptions.RequestException as e:
+            return None, None, None, None, str(e)
+        if r.status_code not in (200, 304):
+            return None, None, None, None, 'Failed with status '+str(r.status_code)
+        return r.status_code, r.content, r.headers.get('ETag'), r.headers.get('Last-Modified'), None
+
+    def fetch(self, url):
+        """ Returns the name of a file with the content of the URL and an error message """
+        data_file, meta_file = self._entry(url)
+        meta = self._load_meta(meta_file, data_file)
+        headers = self._validators(meta)
+        with self._host_limit(url):
+            if 'digikey' in url:
+                status, data, etag, last_modified, error = self._get_urllib(url, headers)
+            else:
+                status, data, etag, last_modified, error = self._get_requests(url, headers)
+        if status == 304:
+            if not meta:
+                # We didn't ask for it, the entry was removed by another process
+                return None, 'Server reported not modified, but not in the cache'
+            logger.debug('- Not modified: '+url)
+            self._touch(meta_file)
+            return data_file, None
+        if error:
+            if meta:
+                logger.debug('- Using the cached copy of {}, the download failed ({})'.format(url, error))
+                self._touch(meta_file)
+                return data_file, None
+            return None, error
+        logger.debug('- Downloaded: {} ({} bytes)'.format(url, len(data)))
+        try:
+            return self._store(url, data, etag, last_modified), None
+        except OSError as e:
+            return None, 'Failed to store the file ({})'.format(e)
+
+    def fetch_all(self, urls):
+        """ Downloads all the URLs, returns a dict with the results of `fetch` """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as pool:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
@@ -92,6 +92,9 @@ SIMP_FIL = {'_only_smd': {'comment': 'Internal filter for only SMD parts',
                              'replace_source': False,
                              'comment': 'Internal value split filter oriented to just add information'},
             }
+# Results of the logic filters, see `_apply_logic_filter`
+_memo = {}
+MAX_MEMO = 64
 
 
 class DummyFilter(Registrable):
@@ -106,6 +109,12 @@ class DummyFilter(Registrable):
     def filter(self, comp):
         return None if self._is_transform else True
 
+    def filter_list(self, comps):
+        return [True]*len(comps)
+
+    def memo_key(self):
+        return None
+
 
 class MultiFilter(Registrable):
     """ A filter containing a list of filters.
@@ -153,6 +162,36 @@ class MultiFilter(Registrable):
             return None
         return comps
 
+    def filter_list(self, comps):
+        """ Applies the logic filter to all the components, each filter is applied to the whole list """
+        res = [True]*len(comps)
+        # The components to test and the index of the original component
+        pending = list(enumerate(comps))
+        for f in self.filters:
+            if f._is_transform:
+                new_pending = []
+                for n, c in pending:
+                    ret = f.filter(c)
+                    if ret is None:
+                        new_pending.append((n, c))
+                    else:
+                        new_pending.extend((n, new_c) for new_c in ret)
+                pending = new_pending
+            else:
+                new_pending = []
+                for (n, c), passed in zip(pending, f.filter_list([c for _, c in pending])):
+                    if passed:
+                        new_pending.append((n, c))
+                    else:
+                        res[n] = False
+                pending = new_pending
+        return res
+
+    def memo_key(self):
+        """ The key for the chain, only if all the filters can be memoized """
+        keys = tuple(f.memo_key() for f in self.filters)
+        return None if None in keys else keys
+
 
 class NotFilter(Registrable):
     """ A filter that returns the inverted result """
@@ -167,16 +206,52 @@ class NotFilter(Registrable):
     def filter(self, comp):
         return not self._filter.filter(comp)
 
+    def filter_list(self, comps):
+        return [not r for r in self._filter.filter_list(comps)]
+
+    def memo_key(self):
+        key = self._filter.memo_key()
+        return None if key is None else ('!', key)
+
+
+def _apply_logic_filter(comps, filter):
+    """ Results of a logic filter for a list of components.
+        The results are memoized, so outputs using the same filters over the same components don't compute them again.
+        This is valid only if the components didn't change since the last `reset_filters`. We assume the data from the
+        PCB is the same, but we include the references (the BoM can add a prefix). """
+    key = filter.memo_key()
+    if key is None or not all(c.pristine for c in comps):
+        return filter.filter_list(comps)
+    key = (key, tuple(map(id, comps)), tuple(c.ref for c in comps))
+    res = _memo.get(key)
+    if res is None:
+        res = filter.filter_list(comps)
+        # We keep a reference to the components, so their ids aren't reused
+        _memo[key] = (comps, res)
+        if len(_memo) > MAX_MEMO:
+            # Remove the oldest
+            del _memo[next(iter(_memo))]
+    else:
+        logger.debugl(2, '- Using memoized results')
+        res = res[1]
+    return res
+
 
 def apply_pre_transform(comps, filter):
     if filter:
         logger.debug('Applying transform filter `{}`'.format(filter.name))
+        is_dummy = isinstance(filter, DummyFilter)
         new_comps = []
         for c in comps:
+            if not is_dummy:
+                c.pristine = False
             ret = filter.filter(c)
             if ret is None:
                 new_comps.append(c)
             else:
+                if not is_dummy:
+                    for new_c in ret:
+                        new_c.pristine = False
                 new_comps.extend(ret)
         return new_comps
     return comps
@@ -185,11 +260,11 @@ def apply_pre_transform(comps, filter):
 def apply_exclude_filter(comps, filter):
     if filter:
         logger.debug('Applying filter `{}` to exclude'.format(filter.name))
-        for c in comps:
-            if c.included:
-                c.included = filter.filter(c)
-                if not c.included:
-                    logger.debugl(3, f'- {c.ref} excluded')
+        comps = [c for c in comps if c.included]
+        for c, included in zip(comps, _apply_logic_filter(comps, filter)):
+            c.included = included
+            if not included:
+                logger.debugl(3, f'- {c.ref} excluded')
 
 
 def reset_filters(comps, kicad_dnp_applied='global'):
@@ -207,24 +282,25 @@ def reset_filters(comps, kicad_dnp_applied='global'):
         c.set_fitted(fitted)
         c.set_fixed(False)
         c.back_up_fields()
+        c.pristine = True
 
 
 def apply_fitted_filter(comps, filter):
     if filter:
         logger.debug('Applying filter `{}` to fitted'.format(filter.name))
-        for c in comps:
-            if c.fitted:
-                c.set_fitted(filter.filter(c))
-                if not c.fitted and GS.debug_level > 2:
-                    logger.debug('- Not fit: '+c.ref)
+        comps = [c for c in comps if c.fitted]
+        for c, fitted in zip(comps, _apply_logic_filter(comps, filter)):
+            c.set_fitted(fitted)
+            if not fitted and GS.debug_level > 2:
+                logger.debug('- Not fit: '+c.ref)
 
 
 def apply_fixed_filter(comps, filter):
     if filter:
         logger.debug('Applying filter `{}` to fixed'.format(filter.name))
-        for c in comps:
-            if not c.fixed:
-                c.set_fixed(filter.filter(c))
+        comps = [c for c in comps if not c.fixed]
+        for c, fixed in zip(comps, _apply_logic_filter(comps, filter)):
+            c.set_fixed(fixed)
 
 
 class BaseFilter(RegFilter):
@@ -251,6 +327,14 @@ class BaseFilter(RegFilter):
         if self.name and self.name.startswith('_') and not self._internal:
             raise KiPlotConfigurationError('Filter names starting with `_` are reserved ({})'.format(self.name))
 
+    def filter_list(self, comps):
+        """ Applies a logic filter to a list of components """
+        return [self.filter(c) for c in comps]
+
+    def memo_key(self):
+        """ Key used to memoize the results of a logic filter, None if we can't memoize them """
+        return None
+
     @staticmethod
     def _create_mechanical(name):
         o_tree = {'name': name}
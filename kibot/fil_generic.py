@@ -99,117 +99,150 @@ class Generic(BaseFilter):  # noqa: F821
             self._keys = DNF if self.keys[0] == 'dnf_list' else DNC
         else:
             # Ensure lowercase
-            self._keys = [v.lower() for v in self.keys]
+            self._keys = {v.lower() for v in self.keys}
         # Config field must be lowercase
         self.config_field = self.config_field.lower()
+        self._exclude_refs = set(self.exclude_refs)
+        # The tests are compiled on the first use, solving the field names could need the schematic
+        self._checks = None
 
-    def test_reg_include(self, c):
-        """ Reject components that doesn't match the provided regex.
-            So we include only the components that matches any of the regexs. """
-        if not self.include_only:  # Nothing to match against, means include all
-            return True
-        for reg in self.include_only:
+    @staticmethod
+    def _compile_regs(regs):
+        """ The regular expressions as tuples, with the field names solved """
+        res = []
+        for reg in regs:
             reg.column = Optionable.solve_field_name(reg.column)
-            if reg.skip_if_no_field and not c.is_field(reg.column):
+            res.append((reg.column, reg.regex, reg.skip_if_no_field, reg.match_if_field, reg.match_if_no_field, reg.invert))
+        return tuple(res)
+
+    def _compile(self):
+        """ Creates the list of tests for this filter, only the enabled ones.
+            Each test returns True if the component must be excluded """
+        self._include_only = self._compile_regs(self.include_only)
+        self._exclude_any = self._compile_regs(self.exclude_any)
+        checks = []
+        # Exclude components with empty 'Value'
+        if self.exclude_empty_val:
+            checks.append(lambda c, value: value == '' or value == '~')
+        # Exclude all ref == #*
+        if self.exclude_all_hash_ref:
+            checks.append(lambda c, value: c.ref and c.ref[0] == '#')
+        # KiCad 5 PCB classification
+        if self.exclude_virtual:
+            checks.append(lambda c, value: c.virtual)
+        if self.exclude_smd:
+            checks.append(lambda c, value: c.smd)
+        if self.exclude_tht:
+            checks.append(lambda c, value: c.tht)
+        if self.exclude_top:
+            checks.append(lambda c, value: not c.bottom)
+        if self.exclude_bottom:
+            checks.append(lambda c, value: c.bottom)
+        if self.exclude_not_in_bom:
+            checks.append(lambda c, value: not (c.in_bom and c.in_bom_pcb))
+        if self.exclude_not_on_board:
+            checks.append(lambda c, value: not c.on_board)
+        # List of references to be excluded
+        if self._exclude_refs:
+            refs = self._exclude_refs
+            checks.append(lambda c, value: c.ref in refs or c.ref_prefix+'*' in refs)
+        # All stuff where keys are involved
+        if self._keys:
+            keys = self._keys
+            # Exclude components if their 'Value' is any of the keys
+            if self.exclude_value:
+                checks.append(lambda c, value: value in keys)
+            # Exclude components if a field is named as any of the keys
+            if self.exclude_field:
+                checks.append(lambda c, value: not keys.isdisjoint(c.dfields))
+            # Exclude components containing a key value in the config field.
+            if self.exclude_config:
+                checks.append(self._test_config)
+        # Regular expressions
+        if self._include_only:
+            checks.append(lambda c, value: not self._match_any(c, self._include_only, '- Including'))
+        if self._exclude_any:
+            checks.append(lambda c, value: self._match_any(c, self._exclude_any, 'Excluding'))
+        self._checks = checks
+
+    def _test_config(self, c, value):
+        config = c.get_field_value(self.config_field).strip().lower()
+        if not self.config_separators:
+            return config in self._keys
+        # Try with all the separators
+        for sep in self.config_separators:
+            # Try with all the extracted values
+            for opt in config.split(sep):
+                if opt.strip() in self._keys:
+                    return True
+        return False
+
+    @staticmethod
+    def _match_any(c, regs, action):
+        """ True if the component matches any of the compiled regexs """
+        for column, regex, skip_if_no_field, match_if_field, match_if_no_field, invert in regs:
+            is_field = c.is_field(column)
+            if skip_if_no_field and not is_field:
                 # Skip the check if the field doesn't exist
                 continue
-            if reg.match_if_field and c.is_field(reg.column):
+            if match_if_field and is_field:
                 return True
-            if reg.match_if_no_field and not c.is_field(reg.column):
+            if match_if_no_field and not is_field:
                 return True
-            field_value = c.get_field_value(reg.column)
-            res = reg.regex.search(field_value)
-            if reg.invert:
+            field_value = c.get_field_value(column)
+            res = regex.search(field_value)
+            if invert:
                 res = not res
             if res:
                 if GS.debug_level > 1:
-                    logger.debug("- Including '{ref}': Field '{field}' ({value}) matched '{re}'".format(
-                                 ref=c.ref, field=reg.column, value=field_value, re=reg.regex))
+                    logger.debug("{action} '{ref}': Field '{field}' ({value}) matched '{re}'".format(
+                                 action=action, ref=c.ref, field=column, value=field_value, re=regex))
                 # Found a match
                 return True
         # Default, could not find a match
         return False
 
+    def test_reg_include(self, c):
+        """ Reject components that doesn't match the provided regex.
+            So we include only the components that matches any of the regexs. """
+        if not self.include_only:  # Nothing to match against, means include all
+            return True
+        if self._checks is None:
+            self._compile()
+        return self._match_any(c, self._include_only, '- Including')
+
     def test_reg_exclude(self, c):
         """ Test if this part should be included, based on any regex expressions provided in the preferences """
         if not self.exclude_any:  # Nothing to match against, means don't exclude any
             return False
-        for reg in self.exclude_any:
-            reg.column = Optionable.solve_field_name(reg.column)
-            if reg.skip_if_no_field and not c.is_field(reg.column):
-                # Skip the check if the field doesn't exist
-                continue
-            if reg.match_if_field and c.is_field(reg.column):
-                return True
-            if reg.match_if_no_field and not c.is_field(reg.column):
-                return True
-            field_value = c.get_field_value(reg.column)
-            res = reg.regex.search(field_value)
-            if reg.invert:
-                res = not res
-            if res:
-                if GS.debug_level > 1:
-                    logger.debug("Excluding '{ref}': Field '{field}' ({value}) matched '{re}'".format(
-                                 ref=c.ref, field=reg.column, value=field_value, re=reg.regex))
-                # Found a match
-                return True
-        # Default, could not find any matches
-        return False
+        if self._checks is None:
+            self._compile()
+        return self._match_any(c, self._exclude_any, 'Excluding')
+
+    def memo_key(self):
+        return self
 
     def filter(self, comp):
-        exclude = self.invert
+        if self._checks is None:
+            self._compile()
         value = comp.value.strip().lower()
-        # Exclude components with empty 'Value'
-        if self.exclude_empty_val and (value == '' or value == '~'):
-            return exclude
-        # Exclude all ref == #*
-        if self.exclude_all_hash_ref and comp.ref and comp.ref[0] == '#':
-            return exclude
-        # KiCad 5 PCB classification
-        if self.exclude_virtual and comp.virtual:
-            return exclude
-        if self.exclude_smd and comp.smd:
-            return exclude
-        if self.exclude_tht and comp.tht:
-            return exclude
-        if self.exclude_top and not comp.bottom:
-            return exclude
-        if self.exclude_bottom and comp.bottom:
-            return exclude
-        if self.exclude_not_in_bom and not (comp.in_bom and comp.in_bom_pcb):
-            return exclude
-        if self.exclude_not_on_board and not comp.on_board:
-            return exclude
-        # List of references to be excluded
-        if self.exclude_refs and (comp.ref in self.exclude_refs or comp.ref_prefix+'*' in self.exclude_refs):
-            return exclude
-        # All stuff where keys are involved
-        if self._keys:
-            # Exclude components if their 'Value' is any of the keys
-            if self.exclude_value and value in self._keys:
-                return exclude
-            # Exclude components if a field is named as any of the keys
-            if self.exclude_field:
-                for k in self._keys:
-                    if k in comp.dfields:
-                        return exclude
-            # Exclude components containing a key value in the config field.
-            if self.exclude_config:
-                config = comp.get_field_value(self.config_field).strip().lower()
-                if self.config_separators:
-                    # Try with all the separators
-                    for sep in self.config_separators:
-                        opts = config.split(sep)
-                        # Try with all the extracted values
-                        for opt in opts:
-                            if opt.strip() in self._keys:
-                                return exclude
-                else:  # No separator
-                    if config in self._keys:
-                        return exclude
-        # Regular expressions
-        if not self.test_reg_include(comp):
-            return exclude
-        if self.test_reg_exclude(comp):
-            return exclude
-        return not exclude
+        for check in self._checks:
+            if check(comp, value):
+                return self.invert
+        return not self.invert
+
+    def filter_list(self, comps):
+        if self._checks is None:
+            self._compile()
+        checks = self._checks
+        exclude = self.invert
+        res = []
+        for c in comps:
+            value = c.value.strip().lower()
+            for check in checks:
+                if check(c, value):
+                    res.append(exclude)
+                    break
+            else:
+                res.append(not exclude)
+        return res
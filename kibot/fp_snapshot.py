@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Footprints snapshot
+
+Data from the footprints of the loaded PCB, collected in one pass and shared by the outputs. Each call to the KiCad API
+crosses the SWIG layer, so walking all the footprints for each output is slow for big boards.
+Each attribute is a list (a column) with one element for each footprint, in the order used by the PCB.
+The snapshot is discarded when the PCB is loaded again and when a filter/variant changes the footprints.
+"""
+from .gs import GS
+from . import log
+
+logger = log.get_logger()
+
+
+class FootprintSnapshot(object):
+    def __init__(self, board):
+        # The footprints, for the data not in the snapshot
+        self.modules = list(GS.get_modules_board(board))
+        self.refs = []
+        self.values = []
+        # Footprint name, without the library
+        self.fp_names = []
+        self.lib_nicknames = []
+        # Center in KiCad internal units
+        self.x = []
+        self.y = []
+        # Degrees
+        self.rotations = []
+        self.bottom = []
+        self.layers = []
+        self.attrs = []
+        self.pad_counts = []
+        # Size of the pads area (GS.get_fp_size)
+        self.widths = []
+        self.heights = []
+        for m in self.modules:
+            self.refs.append(m.GetReference())
+            self.values.append(m.GetValue())
+            fpid = m.GetFPID()
+            self.fp_names.append(str(fpid.GetLibItemName()))  # pcbnew.UTF8 type
+            self.lib_nicknames.append(str(fpid.GetLibNickname()))
+            center = GS.get_center(m)
+            self.x.append(center.x)
+            self.y.append(center.y)
+            self.rotations.append(m.GetOrientationDegrees())
+            self.bottom.append(m.IsFlipped())
+            self.layers.append(m.GetLayer())
+            self.attrs.append(m.GetAttributes())
+            self.pad_counts.append(m.GetPadCount())
+            w, h = GS.get_fp_size(m)
+            self.widths.append(w)
+            self.heights.append(h)
+        logger.debugl(2, 'Footprints snapshot created ({} footprints)'.format(len(self.modules)))
+
+    def __len__(self):
+        return len(self.modules)
+
+
+def get_fp_snapshot():
+    """ Snapshot for GS.board, created on demand """
+    if GS.fp_snapshot is None:
+        GS.fp_snapshot = FootprintSnapshot(GS.board)
+    return GS.fp_snapshot
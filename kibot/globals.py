@@ -351,6 +351,35 @@ class Globals(FiltersOptions):
             self.cache_3d_resistors = False
             """ Use a cache for the generated 3D models of colored resistors.
                 Will save time, but you could need to remove the cache if you need to regenerate them """
+            self.cache_outputs = False
+            """ Store the files generated by the outputs in a persistent cache. When the options, the project files,
+                the variants, the filters and the tools didn't change we copy the files from the cache instead of
+                generating them. Outputs that depend on things we can't track (git, network, other outputs) are always
+                generated. Note that dates and times found inside the files are also restored from the cache """
+            self.cache_outputs_dir = ''
+            """ Directory for the outputs cache. The default is `~/.cache/kibot/outputs` """
+            self.cache_outputs_size = 1024
+            """ [1,1000000] Maximum size of the outputs cache [MB]. The least recently used entries are removed """
+            self.cache_schematics = False
+            """ Store the loaded KiCad 6+ schematics in a persistent cache. The next runs will use it when the content of
+                the sheets, the project text variables and the KiBot version didn't change. Only used when the load
+                didn't generate warnings """
+            self.cache_schematics_dir = ''
+            """ Directory for the schematics cache. The default is `~/.cache/kibot/schematics` """
+            self.cache_values = False
+            """ Store the component values parsed using the electro-grammar (BoM and value filters) in a persistent
+                cache. Parsing a value is slow and most projects use the same values again and again """
+            self.cache_values_dir = ''
+            """ Directory for the parsed values cache. The default is `~/.cache/kibot` """
+            self.kicad_cli_jobset = False
+            """ Generate the outputs that just run `kicad-cli` (`ipc2581`, `odb`, `netlist`, `export_3d` and `position`
+                using the Gerber format) using one KiCad jobset, so KiCad loads the project only once. Needs KiCad 9 or
+                newer. Outputs using filters or variants are generated in the usual way, also the ones we couldn't find
+                after running the jobset """
+            self.sch_parse_jobs = 1
+            """ [0,1000] Number of processes used to parse the files of a KiCad 6+ hierarchical schematic. Each file
+                is parsed only once, even when used by more than one sheet. Use 0 for the number of CPUs. Only
+                big hierarchies will benefit from it """
             self.resources_dir = 'kibot_resources'
             """ Directory where various resources are stored. Currently we support colors and fonts.
                 They must be stored in sub-dirs. I.e. kibot_resources/fonts/MyFont.ttf
@@ -85,6 +85,8 @@ class GS(object):
     filter_file = None
     filters = None
     board = None
+    # Footprints data for the board, see fp_snapshot.py
+    fp_snapshot = None
     sch = None
     debug_enabled = False
     debug_level = 0
@@ -150,6 +152,13 @@ class GS(object):
     global_allow_component_ranges = None
     global_always_warn_about_paste_pads = None
     global_cache_3d_resistors = None
+    global_cache_outputs = None
+    global_cache_outputs_dir = None
+    global_cache_outputs_size = None
+    global_cache_schematics = None
+    global_cache_schematics_dir = None
+    global_cache_values = None
+    global_cache_values_dir = None
     global_castellated_pads = None
     global_colored_tht_resistors = None
     global_copper_thickness = None
@@ -201,6 +210,7 @@ class GS(object):
     global_resources_dir = None
     global_restore_project = None
     global_sch_image_prefix = None
+    global_sch_parse_jobs = None
     global_set_text_variables_before_output = None
     global_silk_screen_color = None
     global_silk_screen_color_bottom = None
@@ -220,6 +230,7 @@ class GS(object):
     global_allow_blind_buried_vias = None
     global_allow_microvias = None
     global_erc_grid = None
+    global_kicad_cli_jobset = None
     global_kicad_dnp_applied = None
     global_kicad_dnp_applies_to_3D = None
     global_cross_using_kicad = None
@@ -1078,6 +1089,7 @@ class GS(object):
 
     @staticmethod
     def move_board_items(vector):
+        GS.fp_snapshot = None
         any((x.Move(vector) for x in GS.get_modules()))
         any((x.Move(vector) for x in GS.board.GetDrawings()))
         any((x.Move(vector) for x in GS.board.GetTracks()))
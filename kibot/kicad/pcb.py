@@ -161,8 +161,8 @@ def update_footprint(ref, name, s, aliases, logger):
     from_lib = list(filter(lambda s: not keep_attr(attrs, s), c[0]))
     # Check if the component is flipped
     try:
-        lib_side = next(filter(lambda s: isinstance(s, list) and s[0].value() == "layer", c[0]))[1]
-        cur_side = next(filter(lambda s: isinstance(s, list) and s[0].value() == "layer", keep))[1]
+        lib_side = next(sexp_iter(c[0], 'layer'))[1]
+        cur_side = next(sexp_iter(keep, 'layer'))[1]
         if cur_side != lib_side:
             # Flipped, flip every layer reference
             logger.debug(f'- Flipping {ref}')
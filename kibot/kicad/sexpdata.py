@@ -45,6 +45,8 @@ See the source code for more information.
 # Copyright (c) 2022 Instituto Nacional de Tecnología Industrial
 # - Adapted to KiCad
 # - Added sexp_iter
+# - Added a faster parser for KiCad files
+# - Lists from the faster parser can index their children
 
 # Redistribution and use in source and binary forms, with or without
 # modification, are permitted provided that the following conditions are
@@ -672,6 +674,145 @@ class Parser(object):
         return sexp
 
 
+class SExpList(list):
+    """
+    List created by the `FastParser`.
+
+    Can find its children using the name of their head symbol. The index from names to positions is created on the
+    first query. Any change to the list discards the index, except `append`, detected using the length.
+    Note that replacing the head of a child in-place isn't detected.
+    """
+    _index = None
+    _index_len = 0
+
+    def _get_index(self):
+        index = self._index
+        if index is None or self._index_len != len(self):
+            index = {}
+            for n, x in enumerate(self):
+                if isinstance(x, list) and x and isinstance(x[0], Symbol):
+                    index.setdefault(x[0].value(), []).append(n)
+            self._index = index
+            self._index_len = len(self)
+        return index
+
+    def positions(self, name):
+        """ Positions of the children lists starting with the `name` symbol """
+        return self._get_index().get(name, [])
+
+    def find_all(self, name):
+        """ Children lists starting with the `name` symbol """
+        return [self[n] for n in self._get_index().get(name, [])]
+
+    def __reduce_ex__(self, protocol):
+        # Don't pickle/copy the index
+        return (SExpList, (), None, iter(self))
+
+
+def _sexp_list_mutator(name):
+    method = getattr(list, name)
+
+    def mutator(self, *args, **kwargs):
+        self._index = None
+        return method(self, *args, **kwargs)
+
+    mutator.__name__ = name
+    return mutator
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'extend', 'insert', 'remove', 'pop', 'clear',
+              'sort', 'reverse'):
+    setattr(SExpList, _name, _sexp_list_mutator(_name))
+
+
+class UseFullParser(Exception):
+    pass
+
+
+class FastParser(Parser):
+    """
+    Tokenizer based parser, optimized for KiCad files.
+
+    Uses one compiled regex to split the tokens and an explicit stack for the lists, so we don't recurse.
+    Repeated atoms are converted only once and symbols are interned, so all the `at`, `uuid`, etc. are the same
+    object. Constructs not used by KiCad (quotes, brackets and escapes outside strings) raise `UseFullParser`.
+    The lists are `SExpList`, so `sexp_iter` can use an index to find the children.
+    """
+    _ws = ' \t\n\r\x0b\x0c'   # string.whitespace, \s also matches Unicode spaces
+    token_re = re.compile(r'[{0}]*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^{0}()"\'\[\]\\;]+)|(;[^\n]*)|([^{0}]))'.format(_ws),
+                          re.S)
+    str_escape_re = re.compile(r'\\.', re.S)
+    # Interned symbols, shared by all the parsed files
+    symbols = {}
+    special_floats = {'inf', 'infinity', 'nan'}
+
+    def atom(self, token):
+        if token == self.true:
+            return True
+        if token == self.false:
+            return False
+        c = token[0]
+        if c in '+-.' or c.isdecimal() or token.lower() in self.special_floats:
+            if '.' not in token:
+                try:
+                    return int(token)
+                except ValueError:
+                    pass
+            try:
+                return float(token)
+            except ValueError:
+                pass
+        sym = self.symbols.get(token)
+        if sym is None:
+            sym = self.symbols[token] = Symbol(token)
+        return sym
+
+    def parse(self):
+        if self.line_comment != ';':
+            raise UseFullParser()
+        string = self.string
+        string_to = self.string_to
+        unquote = String.unquote
+        str_escape_sub = self.str_escape_re.sub
+        nil = self.nil
+        atoms = {}
+        stack = []
+        sexp = cur = SExpList()
+        for m in self.token_re.finditer(string):
+            kind = m.lastindex
+            if kind == 4:
+                # Atom, the most common token
+                token = m.group(4)
+                val = atoms.get(token)
+                if val is None:
+                    if token == nil:
+                        # A new list for each case
+                        cur.append([])
+                        continue
+                    val = atoms[token] = self.atom(token)
+                cur.append(val)
+            elif kind == 1:
+                stack.append(cur)
+                new = SExpList()
+                cur.append(new)
+                cur = new
+            elif kind == 2:
+                if not stack:
+                    raise ExpectNothing(string[m.start(2):])
+                cur = stack.pop()
+            elif kind == 3:
+                val = m.group(3)
+                if '\\' in val:
+                    val = str_escape_sub(lambda x: unquote(x.group(0)), val)
+                cur.append(string_to(val))
+            elif kind == 6:
+                raise UseFullParser()
+            # kind == 5 is a comment
+        if stack:
+            raise ExpectClosingBracket(None, ')')
+        return sexp
+
+
 def parse(string, **kwds):
     r"""
     Parse s-expression.
@@ -686,19 +827,26 @@ def parse(string, **kwds):
     [[Symbol('a'), Quoted([Symbol('b')])]]
 
     """
-    return Parser(string, **kwds).parse()
+    try:
+        return FastParser(string, **kwds).parse()
+    except UseFullParser:
+        return Parser(string, **kwds).parse()
 
 
 def sexp_iter(vect, path):
     """
     Returns an iterator to filter all the elements described in the path.
+    Lists created by the `FastParser` use their index, so we just visit the matches.
     """
     elems = path.split('/')
     total = len(elems)
     for i, e in enumerate(elems):
-        iter = filter(lambda x: isinstance(x, list) and isinstance(x[0], Symbol) and x[0].value() == e, vect)
+        if isinstance(vect, SExpList):
+            res = iter(vect.find_all(e))
+        else:
+            res = filter(lambda x: isinstance(x, list) and x and isinstance(x[0], Symbol) and x[0].value() == e, vect)
         if i == total-1:
-            return iter
-        vect = next(iter, None)
+            return res
+        vect = next(res, None)
         if vect is None:
             return None
@@ -887,6 +887,8 @@ class SchematicComponent(object):
         self.fitted = True
         self.included = True
         self.fixed = False
+        # No transform filter was applied since the last filters reset
+        self.pristine = False
         self.bottom = False
         self.footprint_rot = 0.0
         self.footprint_x = self.footprint_y = 0
@@ -12,7 +12,9 @@ Documentation: https://dev-docs.kicad.org/en/file-formats/sexpr-schematic/
 # Encapsulate file/line
 from collections import OrderedDict
 from copy import deepcopy
+import multiprocessing
 import os
+import pickle
 import re
 from ..gs import GS
 from .. import log
@@ -33,6 +35,9 @@ KICAD_7_VER = 20230121
 KICAD_8_VER = 20231120
 SHEET_FILE = {'Sheet file', 'Sheetfile'}
 SHEET_NAME = {'Sheet name', 'Sheetname'}
+SHEET_FILE_REGEX = re.compile(r'\(property\s+"(?:Sheet file|Sheetfile)"\s+"((?:[^"\\]|\\.)*)"')
+# Sheets parsed in advance by `parse_sheets`: file name -> pickled tree
+parsed_sheets = {}
 
 
 def path_join(*args):
@@ -44,6 +49,54 @@ def path_join(*args):
     return res
 
 
+def _sheet_key(fname):
+    return os.path.normpath(os.path.abspath(fname))
+
+
+def find_sheet_files(fname):
+    """ Files used by the hierarchy. We just look for the sheet file property, the load will check the rest.
+        The files are sorted by size, the big ones first """
+    fname = _sheet_key(fname)
+    files = {}
+    pending = [fname]
+    while pending:
+        fname = pending.pop()
+        try:
+            with open(fname, 'rt') as f:
+                text = f.read()
+        except OSError:
+            continue
+        files[fname] = len(text)
+        base_dir = os.path.dirname(fname)
+        for m in SHEET_FILE_REGEX.finditer(text):
+            sub = _sheet_key(os.path.join(base_dir, re.sub(r'\\(.)', r'\1', m.group(1))))
+            if sub not in files and sub not in pending:
+                pending.append(sub)
+    return sorted(files, key=lambda f: files[f], reverse=True)
+
+
+def _parse_sheet_file(fname):
+    """ Runs in a worker process, the tree is pickled to send it back """
+    try:
+        with open(fname, 'rt') as fh:
+            return pickle.dumps(load(fh)[0], pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # The regular load will report the problem
+        return None
+
+
+def parse_sheets(fname, jobs):
+    """ Parse all the files used by the hierarchy using a pool of processes. Each file is parsed once """
+    files = find_sheet_files(fname)
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    if jobs < 2 or GS.on_windows or 'fork' not in multiprocessing.get_all_start_methods():
+        return {}
+    logger.debug('Parsing {} schematic files using {} processes'.format(len(files), jobs))
+    with multiprocessing.get_context('fork').Pool(jobs) as pool:
+        trees = pool.map(_parse_sheet_file, files, chunksize=1)
+    return {f: t for f, t in zip(files, trees) if t is not None}
+
+
 class UUID_Validator(object):
     known_UUIDs = set()
 
@@ -2491,10 +2544,18 @@ class SchematicV6(Schematic):
             return cache_name
         raise SchError(f'Missing embedded file `{efile}`')
 
-    def load(self, fname, project, parent=None):  # noqa: C901
+    def load(self, fname, project, parent=None, jobs=1):  # noqa: C901
         """ Load a v6.x KiCad Schematic.
             The caller must be sure the file exists.
-            Only the schematics are loaded not the libs. """
+            Only the schematics are loaded not the libs.
+            When `jobs` isn't 1 the files are parsed in parallel before creating the objects (0 means all the CPUs) """
+        if parent is None and jobs != 1:
+            global parsed_sheets
+            parsed_sheets = parse_sheets(fname, jobs)
+            try:
+                return self.load(fname, project)
+            finally:
+                parsed_sheets = {}
         logger.debug("Loading sheet from "+fname)
         extra_debug = GS.debug_level >= 3
         if parent is None:
@@ -2556,14 +2617,19 @@ class SchematicV6(Schematic):
         self.rule_areas = []
         if not os.path.isfile(fname):
             raise SchError('Missing subsheet: '+fname)
-        with open(fname, 'rt') as fh:
-            error = None
-            try:
-                sch = load(fh)[0]
-            except SExpData as e:
-                error = str(e)
-            if error:
-                raise SchError(error)
+        tree = parsed_sheets.get(_sheet_key(fname)) if parsed_sheets else None
+        if tree is not None:
+            # Each instance of the sheet gets its own copy
+            sch = pickle.loads(tree)
+        else:
+            with open(fname, 'rt') as fh:
+                error = None
+                try:
+                    sch = load(fh)[0]
+                except SExpData as e:
+                    error = str(e)
+                if error:
+                    raise SchError(error)
         if not isinstance(sch, list) or sch[0].value() != 'kicad_sch':
             raise SchError('No kicad_sch signature')
         for e in sch[1:]:
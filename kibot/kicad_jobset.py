@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Outputs generated using a KiCad jobset
+
+Each `kicad-cli` call loads the project from scratch. The outputs that just run `kicad-cli` can provide a
+`get_jobset_jobs(name)` method, returning the jobs needed to generate the `name` target. We collect the jobs of all the
+outputs we are going to generate, create a jobset and run it using only one `kicad-cli` process. The generated files
+are then moved to the targets of each output.
+Outputs that can't be generated this way (i.e. using variants) are generated in the usual way. The same for the ones
+we can't find after running the jobset (i.e. this KiCad doesn't support the job or one of its options).
+"""
+import json
+import os
+import shutil
+from subprocess import CalledProcessError
+import uuid
+from .gs import GS
+from .kiplot import config_output, get_output_dir, run_command
+from .misc import W_JOBSET
+from . import log, timings
+
+logger = log.get_logger()
+# Format of the jobset file
+JOBSET_VERSION = 1
+
+
+def _project_file(ext):
+    return os.path.realpath(os.path.splitext(GS.pro_file)[0]+ext)
+
+
+def _can_use(jobs):
+    """ kicad-cli runs the jobset using the project, the board and schematic must be the ones from the project """
+    for type, _, _ in jobs:
+        if type.startswith('pcb_') and (not GS.pcb_file or os.path.realpath(GS.pcb_file) != _project_file('.kicad_pcb')):
+            return False
+        if type.startswith('sch_') and (not GS.sch_file or os.path.realpath(GS.sch_file) != _project_file('.kicad_sch')):
+            return False
+    return True
+
+
+def collect_outputs(targets, dont_stop=False):
+    """ Outputs that can be generated using a jobset, a list of (output, jobs, cache_key, cache_targets) """
+    outputs = []
+    for out in targets:
+        if out._done or not hasattr(out.options, 'get_jobset_jobs') or not config_output(out, dont_stop=dont_stop):
+            continue
+        out_dir = get_output_dir(out.dir, out)
+        cache_key = cache_targets = None
+        if GS.global_cache_outputs:
+            from . import outputs_cache
+            cache_key, cache_targets = outputs_cache.get_key(out, out_dir)
+            if cache_key and outputs_cache.restore(cache_key, out_dir):
+                out._done = True
+                continue
+        jobs = out.options.get_jobset_jobs(os.path.realpath(out.expand_filename(out_dir, out.options.output)))
+        if jobs and _can_use(jobs):
+            outputs.append((out, jobs, cache_key, cache_targets))
+        else:
+            logger.debug(f'- `{out.name}` can\'t be generated using a jobset')
+    return outputs
+
+
+def create_jobset(outputs, dest):
+    """ Creates the jobset, all the files are generated in `dest`.
+        Returns the jobset and a list with the name used for each job """
+    jobs = []
+    names = []
+    for out, out_jobs, _, _ in outputs:
+        for type, settings, target in out_jobs:
+            # Unique names, the targets could have the same name in different dirs
+            name = '{:03d}-{}'.format(len(names), os.path.basename(target))
+            settings = dict(settings)
+            settings['output_filename'] = name
+            jobs.append({'id': str(uuid.uuid4()), 'type': type, 'description': out.name, 'settings': settings})
+            names.append(name)
+    destination = {'id': str(uuid.uuid4()), 'type': 'folder', 'description': 'KiBot', 'only': [],
+                   'settings': {'output_path': dest}}
+    return {'meta': {'version': JOBSET_VERSION}, 'jobs': jobs, 'outputs': [destination]}, names
+
+
+def _move(src, dest):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.isdir(dest):
+        shutil.rmtree(dest)
+    elif os.path.isfile(dest):
+        os.remove(dest)
+    shutil.move(src, dest)
+
+
+def run_jobset(targets, dont_stop=False):
+    """ Generates the outputs that support it using one KiCad jobset """
+    if not GS.global_kicad_cli_jobset or not GS.ki9 or not GS.pro_file:
+        return
+    outputs = collect_outputs(targets, dont_stop)
+    if len(outputs) < 2:
+        # Nothing to gain
+        return
+    logger.info(f'- Generating {len(outputs)} outputs using a KiCad jobset')
+    tmp_dir = GS.mkdtemp('jobset')
+    dest = os.path.join(tmp_dir, 'files')
+    jobset, names = create_jobset(outputs, dest)
+    jobset_file = os.path.join(tmp_dir, 'kibot.kicad_jobset')
+    with open(jobset_file, 'wt') as f:
+        json.dump(jobset, f, indent=2)
+    if GS.debug_level > 2:
+        logger.debug('Jobset:\n'+json.dumps(jobset, indent=2))
+    cmd = ['kicad-cli', 'jobset', 'run', '--file', jobset_file, '--output', jobset['outputs'][0]['id'], GS.pro_file]
+    try:
+        with timings.measure('output', 'kicad_cli_jobset', type='jobset', outputs=[o[0].name for o in outputs]):
+            run_command(cmd, change_to=tmp_dir, just_raise=True)
+    except CalledProcessError as e:
+        # Some job failed, we don't know which one
+        if e.output:
+            logger.debug('- Output from command: '+e.output.decode(errors='replace'))
+        logger.warning(W_JOBSET+f'Failed to run the KiCad jobset ({e.returncode}), using individual calls')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    # Move the files to their targets
+    n = 0
+    for out, jobs, cache_key, cache_targets in outputs:
+        files = names[n:n+len(jobs)]
+        n += len(jobs)
+        missing = [name for name in files if not os.path.exists(os.path.join(dest, name))]
+        if missing:
+            logger.warning(W_JOBSET+f'The KiCad jobset didn\'t generate {missing} for `{out.name}`, using an individual call')
+            continue
+        for name, (_, _, target) in zip(files, jobs):
+            _move(os.path.join(dest, name), target)
+        out._done = True
+        logger.debug(f'- `{out.name}` generated using the jobset')
+        if cache_key:
+            from . import outputs_cache
+            outputs_cache.store(cache_key, cache_targets, get_output_dir(out.dir, out), out.name)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -11,17 +11,19 @@ Main KiBot code
 from copy import deepcopy
 from collections import OrderedDict
 import gzip
+import json
 import os
 import re
-from sys import path as sys_path
+from sys import path as sys_path, version_info
 from shutil import which, copy2
 from subprocess import run, PIPE, STDOUT, Popen, CalledProcessError
 from glob import glob
 from importlib.util import spec_from_file_location, module_from_spec
 
 from .bom.columnlist import ColumnList
+from .bom import parse_cache
 from .gs import GS
-from .registrable import RegOutput
+from .registrable import RegOutput, RegFilter, RegVariant, Registrable
 from .misc import (PLOT_ERROR, CORRUPTED_PCB, EXIT_BAD_ARGS, CORRUPTED_SCH, version_str2tuple,
                    EXIT_BAD_CONFIG, WRONG_INSTALL, UI_SMD, UI_VIRTUAL, TRY_INSTALL_CHECK, MOD_SMD, MOD_THROUGH_HOLE,
                    MOD_VIRTUAL, W_PCBNOSCH, W_NONEEDSKIP, W_WRONGCHAR, name2make, W_TIMEOUT, W_KIAUTO, W_VARSCH,
@@ -32,11 +34,14 @@ from .error import PlotError, KiPlotConfigurationError, config_error, KiPlotErro
 from .config_reader import CfgYamlReader
 from .pre_base import BasePreFlight
 from .dep_downloader import register_deps
+from .fp_snapshot import get_fp_snapshot
 import kibot.dep_downloader as dep_downloader
 from .kicad.v5_sch import Schematic, SchFileError, SchError, SchematicField
 from .kicad.v6_sch import SchematicV6, SchematicComponentV6
 from .kicad.config import KiConfError, KiConf, expand_env
 from . import log
+from . import timings
+from . import __version__
 INTERNAL_FIELDS = {'reference', 'value', 'footprint', 'datasheet', 'description'}
 
 logger = log.get_logger()
@@ -44,6 +49,14 @@ logger = log.get_logger()
 script_versions = {}
 actions_loaded = False
 needed_imports = {}
+# Change it if the manifest format changes
+PLUGINS_MANIFEST_VERSION = 1
+# Registries for the plug-ins
+PLUGIN_KINDS = (('output', RegOutput), ('preflight', BasePreFlight), ('filter', RegFilter), ('variant', RegVariant))
+# Manifest used to import the plug-ins on demand, None when all are imported
+plugins_manifest = None
+imported_plugins = set()
+loaded_plugin_kinds = set()
 
 try:
     import yaml
@@ -64,9 +77,11 @@ def try_register_deps(mod, name):
         except yaml.YAMLError as e:
             config_error([f'While loading plug-in `{name}`:', "Error loading YAML "+str(e)])
         register_deps(name, data)
+        return data
+    return None
 
 
-def _import(name, path):
+def _import(name, path, with_deps=True):
     # Python 3.4+ import mechanism
     spec = spec_from_file_location("kibot."+name, path)
     mod = module_from_spec(spec)
@@ -76,42 +91,166 @@ def _import(name, path):
         GS.exit_with_error(('Unable to import plug-ins: '+str(e),
                             'Make sure you used `--no-compile` if you used pip for installation',
                             'Python path: '+str(sys_path)), WRONG_INSTALL)
-    try_register_deps(mod, name)
+    imported_plugins.add(path)
+    return try_register_deps(mod, name) if with_deps else None
 
 
-def _load_actions(path, load_internals=False, progress=None):
-    logger.debug("Importing from "+path)
+def _plugins_in(path, load_internals=False):
     lst = glob(os.path.join(path, 'out_*.py')) + glob(os.path.join(path, 'pre_*.py'))
     lst += glob(os.path.join(path, 'var_*.py')) + glob(os.path.join(path, 'fil_*.py'))
     if load_internals:
         lst += [os.path.join(path, 'globals.py')]
-    for p in sorted(lst):
-        name = os.path.splitext(os.path.basename(p))[0]
+    return sorted(lst)
+
+
+def _all_plugins():
+    """ All the plug-ins, in the order we import them """
+    lst = _plugins_in(os.path.abspath(os.path.dirname(__file__)), True)
+    home = os.environ.get('HOME')
+    if home:
+        for dir in (os.path.join(home, '.config', 'kiplot', 'plugins'), os.path.join(home, '.config', 'kibot', 'plugins')):
+            if os.path.isdir(dir):
+                lst += _plugins_in(dir)
+    return lst
+
+
+def _plugin_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _load_actions(lst, progress=None):
+    deps = []
+    for p in lst:
+        name = _plugin_name(p)
         msg = "Importing "+name
         logger.debug('- '+msg)
         if progress:
             progress(msg)
-        _import(name, p)
+        data = _import(name, p)
+        if data is not None:
+            deps.append((name, data))
+    return deps
+
+
+def get_plugins_manifest_file():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'plugins_manifest.json')
+
+
+def _plugins_stamp(lst):
+    """ Identifies the plug-ins we have, any change here invalidates the manifest """
+    stamp = [__version__, list(version_info[:2])]
+    for p in lst:
+        st = os.stat(p)
+        stamp.append([p, st.st_mtime_ns, st.st_size])
+    return stamp
+
+
+def _load_plugins_manifest(stamp):
+    try:
+        with open(get_plugins_manifest_file(), 'rt') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(manifest, dict) or manifest.get('version') != PLUGINS_MANIFEST_VERSION or
+       manifest.get('stamp') != stamp):
+        return None
+    return manifest
+
+
+def _save_plugins_manifest(lst, stamp, deps):
+    """ Stores which module registers each output, preflight, filter and variant """
+    paths = {_plugin_name(p): p for p in lst}
+    registry = {}
+    for kind, reg in PLUGIN_KINDS:
+        registry[kind] = entries = {}
+        for name, cls in reg.get_registered().items():
+            path = paths.get(cls.__module__[6:]) if cls.__module__.startswith('kibot.') else None
+            if path is None:
+                logger.debug(f'Not creating a plug-ins manifest, unknown module for `{name}` ({cls.__module__})')
+                return
+            entries[name] = path
+    manifest = {'version': PLUGINS_MANIFEST_VERSION, 'stamp': stamp, 'deps': deps, 'registry': registry}
+    fname = get_plugins_manifest_file()
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmp = fname+'.'+str(os.getpid())
+        with open(tmp, 'wt') as f:
+            json.dump(manifest, f, default=str)
+        os.replace(tmp, fname)
+    except OSError as e:
+        logger.debug(f'Failed to save the plug-ins manifest ({e})')
+
+
+def _lazy_import(registry, name):
+    """ Imports the plug-in that registers `name`, or all the plug-ins of this kind when `name` is None """
+    kind = next((k for k, reg in PLUGIN_KINDS if reg._registered is registry), None)
+    if kind is None:
+        # Not in the manifest (i.e. RegDependency)
+        return
+    entries = plugins_manifest['registry'][kind]
+    if name is None:
+        if kind in loaded_plugin_kinds:
+            return
+        loaded_plugin_kinds.add(kind)
+        paths = sorted(set(entries.values()))
+    else:
+        path = entries.get(name)
+        paths = [path] if path else []
+    paths = [p for p in paths if p not in imported_plugins]
+    if not paths:
+        return
+    from kibot.mcpyrate import activate
+    activate.activate()
+    for p in paths:
+        logger.debug(f'- Importing {_plugin_name(p)} (on demand)')
+        _import(_plugin_name(p), p, with_deps=False)
+    if 'deactivate' in activate.__dict__:
+        activate.deactivate()
+
+
+def load_all_plugins():
+    """ Imports the plug-ins not yet imported, needed when we must know everything they register """
+    if plugins_manifest is None:
+        return
+    paths = [p for p in _all_plugins() if p not in imported_plugins]
+    if not paths:
+        return
+    from kibot.mcpyrate import activate
+    activate.activate()
+    for p in paths:
+        logger.debug(f'- Importing {_plugin_name(p)}')
+        _import(_plugin_name(p), p, with_deps=False)
+    if 'deactivate' in activate.__dict__:
+        activate.deactivate()
+    loaded_plugin_kinds.update(k for k, _ in PLUGIN_KINDS)
 
 
 def load_actions(progress=None):
-    """ Load all the available outputs and preflights """
+    """ Load all the available outputs and preflights.
+        When we have a valid manifest we just import the globals, the rest is imported on demand """
     global actions_loaded
+    global plugins_manifest
     if actions_loaded:
         return
     actions_loaded = True
     try_register_deps(dep_downloader, 'global')
     from kibot.mcpyrate import activate
     # activate.activate()
-    _load_actions(os.path.abspath(os.path.dirname(__file__)), True, progress)
-    home = os.environ.get('HOME')
-    if home:
-        dir = os.path.join(home, '.config', 'kiplot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
-        dir = os.path.join(home, '.config', 'kibot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
+    lst = _all_plugins()
+    stamp = _plugins_stamp(lst)
+    manifest = _load_plugins_manifest(stamp)
+    if manifest is None:
+        logger.debug("Importing all the plug-ins")
+        _save_plugins_manifest(lst, stamp, _load_actions(lst, progress))
+    else:
+        logger.debug("Using the plug-ins manifest")
+        for name, data in manifest['deps']:
+            register_deps(name, data)
+        internals = [p for p in lst if _plugin_name(p) == 'globals']
+        for p in internals:
+            _import('globals', p, with_deps=False)
+        plugins_manifest = manifest
+        Registrable._lazy_loader = _lazy_import
     # de_activate in old mcpy
     if 'deactivate' in activate.__dict__:
         logger.debug('Deactivating macros')
@@ -163,10 +302,11 @@ def run_command(command, change_to=None, just_raise=False, use_x11=False, err_ms
         if use_x11 and not GS.on_windows:
             logger.debug('Using Xvfb to run the command')
             from xvfbwrapper import Xvfb
-            with Xvfb(width=640, height=480, colordepth=24):
+            with Xvfb(width=640, height=480, colordepth=24), timings.command(command):
                 res = _run_command(command, change_to)
         else:
-            res = _run_command(command, change_to)
+            with timings.command(command):
+                res = _run_command(command, change_to)
     except CalledProcessError as e:
         if just_raise:
             raise
@@ -185,7 +325,8 @@ def exec_with_retry(cmd, exit_with=None):
         logger.debug('Command line: '+str(cmd))
     retry = 2
     while retry:
-        result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        with timings.command(cmd):
+            result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
         ret = result.returncode
         retry -= 1
         if ret != 16 and (ret > 0 and ret < 128 and retry):
@@ -256,6 +397,7 @@ def load_board(pcb_file=None, forced=False):
             # https://gitlab.com/kicad/code/kicad/-/commit/8184ed64e732ed0812831a13ebc04bd12e8d1d19
             board.SetElementVisibility(pcbnew.LAYER_HIDDEN_TEXT, False)
         GS.board = board
+        GS.fp_snapshot = None
     except OSError as e:
         GS.exit_with_error(['Error loading PCB file. Corrupted?', str(e)], CORRUPTED_PCB)
     assert board is not None
@@ -269,18 +411,33 @@ def ki_conf_error(e):
 
 
 def load_any_sch(file, project, fatal=True, extra_msg=None):
+    use_cache = False
     if file[-9:] == 'kicad_sch':
+        use_cache = GS.global_cache_schematics
+        if use_cache:
+            from . import sch_cache
+            sch = sch_cache.load(file, project)
+            if sch is not None:
+                return sch
         sch = SchematicV6()
         load_libs = False
     else:
         sch = Schematic()
         load_libs = True
     try:
-        sch.load(file, project)
+        warns = log.get_warn_counters()
         if load_libs:
+            sch.load(file, project)
             sch.load_libs(file)
+        else:
+            # 0 is valid (all the CPUs), None means the globals aren't loaded yet
+            jobs = GS.global_sch_parse_jobs
+            sch.load(file, project, jobs=1 if jobs is None else jobs)
         if GS.debug_level > 1:
             logger.debug('Schematic dependencies: '+str(sch.get_files()))
+        # Only clean loads, we don't want to hide the warnings in the next runs
+        if use_cache and not log.diff_warn_counters(warns)[1]:
+            sch_cache.store(file, project, sch)
     except SchFileError as e:
         if extra_msg is not None:
             logger.error(extra_msg)
@@ -399,6 +556,9 @@ def get_all_components(collapse=True):
 def get_board_comps_data(comps):
     """ Add information from the PCB to the list of components from the schematic.
         Note that we do it every time the function is called to reset transformation filters like rot_footprint. """
+    for c in comps:
+        # The memoized filter results are valid only after resetting the filters
+        c.pristine = False
     if not GS.pcb_file:
         return
     load_board()
@@ -407,9 +567,10 @@ def get_board_comps_data(comps):
     KiConf.init(GS.sch_file)
     env = KiConf.kicad_env
     env.update(GS.load_pro_variables())
-    for m in GS.get_modules():
-        ref = m.GetReference()
-        attrs = m.GetAttributes()
+    fps = get_fp_snapshot()
+    for i, m in enumerate(fps.modules):
+        ref = fps.refs[i]
+        attrs = fps.attrs[i]
         c = comps_hash.get(ref)
         if c is None:
             if not (attrs & MOD_BOARD_ONLY) and not ref.startswith('KiKit_'):
@@ -426,16 +587,16 @@ def get_board_comps_data(comps):
             # We already got this reference and filled the PCB info, this is another copy
             c = deepcopy(c)
             comps.append(c)
-        new_value = m.GetValue()
+        new_value = fps.values[i]
         if new_value != c.value and '${' not in c.value:
             logger.warning(f"{W_VALMISMATCH}Value field mismatch for `{ref}` (SCH: `{c.value}` PCB: `{new_value}`)")
         c.value = new_value
-        c.bottom = m.IsFlipped()
-        c.footprint_rot = m.GetOrientationDegrees()
-        center = GS.get_center(m)
-        c.footprint_x = center.x
-        c.footprint_y = center.y
-        (c.footprint_w, c.footprint_h) = GS.get_fp_size(m)
+        c.bottom = fps.bottom[i]
+        c.footprint_rot = fps.rotations[i]
+        c.footprint_x = fps.x[i]
+        c.footprint_y = fps.y[i]
+        c.footprint_w = fps.widths[i]
+        c.footprint_h = fps.heights[i]
         c.has_pcb_info = True
         c.pad_properties = {}
         if GS.global_use_pcb_fields:
@@ -604,8 +765,21 @@ def run_output(out, dont_stop=False):
             load_board()
     GS.current_output = out.name
     try:
-        out.run(get_output_dir(out.dir, out))
+        out_dir = get_output_dir(out.dir, out)
+        cache_key = None
+        if GS.global_cache_outputs:
+            from . import outputs_cache
+            cache_key, targets = outputs_cache.get_key(out, out_dir)
+            if cache_key and outputs_cache.restore(cache_key, out_dir):
+                out._done = True
+                return
+        with timings.measure('output', out.name, type=out.type):
+            out.run(out_dir)
         out._done = True
+        # Component values parsed by this output
+        parse_cache.save()
+        if cache_key:
+            outputs_cache.store(cache_key, targets, out_dir, out.name)
     except KiPlotConfigurationError as e:
         msg = "In section '"+out.name+"' ("+out.type+"): "+str(e)
         if dont_stop:
@@ -641,7 +815,7 @@ def look_for_output(name, op_name, parent, valids):
     return out
 
 
-def _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop):
+def _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop, jobs=1, only_pre=False):
     logger.debug("Starting outputs for board {}".format(GS.pcb_file))
     # Make a list of target outputs
     n = len(targets)
@@ -692,12 +866,23 @@ def _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_st
     logger.debug('Outputs before preflights: {}'.format([t.name for t in targets]))
     # Run the preflights
     preflight_checks(skip_pre, targets)
+    parse_cache.save()
+    if only_pre:
+        return
     logger.debug('Outputs after preflights: {}'.format([t.name for t in targets]))
     if not cli_order and not no_priority:
         # Sort by priority
         targets = sorted(targets, key=lambda o: o.priority, reverse=True)
         logger.debug('Outputs after sorting: {}'.format([t.name for t in targets]))
+    if GS.global_kicad_cli_jobset:
+        # Outputs that just run kicad-cli can be generated using only one kicad-cli process
+        from .kicad_jobset import run_jobset
+        run_jobset(targets, dont_stop)
     # Configure and run the outputs
+    if jobs > 1 and len(targets) > 1:
+        from .scheduler import run_outputs_parallel
+        if run_outputs_parallel(targets, jobs, dont_stop):
+            return
     for out in targets:
         if GS.get_stop_flag():
             break
@@ -706,14 +891,48 @@ def _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_st
             run_output(out, dont_stop)
 
 
-def generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop=False):
+def generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop=False, jobs=1):
+    setup_resources()
+    prj = None
+    if GS.global_restore_project:
+        # Memorize the project content to restore it at exit
+        prj = GS.read_pro()
+    try:
+        _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop, jobs)
+    finally:
+        # Restore the project file
+        GS.write_pro(prj)
+
+
+def set_variant(name, obj):
+    GS.variant = GS.global_variant = name
+    GS.solved_global_variant = obj
+
+
+def reset_outputs():
+    """ Discards the configuration of all the outputs, i.e. the one done for another variant """
+    for o in RegOutput.get_outputs():
+        old_tree = o._tree
+        o.__init__()
+        o.set_tree(old_tree)
+
+
+def generate_variants(variants, n_workers, targets, invert, skip_pre, cli_order, no_priority, dont_stop=False, jobs=1):
+    """ Generates the outputs for each variant in `variants` (name -> solved variant), up to `n_workers` in parallel.
+        Each variant is generated by a forked process, using a sub-directory of the output dir """
     setup_resources()
     prj = None
     if GS.global_restore_project:
         # Memorize the project content to restore it at exit
         prj = GS.read_pro()
     try:
-        _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop)
+        # Preflights aren't "variantic", we run them once, before forking.
+        # Note that some of them configure outputs, the workers must reset them.
+        set_variant(*next(iter(variants.items())))
+        _generate_outputs(targets, invert, skip_pre, cli_order, no_priority, dont_stop, only_pre=True)
+        from .scheduler import run_variants_parallel
+        run_variants_parallel(variants, n_workers, lambda: _generate_outputs(targets, invert, 'all', cli_order,
+                                                                             no_priority, dont_stop, jobs), dont_stop)
     finally:
         # Restore the project file
         GS.write_pro(prj)
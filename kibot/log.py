@@ -229,6 +229,23 @@ class MyLogger(logging.Logger):
         return os.path.normcase(f.f_code.co_filename), f.f_lineno, f.f_code.co_name, sinfo
 
 
+def get_warn_counters():
+    """ Current warning counters, used to transfer them between processes """
+    return (MyLogger.warn_cnt, MyLogger.warn_tcnt, MyLogger.n_filtered)
+
+
+def diff_warn_counters(old):
+    """ Warnings reported since `old` was obtained """
+    return tuple(c-o for c, o in zip(get_warn_counters(), old))
+
+
+def add_warn_counters(counters):
+    """ Add the warnings reported by another process """
+    MyLogger.warn_cnt += counters[0]
+    MyLogger.warn_tcnt += counters[1]
+    MyLogger.n_filtered += counters[2]
+
+
 def set_verbosity(logger, verbose, quiet):
     # Choose the log level
     log_level = logging.INFO
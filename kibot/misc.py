@@ -336,6 +336,9 @@ W_NODRILL = '(W170) '
 W_NOPCBTB = '(W171) '
 W_DEFNOSTR = '(W172) '
 W_CONVPDF = '(W173) '
+W_NOPARALLEL = '(W174) '
+W_JOBSET = '(W175) '
+W_DSCACHE = '(W176) '
 # Somehow arbitrary, the colors are real, but can be different
 PCB_MAT_COLORS = {'fr1': "937042", 'fr2': "949d70", 'fr3': "adacb4", 'fr4': "332B16", 'fr5': "6cc290"}
 PCB_FINISH_COLORS = {'hal': "8b898c", 'hasl': "8b898c", 'imag': "8b898c", 'enig': "cfb96e", 'enepig': "cfb96e",
@@ -362,6 +365,8 @@ RENDERERS = ['pcbdraw', 'render_3d', 'blender_export']
 PCB_GENERATORS = ['pcb_variant', 'panelize']
 KIKIT_UNIT_ALIASES = {'millimeters': 'mm', 'inches': 'inch', 'mils': 'mil'}
 UNITS_2_KICAD = {'millimeters': 'mm', 'inches': 'in', 'mils': 'mils'}
+# Units used by the KiCad jobsets
+UNITS_2_JOBSET = {'millimeters': 'mm', 'inches': 'inch'}
 FONT_HELP_TEXT = ('\n        Important: If you use custom fonts and/or colors please consult the `resources_dir` '
                   'global variable.')
 # CSS style for HTML tables used by BoM and ERC
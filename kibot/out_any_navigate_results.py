@@ -20,7 +20,7 @@ from .misc import W_NOTYET, W_MISSTOOL, W_NOOUTPUTS, read_png, force_list, W_CON
 from .pre_base import BasePreFlight
 from .registrable import RegOutput
 from .macros import macros, document  # noqa: F401
-from . import log, __version__
+from . import log, timings, __version__
 
 logger = log.get_logger()
 CAT_IMAGE = {'PCB': 'pcbnew',
@@ -102,7 +102,8 @@ IMAGEABLES_SVG = {'svg'}
 def _run_command(cmd):
     logger.debug('- Executing: '+GS.pasteable_cmd(cmd))
     try:
-        cmd_output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+        with timings.command(cmd):
+            cmd_output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
         odecoded = e.output.decode() if e.output else None
         if odecoded:
@@ -105,6 +105,7 @@ class BaseOutput(RegOutput):
         self._unknown_is_error = True
         self._done = False
         self._category = None
+        self._cacheable = True     # False when the result depends on things we can't track (git, network, etc.)
 
     @staticmethod
     def attr2longopt(attr):
@@ -141,6 +142,21 @@ class BaseOutput(RegOutput):
             return [GS.sch_file]
         return [GS.pcb_file]
 
+    def get_output_dependencies(self, names):
+        """ Returns the names of the outputs, from `names`, that must be created before this output.
+            Used to run outputs in parallel. The default is to look for output names used in the options """
+        deps = set()
+        pending = [self._tree.get('options')] if self._tree else []
+        while pending:
+            v = pending.pop()
+            if isinstance(v, dict):
+                pending.extend(v.values())
+            elif isinstance(v, list):
+                pending.extend(v)
+            elif isinstance(v, str) and v in names and v != self.name:
+                deps.add(v)
+        return deps
+
     def get_extension(self):
         return self.options._expand_ext
 
@@ -908,6 +924,8 @@ class VariantOptions(BaseOptions):
                 self.remove_3D_models(GS.board, self._comps_hash)
                 # Highlight selected components
                 self.highlight_3D_models(GS.board, highlight)
+        # The footprints could be modified
+        GS.fp_snapshot = None
         return True
 
     def unfilter_pcb_components(self, do_3D=False, do_2D=True):
@@ -929,6 +947,7 @@ class VariantOptions(BaseOptions):
             self.unhighlight_3D_models(GS.board)
         if self._sub_pcb:
             self._sub_pcb.revert(self._comps_hash)
+        GS.fp_snapshot = None
 
     def set_title(self, title, sch=False):
         self.old_title = None
@@ -1135,10 +1154,14 @@ class VariantOptions(BaseOptions):
         if self._files_to_remove:
             self.remove_temporals()
 
+    def uses_filters(self):
+        """ True if we apply filters/variants to the components """
+        return bool(self.dnf_filter or self.variant or self.pre_transform or self.exclude_filter)
+
     def load_list_components(self):
         """ Makes the list of components available """
         self._files_to_remove = []
-        if not self.dnf_filter and not self.variant and not self.pre_transform and not self.exclude_filter:
+        if not self.uses_filters():
             return
         # Get the components list from the schematic
         comps = get_all_components(collapse=self._collapse_components)
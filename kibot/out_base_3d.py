@@ -3,11 +3,14 @@
 # Copyright (c) 2020-2025 Instituto Nacional de Tecnología Industrial
 # License: AGPL-3.0
 # Project: KiBot (formerly KiPlot)
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from fnmatch import fnmatch
+import json
 import os
 import re
 import requests
+import tempfile
 import urllib
 from shutil import copy2
 from .bom.units import comp_match
@@ -15,10 +18,11 @@ from .EasyEDA.easyeda_3d import download_easyeda_3d_model
 from .fil_base import reset_filters
 from .misc import (W_MISS3D, W_FAILDL, W_DOWN3D, DISABLE_3D_MODEL_TEXT, W_BADTOL, W_BADRES, W_RESVALISSUE, W_RES3DNAME,
                    EMBED_PREFIX)
+from .fp_snapshot import get_fp_snapshot
 from .gs import GS
 from .optionable import Optionable
 from .out_base import VariantOptions, BaseOutput
-from .kicad.config import KiConf
+from .kicad.config import KiConf, FP_LIB_TABLE
 from .macros import macros, document  # noqa: F401
 from . import log
 
@@ -63,6 +67,13 @@ COLORS = [(0.149, 0.10, 0.10, 0.10, 0.10, 0.10, 0.10, 0.4),  # 0 Black
 TOL_COLORS = {5: 10, 10: 11, 20: 12, 2: 2, 1: 1, 0.5: 5, 0.25: 6, 0.1: 7, 0.05: 3, 0.02: 4, 0.01: 8}
 WIDTHS_4 = [5, 12, 10.5, 12, 10.5, 12, 21, 12, 5]
 WIDTHS_5 = [5, 10, 8.5, 10, 8.5, 10, 8.5, 10, 14.5, 10, 5]
+# Index of the resolved 3D models, stored in the downloaded models dir
+MODELS_INDEX = 'index.json'
+MODELS_INDEX_VERSION = 1
+# How many projects/setups we remember
+MODELS_INDEX_CONTEXTS = 32
+# Simultaneous downloads
+DOWNLOAD_WORKERS = 8
 
 
 def abs_path_model(data, replace):
@@ -137,6 +148,53 @@ def do_expand_env(fname, used_extra, extra_debug, lib_nickname):
     return full_name, False
 
 
+def models_index_context(names):
+    """ Things that affects the resolution of the 3D models names """
+    vars = set()
+    for name in names:
+        vars.update(re.findall(r'\$\{(\S+?)\}', name))
+    tables = {}
+    for dir in (KiConf.config_dir, GS.pcb_dir):
+        if dir:
+            table = os.path.join(dir, FP_LIB_TABLE)
+            st = os.stat(table) if os.path.isfile(table) else None
+            tables[table] = [st.st_mtime_ns, st.st_size] if st else None
+    data = {'kicad_env': KiConf.kicad_env,
+            'pro_vars': GS.load_pro_variables(),
+            'os_env': {v: os.environ.get(v) for v in sorted(vars)} if GS.global_use_os_env_for_expand else None,
+            'aliases_3D': KiConf.aliases_3D,
+            'fp_lib_tables': tables,
+            'no_alias_as_env': GS.global_disable_3d_alias_as_env,
+            'pcb_dir': GS.pcb_dir,
+            'cwd': os.getcwd()}
+    return json.dumps(data, sort_keys=True, default=str)
+
+
+def load_models_index(dir):
+    try:
+        with open(os.path.join(dir, MODELS_INDEX), 'rt') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get('version') != MODELS_INDEX_VERSION:
+        return {}
+    return index.get('contexts', {})
+
+
+def save_models_index(dir, contexts):
+    # Keep the most recently used
+    while len(contexts) > MODELS_INDEX_CONTEXTS:
+        del contexts[next(iter(contexts))]
+    try:
+        os.makedirs(dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dir)
+        with os.fdopen(fd, 'wt') as f:
+            json.dump({'version': MODELS_INDEX_VERSION, 'contexts': contexts}, f)
+        os.replace(tmp, os.path.join(dir, MODELS_INDEX))
+    except OSError as e:
+        logger.debug('Failed to save the 3D models index ({})'.format(e))
+
+
 class Base3DOptions(VariantOptions):
     def __init__(self):
         with document:
@@ -259,6 +317,55 @@ class Base3DOptions(VariantOptions):
         downloaded.add(full_name)
         return replace
 
+    def download_missing(self, full_name, model, sch_comps, downloaded, rel_dirs, force_wrl, lcsc_field):
+        """ Try to download a missing model, from KiCad git or LCSC """
+        replace = self.try_download_kicad(model, full_name, downloaded, rel_dirs, force_wrl)
+        if replace is None and self.download_lcsc:
+            tried = set()
+            for sch_comp in sch_comps:
+                lcsc_id = sch_comp.get_field_value(lcsc_field) if lcsc_field else None
+                if lcsc_id in tried:
+                    continue
+                tried.add(lcsc_id)
+                replace = self.try_download_easyeda(model, full_name, downloaded, sch_comp, lcsc_field)
+                if replace:
+                    break
+        return replace
+
+    def resolve_models(self, keys, extra_debug):
+        """ Expands the names of the 3D models, the keys are (name, footprint lib nickname).
+            Returns a dict with (full_name, is_embedded, used_extra, found).
+            The found models are stored in an index, so we just need to check the final name in the next runs """
+        contexts = load_models_index(self._tmp_dir)
+        context = models_index_context([k[0] for k in keys])
+        index = contexts.pop(context, {})
+        resolved = {}
+        to_solve = []
+        for key in keys:
+            cached = index.get(key[1]+'\t'+key[0])
+            # Only found models are stored, a missing model could be found in various ways
+            if cached is not None and (cached[1] or os.path.isfile(cached[0])):
+                resolved[key] = tuple(cached)
+            else:
+                to_solve.append(key)
+        logger.debug('3D models: {} unique, {} from the index'.format(len(keys), len(resolved)))
+
+        def solve(key):
+            used_extra = [False]
+            full_name, is_embedded = do_expand_env(key[0], used_extra, extra_debug, key[1])
+            return full_name, is_embedded, used_extra[0], not is_embedded and os.path.isfile(full_name)
+
+        if to_solve:
+            with ThreadPoolExecutor() as pool:
+                for key, res in zip(to_solve, pool.map(solve, to_solve)):
+                    resolved[key] = res
+                    if res[1] or res[3]:
+                        index[key[1]+'\t'+key[0]] = res
+        contexts[context] = index
+        if to_solve:
+            save_models_index(self._tmp_dir, contexts)
+        return resolved
+
     def is_tht_resistor(self, name):
         # Works for R_Axial_DIN* KiCad 6.0.10 3D models
         name = os.path.splitext(os.path.basename(name))[0]
@@ -493,10 +600,10 @@ class Base3DOptions(VariantOptions):
             logger.debug('Using `{}` as dir for downloaded 3D models'.format(self._tmp_dir))
         rel_dirs.append(self._tmp_dir)
         # Look for all the footprints
-        for m in GS.get_modules():
-            ref = m.GetReference()
-            lib_id = m.GetFPID()
-            lib_nickname = str(lib_id.GetLibNickname())
+        to_check = []
+        footprints_models = []
+        fps = get_fp_snapshot()
+        for m, ref, lib_nickname in zip(fps.modules, fps.refs, fps.lib_nicknames):
             sch_comp = all_comps_hash.get(ref, None)
             # Extract the models (the iterator returns copies)
             models = m.Models()
@@ -513,29 +620,47 @@ class Base3DOptions(VariantOptions):
                 if is_copy_mode and not fnmatch(m3d.m_Filename, rename_filter):
                     # Skip filtered footprints
                     continue
-                used_extra = [False]
-                full_name, is_embedded = do_expand_env(m3d.m_Filename, used_extra, extra_debug, lib_nickname)
-                if not is_embedded and not os.path.isfile(full_name):
-                    logger.debugl(2, 'Missing 3D model file {} ({})'.format(full_name, m3d.m_Filename))
-                    # Missing 3D model
-                    if self.download:
-                        replace = self.try_download_kicad(m3d.m_Filename, full_name, downloaded, rel_dirs, force_wrl)
-                        if replace is None and self.download_lcsc:
-                            replace = self.try_download_easyeda(m3d.m_Filename, full_name, downloaded, sch_comp, lcsc_field)
-                        if replace:
-                            replace = self.do_colored_tht_resistor(replace, sch_comp, used_extra)
-                            self.replace_model(replace, m3d, force_wrl, is_copy_mode, rename_function, rename_data)
-                    if full_name not in downloaded:
-                        logger.warning(W_MISS3D+'Missing 3D model for {}: `{}`'.format(ref, full_name))
-                elif not is_embedded:  # File was found
-                    replace = self.do_colored_tht_resistor(full_name, sch_comp, used_extra)
-                    if used_extra[0] or is_copy_mode:
-                        # The file is there, but we got it expanding a user defined text
-                        # This is completely valid for KiCad, but kicad2step doesn't support it
-                        if not self.models_replaced and extra_debug:
-                            logger.debug('- Modifying models with text vars')
-                        self.replace_model(replace, m3d, force_wrl, is_copy_mode, rename_function, rename_data)
-            # Push the models back
+                to_check.append((ref, sch_comp, m3d, lib_nickname))
+            footprints_models.append((models, models_l))
+        # Solve each model only once
+        resolved = self.resolve_models({(m3d.m_Filename, lib_nickname) for _, _, m3d, lib_nickname in to_check}, extra_debug)
+        # Download the missing models
+        missing = {}
+        for _, sch_comp, m3d, lib_nickname in to_check:
+            full_name, is_embedded, _, found = resolved[(m3d.m_Filename, lib_nickname)]
+            if not is_embedded and not found:
+                logger.debugl(2, 'Missing 3D model file {} ({})'.format(full_name, m3d.m_Filename))
+                comps = missing.setdefault(full_name, (m3d.m_Filename, []))[1]
+                if sch_comp is not None:
+                    comps.append(sch_comp)
+        replacements = {}
+        if self.download and missing:
+            with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(missing))) as pool:
+                res = pool.map(lambda m: self.download_missing(m[0], m[1][0], m[1][1], downloaded, rel_dirs, force_wrl,
+                                                               lcsc_field), missing.items())
+                replacements = dict(zip(missing.keys(), res))
+        # Apply the changes
+        for ref, sch_comp, m3d, lib_nickname in to_check:
+            full_name, is_embedded, extra, found = resolved[(m3d.m_Filename, lib_nickname)]
+            used_extra = [extra]
+            if not is_embedded and not found:
+                # Missing 3D model
+                replace = replacements.get(full_name)
+                if replace:
+                    replace = self.do_colored_tht_resistor(replace, sch_comp, used_extra)
+                    self.replace_model(replace, m3d, force_wrl, is_copy_mode, rename_function, rename_data)
+                if full_name not in downloaded:
+                    logger.warning(W_MISS3D+'Missing 3D model for {}: `{}`'.format(ref, full_name))
+            elif not is_embedded:  # File was found
+                replace = self.do_colored_tht_resistor(full_name, sch_comp, used_extra)
+                if used_extra[0] or is_copy_mode:
+                    # The file is there, but we got it expanding a user defined text
+                    # This is completely valid for KiCad, but kicad2step doesn't support it
+                    if not self.models_replaced and extra_debug:
+                        logger.debug('- Modifying models with text vars')
+                    self.replace_model(replace, m3d, force_wrl, is_copy_mode, rename_function, rename_data)
+        # Push the models back
+        for models, models_l in footprints_models:
             for model in reversed(models_l):
                 models.append(model)
         if downloaded:
@@ -548,7 +673,7 @@ class Base3DOptions(VariantOptions):
         KiConf.init(GS.pcb_file)
         models = set()
         # Look for all the footprints
-        for m in GS.get_modules():
+        for m in get_fp_snapshot().modules:
             # Look for all the 3D models for this footprint
             for m3d in m.Models():
                 full_name = KiConf.expand_env(m3d.m_Filename)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-# Copyright (c) 2021-2023 Salvador E. Tropea
-# Copyright (c) 2021-2023 Instituto Nacional de Tecnología Industrial
+# Copyright (c) 2021-2025 Salvador E. Tropea
+# Copyright (c) 2021-2025 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 """
@@ -14,11 +14,16 @@ Dependencies:
     debian: rar
     arch: rar(AUR)
 """
+from concurrent.futures import ThreadPoolExecutor
 import re
 import os
 import glob
-import sys
-from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+import time
+import zipfile
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+import zlib
 from tarfile import open as tar_open
 from collections import OrderedDict
 from .gs import GS
@@ -30,6 +35,70 @@ from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
 logger = log.get_logger()
+# Files that are already compressed, we just store them
+INCOMPRESSIBLE = {'.zip', '.gz', '.tgz', '.bz2', '.tbz2', '.xz', '.txz', '.lz', '.lzma', '.zst', '.7z', '.rar', '.png',
+                  '.jpg', '.jpeg', '.gif', '.webp', '.pdf', '.mp3', '.mp4', '.mkv', '.webm', '.ogg', '.wrz', '.stpz',
+                  '.3mf', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.jar'}
+# Size of the chunks read from the files
+CHUNK_SIZE = 1 << 20
+# Compressed data bigger than this goes to disk
+SPOOL_SIZE = 8 << 20
+# Files added to a RAR archive in each run of the tool
+RAR_BATCH = 200
+# Internals of the zipfile module used to add entries compressed by other threads
+ZIPFILE_INTERNALS = ('_writecheck', '_didModify', '_seekable', 'start_dir', '_allowZip64', 'fp', 'filelist', 'NameToInfo')
+
+
+def is_incompressible(fname):
+    return os.path.splitext(fname)[1].lower() in INCOMPRESSIBLE
+
+
+def compress_entry(fname, zinfo, level):
+    """ Compress a file for a ZIP entry. Runs in a worker thread, zlib, bz2 and lzma release the GIL.
+        Returns a file with the compressed data, zinfo is filled with the CRC and sizes """
+    compressor = zipfile._get_compressor(zinfo.compress_type, level)
+    data = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    crc = size = 0
+    with open(fname, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data.write(compressor.compress(chunk))
+    data.write(compressor.flush())
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = data.tell()
+    data.seek(0)
+    return data
+
+
+def can_write_compressed(zip):
+    """ The parallel compression uses zipfile internals, they aren't an stable API """
+    return hasattr(zipfile, '_get_compressor') and all(hasattr(zip, attr) for attr in ZIPFILE_INTERNALS)
+
+
+def write_compressed_entry(zip, zinfo, data):
+    """ Add an entry already compressed by `compress_entry`.
+        Does what ZipFile does when we close an entry opened for writing, but we skip the compression """
+    zip._writecheck(zinfo)
+    zip._didModify = True
+    if zinfo.compress_type == ZIP_LZMA:
+        # Compressed data includes an end-of-stream (EOS) marker
+        zinfo.flag_bits |= 0x02
+    if zip._seekable:
+        zip.fp.seek(zip.start_dir)
+    zinfo.header_offset = zip.fp.tell()
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    if zip64 and not zip._allowZip64:
+        raise zipfile.LargeZipFile('File size too large, try using allowZip64')
+    zip.fp.write(zinfo.FileHeader(zip64))
+    copyfileobj(data, zip.fp, CHUNK_SIZE)
+    zip.filelist.append(zinfo)
+    zip.NameToInfo[zinfo.filename] = zinfo
+    zip.start_dir = zip.fp.tell()
 
 
 class FilesListCompress(Optionable):
@@ -91,6 +160,13 @@ class CompressOptions(BaseOptions):
             """ Store the file pointed by symlinks, not the symlink """
             self.skip_not_run = False
             """ Skip outputs with `run_by_default: false` """
+            self.store_incompressible = True
+            """ Store the files that are already compressed (i.e. PNG, JPG, PDF, ZIP, gzip) without compressing them
+                again. Only for the ZIP and RAR formats """
+            self.workers = 1
+            """ [0,1000] Number of threads used to compress the ZIP entries. Use 0 for the number of CPUs.
+                Each thread can keep up to two compressed entries of 8 MB in memory. Uses internals of the Python
+                `zipfile` module, when they aren't available we use one thread """
         super().__init__()
 
     def config(self, parent):
@@ -102,16 +178,44 @@ class CompressOptions(BaseOptions):
 
     def create_zip(self, output, files):
         extra = {}
-        extra['compression'] = self.ZIP_ALGORITHMS[self.compression]
-        if sys.version_info >= (3, 7):
-            extra['compresslevel'] = 9
-        with ZipFile(output, 'w', **extra) as zip:
+        compression = extra['compression'] = self.ZIP_ALGORITHMS[self.compression]
+        level = extra['compresslevel'] = 9
+        workers = self.workers or os.cpu_count() or 1
+        pending = []
+        with ZipFile(output, 'w', **extra) as zip, ThreadPoolExecutor(max_workers=workers) as pool:
+            if workers > 1 and not can_write_compressed(zip):
+                logger.debug('Unsupported zipfile module, compressing the entries using one thread')
+                workers = 1
+            def flush(limit):
+                # Write the finished entries in order, keep at most `limit` in flight
+                while len(pending) > limit:
+                    zinfo, future = pending.pop(0)
+                    if future is None:
+                        zip.write(*zinfo)
+                    else:
+                        with future.result() as data:
+                            write_compressed_entry(zip, zinfo, data)
+
             for fname, dest in files.items():
                 if dest == '/':
                     # When we move all to / the main dir is stored as / and Python crashes
                     continue
                 logger.debug('Adding '+fname+' as '+dest)
-                zip.write(fname, dest)
+                compress_type = None
+                if os.path.isdir(fname) or compression == ZIP_STORED:
+                    pass
+                elif self.store_incompressible and is_incompressible(fname):
+                    compress_type = ZIP_STORED
+                elif workers > 1:
+                    zinfo = ZipInfo.from_file(fname, dest)
+                    zinfo.compress_type = compression
+                    pending.append((zinfo, pool.submit(compress_entry, fname, zinfo, level)))
+                    flush(2*workers)
+                    continue
+                # Streamed by the main thread
+                pending.append(((fname, dest, compress_type), None))
+                flush(2*workers)
+            flush(0)
 
     def create_tar(self, output, files):
         with tar_open(output, 'w:'+self.TAR_MODE[self.compression]) as tar:
@@ -125,10 +229,16 @@ class CompressOptions(BaseOptions):
         command = self.ensure_tool('RAR')
         if command is None:
             return
+        # One run for each destination dir, using batches to avoid long command lines
+        dirs = OrderedDict()
         for fname, dest in files.items():
             logger.debugl(2, 'Adding '+fname+' as '+dest)
-            cmd = [command, 'a', '-m5', '-ep', '-ap'+os.path.dirname(dest), output, fname]
-            run_command(cmd, err_msg='Failed to invoke rar command, error {ret}', err_lvl=WRONG_INSTALL)
+            dirs.setdefault(os.path.dirname(dest), []).append(fname)
+        store = ['-ms'+';'.join(sorted(e[1:] for e in INCOMPRESSIBLE))] if self.store_incompressible else []
+        for dest_dir, names in dirs.items():
+            for n in range(0, len(names), RAR_BATCH):
+                cmd = [command, 'a', '-m5', '-ep', '-ap'+dest_dir]+store+[output]+names[n:n+RAR_BATCH]
+                run_command(cmd, err_msg='Failed to invoke rar command, error {ret}', err_lvl=WRONG_INSTALL)
 
     def solve_extension(self):
         if self.format == 'ZIP':
@@ -226,6 +336,14 @@ class CompressOptions(BaseOptions):
                 files[fname_real] = dest
         return files, list(dirs_list)
 
+    def report_throughput(self, output, files, elapsed):
+        size = sum(os.path.getsize(f) for f in files.keys() if os.path.isfile(f))
+        if not os.path.isfile(output):
+            return
+        mb = 1024*1024
+        logger.info('- {} files, {:.1f} MB -> {:.1f} MB in {:.2f} s ({:.1f} MB/s)'.
+                    format(len(files), size/mb, os.path.getsize(output)/mb, elapsed, size/mb/max(elapsed, 1e-6)))
+
     def get_targets(self, out_dir):
         return [self._parent.expand_filename(out_dir, self.output)]
 
@@ -253,12 +371,14 @@ class CompressOptions(BaseOptions):
         # Collect the files
         files, dirs_outs = self.get_files(output)
         logger.debug('Generating `{}` archive'.format(output))
+        start = time.perf_counter()
         if self.format == 'ZIP':
             self.create_zip(output, files)
         elif self.format == 'TAR':
             self.create_tar(output, files)
         elif self.format == 'RAR':
             self.create_rar(output, files)
+        self.report_throughput(output, files, time.perf_counter()-start)
         if self.move_files:
             dirs = dirs_outs
             for fname in files.keys():
@@ -291,6 +411,7 @@ class Compress(BaseOutput):  # noqa: F821
             self.options = CompressOptions
             """ *[dict={}] Options for the `compress` output """
         self._none_related = True
+        self._cacheable = False
         # The help is inherited and already mentions the default priority
         self.fix_priority_help()
 
@@ -415,6 +415,7 @@ class Copy_Files(BaseOutput):  # noqa: F821
         # Mostly oriented to the project copy
         self._category = ['PCB/docs', 'Schematic/docs']
         self._any_related = True
+        self._cacheable = False
 
     def get_dependencies(self):
         return self.options.get_dependencies()
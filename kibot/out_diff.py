@@ -21,10 +21,12 @@ Dependencies:
 """
 from hashlib import sha1
 from itertools import combinations
+import json
 import os
 import re
 from shutil import rmtree, copy2
 from subprocess import CalledProcessError
+import time
 from .error import KiPlotConfigurationError
 from .gs import GS
 from .kiplot import load_any_sch, run_command, config_output, get_output_dir, run_output
@@ -34,11 +36,40 @@ from .registrable import RegOutput
 from .out_any_diff import AnyDiffOptions, has_repo
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
+from . import __version__
 
 logger = log.get_logger()
 STASH_MSG = 'KiBot_Changes_Entry'
 
 
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def trim(cache_dir, max_size, max_age=None):
+    """ Removes the renders not used in `max_age` seconds, and then the least recently used ones until the cache size
+        is below `max_size` bytes """
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        try:
+            if not os.path.isdir(entry):
+                continue
+            mtime = os.path.getmtime(entry)
+            size = _dir_size(entry)
+        except OSError:
+            continue
+        entries.append((mtime, size, name))
+        total += size
+    too_old = time.time()-max_age if max_age is not None else None
+    for mtime, size, name in sorted(entries):
+        if (too_old is None or mtime >= too_old) and total <= max_size:
+            break
+        logger.debug(f'- Removing {name} from the diff cache')
+        rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+
 class DiffOptions(AnyDiffOptions):
     def __init__(self):
         with document:
@@ -71,7 +102,18 @@ class DiffOptions(AnyDiffOptions):
                 This is an extension of the `output` mode.
                 If `old` is also `multivar` then it becomes the reference, otherwise we compare using pairs of variants """
             self.cache_dir = ''
-            """ Directory to cache the intermediate files. Leave it blank to disable the cache """
+            """ Directory to cache the intermediate files. Leave it blank to use the default cache.
+                See `persistent_cache` """
+            self.persistent_cache = False
+            """ When `cache_dir` is empty keep the rendered layers in `~/.cache/kibot/diff`, so they can be reused
+                in the next runs. As an example: a CI job comparing `HEAD~1` vs `HEAD` will only render the new
+                revision. The cache is trimmed using `persistent_cache_size` and `persistent_cache_max_age`.
+                When disabled we use a temporal cache that is removed after the comparison """
+            self.persistent_cache_size = 1024
+            """ [1,1000000] Maximum size of the persistent cache [MB]. The least recently used renders are removed """
+            self.persistent_cache_max_age = 90
+            """ [0,36500] Renders in the persistent cache not used in this number of days are removed.
+                Use 0 for no limit """
             self.diff_mode = 'red_green'
             """ [red_green,stats,2color] In the `red_green` mode added stuff is green and red when removed.
                 The `stats` mode is used to measure the amount of difference. In this mode all
@@ -114,7 +156,6 @@ class DiffOptions(AnyDiffOptions):
             self.color_removed = '#FF0000'
             """ Color used for the removed stuff in the '2color' mode """
         super().__init__()
-        self.add_to_doc("zones", "Be careful with the cache when changing this setting")
 
     def config(self, parent):
         super().config(parent)
@@ -133,17 +174,50 @@ class DiffOptions(AnyDiffOptions):
     def get_targets(self, out_dir):
         return [self._parent.expand_filename(out_dir, self.output)]
 
-    def get_digest(self, file_path, restart=True):
-        logger.debug('Hashing '+file_path)
-        if restart:
-            self.h = sha1()
-        with open(file_path, 'rb') as file:
-            while True:
-                chunk = file.read(self.h.block_size)
-                if not chunk:
-                    break
-                self.h.update(chunk)
-        return self.h.hexdigest()
+    def get_render_key(self):
+        """ Things that change the rendered layers, other than the file content """
+        zones = []
+        self.add_zones_ops(zones)
+        layers = [la.id for la in self._solved_layers] if self.pcb else None
+        data = {'kibot': __version__, 'kicad': GS.kicad_version_n, 'tools': self._tools_versions, 'zones': zones,
+                'layers': layers, 'all_pages': not self.only_first_sch_page}
+        return json.dumps(data, sort_keys=True)
+
+    def get_git_blob_ids(self, files, cwd):
+        """ The blob ids for the files git has in the index, avoids hashing them again """
+        try:
+            res = self.run_git(['ls-files', '-s', '-z', '--']+[os.path.abspath(f) for f in files], cwd=cwd, just_raise=True)
+        except CalledProcessError:
+            return {}
+        blobs = {}
+        for entry in res.split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            blobs[os.path.normpath(os.path.join(cwd, path))] = info.split()[1]
+        return blobs
+
+    def get_digest(self, files):
+        """ Cache key for the rendered files.
+            Each file is identified using its git blob id, computed here unless git already knows it """
+        blobs = self.get_git_blob_ids(files, self._git_clean_dir) if self._git_clean_dir else {}
+        h = sha1(self._render_key.encode())
+        for file_path in files:
+            blob = blobs.get(os.path.normpath(os.path.abspath(file_path)))
+            if blob is not None:
+                logger.debug('Using git blob id for '+file_path)
+            else:
+                logger.debug('Hashing '+file_path)
+                b = sha1(b'blob %d\0' % os.path.getsize(file_path))
+                with open(file_path, 'rb') as file:
+                    while True:
+                        chunk = file.read(65536)
+                        if not chunk:
+                            break
+                        b.update(chunk)
+                blob = b.hexdigest()
+            h.update(blob.encode())
+        return h.hexdigest()
 
     def cache_pcb(self, name, force_exist):
         if name:
@@ -157,8 +231,9 @@ class DiffOptions(AnyDiffOptions):
                 raise KiPlotConfigurationError('Missing file to compare: `{}`'.format(name))
             name, to_remove = self.write_empty_file(name, create_tmp=True)
             self._to_remove.extend(to_remove)
-        hash = self.get_digest(name)
+        hash = self.get_digest([name])
         self.add_to_cache(name, hash)
+        self.touch_cache_entry(hash)
         return hash
 
     def cache_sch(self, name, force_exist):
@@ -175,15 +250,18 @@ class DiffOptions(AnyDiffOptions):
             self._to_remove.extend(to_remove)
         # Schematics can have sub-sheets
         sch = load_any_sch(name, os.path.splitext(os.path.basename(name))[0])
-        files = sch.get_files()
-        hash = self.get_digest(files[0])
-        if len(files) > 1:
-            for f in files[1:]:
-                hash = self.get_digest(f, restart=False)
-        hash = 'sch'+hash
+        hash = 'sch'+self.get_digest(sch.get_files())
         self.add_to_cache(name, hash)
+        self.touch_cache_entry(hash)
         return hash
 
+    def touch_cache_entry(self, hash):
+        """ Mark the renders as recently used, KiDiff doesn't touch them when they are reused """
+        try:
+            os.utime(os.path.join(self.cache_dir, hash))
+        except OSError:
+            pass
+
     def cache_file(self, name=None, force_exist=False):
         self.git_hash = 'Current' if not name else 'FILE'
         return self.cache_pcb(name, force_exist) if self.pcb else self.cache_sch(name, force_exist)
@@ -344,6 +422,8 @@ class DiffOptions(AnyDiffOptions):
                     ops.append('--force')
                 self.run_git(ops+['--recurse-submodules', name])
                 self.checkedout = True
+                # The files are the ones in the index
+                self._git_clean_dir = self.repo_dir
             else:
                 name_ori = 'Dirty' if self.git_dirty() else 'HEAD'
             # Populate the cache
@@ -351,6 +431,7 @@ class DiffOptions(AnyDiffOptions):
             # A short version of the current hash
             self.git_hash = self.get_git_point_desc(name_ori)
         finally:
+            self._git_clean_dir = None
             self.undo_git_use_stash()
         return hash
 
@@ -378,7 +459,12 @@ class DiffOptions(AnyDiffOptions):
             name_copy = self.run_git(['ls-files', '--full-name', self.file])
             name_copy = os.path.join(git_tmp_wd, name_copy)
             logger.debug('- Using temporal copy: '+name_copy)
-            hash = self.cache_file(name_copy, force_exist=True)
+            # A fresh checkout, the files are the ones in the index
+            self._git_clean_dir = git_tmp_wd
+            try:
+                hash = self.cache_file(name_copy, force_exist=True)
+            finally:
+                self._git_clean_dir = None
             cwd = git_tmp_wd
         else:
             name_ori = 'Dirty' if self.git_dirty() else 'HEAD'
@@ -497,24 +583,33 @@ class DiffOptions(AnyDiffOptions):
                 os.symlink(os.path.basename(name), target)
 
     def run(self, name):
-        self.command = self.ensure_tool('KiDiff')
+        self.command, kidiff_ver = self.ensure_tool_get_ver('KiDiff')
+        self._tools_versions = [kidiff_ver]
         self._to_remove = []
         self._worktrees_to_remove = []
+        self._git_clean_dir = None
         if self.old_type == 'git' or self.new_type == 'git':
             self.git_command = self.ensure_tool('Git')
         if not self.pcb:
             # We need eeschema_do for this
-            self.ensure_tool('KiAuto')
+            self._tools_versions.append(self.ensure_tool_get_ver('KiAuto')[1])
         # Solve the cache dir
         self.dirs_to_remove = []
+        trim_cache = False
         if not self.cache_dir:
-            self.cache_dir = GS.mkdtemp('diff-cache')
-            self.dirs_to_remove.append(self.cache_dir)
+            if self.persistent_cache:
+                trim_cache = True
+                self.cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'diff')
+                os.makedirs(self.cache_dir, exist_ok=True)
+            else:
+                self.cache_dir = GS.mkdtemp('diff-cache')
+                self.dirs_to_remove.append(self.cache_dir)
         self.incl_file = None
         name_ori = name
         try:
             # List of layers
             self.incl_file = self.create_layers_incl(self.layers)
+            self._render_key = self.get_render_key()
             if self.new_type == 'multivar' and self.old_type != 'multivar':
                 # Special case, we generate various files
                 base_id = self._expand_id
@@ -541,6 +636,9 @@ class DiffOptions(AnyDiffOptions):
             # Clean-up
             for d in self.dirs_to_remove:
                 rmtree(d)
+            if trim_cache:
+                max_age = self.persistent_cache_max_age*24*3600 if self.persistent_cache_max_age else None
+                trim(self.cache_dir, self.persistent_cache_size*1024*1024, max_age)
             if self.incl_file:
                 os.remove(self.incl_file)
             for f in self._to_remove:
@@ -559,6 +657,7 @@ class Diff(BaseOutput):  # noqa: F821
         super().__init__()
         self._category = ['PCB/docs', 'Schematic/docs']
         self._any_related = True
+        self._cacheable = False
         with document:
             self.options = DiffOptions
             """ *[dict={}] Options for the `diff` output """
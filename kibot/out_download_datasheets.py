@@ -5,13 +5,13 @@
 # Project: KiBot (formerly KiPlot)
 import os
 import re
-import requests
-import urllib.request
+from shutil import copyfile, rmtree
+from .download_cache import Downloader, get_cache_dir
 from .optionable import Optionable
 from .out_base import VariantOptions
 from .fil_base import DummyFilter
 from .error import KiPlotConfigurationError
-from .misc import W_UNKFLD, W_ALRDOWN, W_FAILDL, USER_AGENT
+from .misc import W_UNKFLD, W_ALRDOWN, W_FAILDL, W_DSCACHE
 from .gs import GS
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
@@ -49,6 +49,20 @@ class Download_Datasheets_Options(VariantOptions):
                 It only makes sense if the `output` field makes their output different """
             self.link_repeated = True
             """ Instead of download things we already downloaded use symlinks """
+            self.workers = 8
+            """ [1,64] Number of simultaneous downloads """
+            self.workers_per_host = 2
+            """ [1,64] Maximum number of simultaneous downloads from the same server """
+            self.timeout = 20
+            """ [1,3600] Time in seconds to wait for a server response """
+            self.use_cache = True
+            """ Keep the downloaded files in `~/.cache/kibot/datasheets`, shared by all the projects.
+                Files in the cache are downloaded again only if the server reports they changed """
+            self.cache_size = 512
+            """ [1,1000000] Maximum size of the datasheets cache [MB]. The least recently used files are removed """
+            self.cache_max_age = 365
+            """ [0,36500] Files in the datasheets cache not used in this number of days are removed.
+                Use 0 for no limit """
         # Used to collect the targets
         self._dry = False
         self._unknown_is_error = True
@@ -78,43 +92,65 @@ class Download_Datasheets_Options(VariantOptions):
         elif known is not None and self.link_repeated:
             # We already downloaded this URL, but stored it with a different name
             if not self._dry:
-                os.symlink(known, dest)
+                self._links.append((c, ds, known, dest))
             self._created.append(os.path.relpath(dest))
         elif not os.path.isfile(dest):
-            # Download
+            # Download, done later, in parallel
             if not self._dry:
-                if 'digikey' in ds:
-                    req = urllib.request.Request(ds)
-                    req.add_header('User-Agent', USER_AGENT)
-                    try:
-                        data = urllib.request.urlopen(req).read()
-                    except Exception as e:
-                        return self.do_warning('Failed '+str(e), ds, c)
-                else:
-                    try:
-                        r = requests.get(ds, allow_redirects=True, headers={'User-Agent': USER_AGENT}, timeout=20)
-                    except requests.exceptions.ReadTimeout:
-                        return self.do_warning('Timeout', ds, c)
-                    except requests.exceptions.SSLError:
-                        return self.do_warning('SSL Error', ds, c)
-                    except requests.exceptions.TooManyRedirects:
-                        return self.do_warning('More than 30 redirections', ds, c)
-                    except requests.exceptions.ConnectionError:
-                        return self.do_warning('Connection', ds, c)
-                    except requests.exceptions.RequestException as e:
-                        return self.do_warning(str(e), ds, c)
-                    if r.status_code != 200:
-                        return self.do_warning('Failed with status '+str(r.status_code), ds, c)
-                    else:
-                        data = r.content
-                with open(dest, 'wb') as f:
-                    f.write(data)
+                self._pending.append((c, ds, dest, name))
             self._downloaded.add(name)
             self._created.append(os.path.relpath(dest))
         elif self._dry:
             self._created.append(os.path.relpath(dest))
         return name
 
+    def remove_failed(self, c, ds, dest, msg):
+        self.do_warning(msg, ds, c)
+        self._created.remove(os.path.relpath(dest))
+
+    def download_pending(self):
+        """ Downloads the files collected by `download` and creates the symlinks """
+        if not self._pending and not self._links:
+            return
+        use_cache = self.use_cache
+        downloader = None
+        if use_cache:
+            cache_dir = get_cache_dir()
+            max_age = self.cache_max_age*24*3600 if self.cache_max_age else None
+            try:
+                downloader = Downloader(cache_dir, self.workers, self.workers_per_host, self.timeout,
+                                        self.cache_size*1024*1024, max_age)
+            except OSError as e:
+                # I.e. read-only or missing HOME
+                logger.warning(W_DSCACHE+f'Unable to use the datasheets cache ({e}), using a temporal dir')
+                use_cache = False
+        if downloader is None:
+            cache_dir = GS.mkdtemp('datasheets')
+            downloader = Downloader(cache_dir, self.workers, self.workers_per_host, self.timeout)
+        failed = set()
+        try:
+            res = downloader.fetch_all(ds for _, ds, _, _ in self._pending)
+            for c, ds, dest, name in self._pending:
+                fname, error = res[ds]
+                if error:
+                    self.remove_failed(c, ds, dest, error)
+                    self._downloaded.discard(name)
+                    failed.add(name)
+                else:
+                    copyfile(fname, dest)
+        finally:
+            downloader.close()
+            if not use_cache:
+                rmtree(cache_dir)
+        for c, ds, known, dest in self._links:
+            if known in failed:
+                # The original download failed
+                self.remove_failed(c, ds, dest, res[ds][1])
+            else:
+                os.symlink(known, dest)
+        self._pending = []
+        self._links = []
+
     def out_name(self, c):
         """ Compute the name of the output file.
             Replaces `${FIELD}` and %X. """
@@ -146,6 +182,8 @@ class Download_Datasheets_Options(VariantOptions):
         self._urls = {}
         self._downloaded = set()
         self._created = []
+        self._pending = []
+        self._links = []
         field_used = False
         for c in self._comps:
             ds = c.get_field_value(self.field)
@@ -162,6 +200,7 @@ class Download_Datasheets_Options(VariantOptions):
                         self._urls[ds] = name
                 else:
                     logger.debug('Already downloaded: '+ds)
+        self.download_pending()
         if not field_used:
             known_fields = GS.sch.get_field_names({})
             if self.field not in known_fields:
@@ -190,6 +229,7 @@ class Download_Datasheets(BaseOutput):  # noqa: F821
             """ *[dict={}] Options for the `download_datasheets` output """
         self._sch_related = True
         self._category = 'Schematic/docs'
+        self._cacheable = False
 
     def run(self, output_dir):
         # No output member, just a dir
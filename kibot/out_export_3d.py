@@ -130,6 +130,30 @@ class Export_3DOptions(Base3DOptions):
         if self._files_to_remove:
             self.remove_temporals()
 
+    def get_jobset_jobs(self, name):
+        """ Jobs used to generate the output using a KiCad jobset, None if not possible """
+        if not GS.ki9 or self.uses_filters() or self.origin not in ('grid', 'drill'):
+            return None
+        # Download the missing 3D models, we can't use the jobset if the board needs changes
+        self.load_list_components()
+        if self.filter_components() != GS.pcb_file:
+            self.remove_temporals()
+            return None
+        settings = {'format': self.format, 'overwrite': True, 'use_grid_origin': self.origin == 'grid',
+                    'use_drill_origin': self.origin == 'drill', 'include_unspecified': not self.no_virtual,
+                    'include_dnp': True, 'substitute_models': self.subst_models, 'board_only': self.board_only,
+                    'export_board_body': not self.no_board_body, 'export_components': not self.no_components,
+                    'export_tracks': self.include_tracks, 'export_pads': self.include_pads,
+                    'export_zones': self.include_zones, 'export_inner_copper': self.include_inner_copper,
+                    'export_silkscreen': self.include_silkscreen, 'export_soldermask': self.include_soldermask,
+                    'fuse_shapes': self.fuse_shapes, 'cut_vias_in_body': self.cut_vias_in_body,
+                    'fill_all_vias': self.fill_all_vias, 'net_filter': self.net_filter,
+                    'optimize_step': not (self.format == 'step' and self.no_optimize_step)}
+        if self.min_distance >= 0:
+            # KiCad uses mm here
+            settings['board_outlines_chaining_epsilon'] = self.min_distance*self._scale*(25.4 if self._units == 'in' else 1)
+        return [('pcb_export_3d', settings, name)]
+
 
 @output_class
 class Export_3D(Base3D):
@@ -26,7 +26,7 @@ from .misc import BOM_ERROR, W_EXTNAME, W_NONETLIST
 from .gs import GS
 from .out_base import VariantOptions
 from .macros import macros, document, output_class  # noqa: F401
-from . import log
+from . import log, timings
 
 logger = log.get_logger()
 WARNING_MIX = "Avoid using it in conjunction with IBoM native filtering options"
@@ -228,7 +228,8 @@ class IBoMOptions(VariantOptions):
         # Run the command
         logger.debug('Running: '+str(cmd))
         try:
-            cmd_output = check_output(cmd, stderr=STDOUT)
+            with timings.command(cmd):
+                cmd_output = check_output(cmd, stderr=STDOUT)
             cmd_output_dec = cmd_output.decode()
             # IBoM returns 0 for this error!!!
             if 'ERROR Parsing failed' in cmd_output_dec:
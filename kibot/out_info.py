@@ -67,6 +67,7 @@ class Info(BaseOutput):  # noqa: F821
     def __init__(self):
         super().__init__()
         self._category = ['PCB/docs', 'Schematic/docs']
+        self._cacheable = False
         with document:
             self.options = InfoOptions
             """ *[dict={}] Options for the `info` output """
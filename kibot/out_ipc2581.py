@@ -6,7 +6,7 @@
 from .gs import GS
 from .optionable import Optionable
 from .out_base import VariantOptions
-from .misc import MISSING_TOOL, UNITS_2_KICAD, W_BADFIELD
+from .misc import MISSING_TOOL, UNITS_2_KICAD, UNITS_2_JOBSET, W_BADFIELD
 from .kiplot import run_command
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
@@ -92,6 +92,18 @@ class IPC2581Options(VariantOptions):
         cmd.append(board_name)
         run_command(cmd)
 
+    def get_jobset_jobs(self, name):
+        """ Jobs used to generate the output using a KiCad jobset, None if not possible """
+        if not GS.ki9 or self.uses_filters():
+            return None
+        settings = {'units': UNITS_2_JOBSET[self.units], 'precision': int(self.precision), 'version': self.version,
+                    'compress': self.compress, 'field_bom_map.mfg_pn': self._field_part_number or '',
+                    'field_bom_map.mfg': self._field_manufacturer or '',
+                    'field_bom_map.dist_pn': self._field_dist_part_number or '',
+                    'field_bom_map.dist': self._field_distributor or '',
+                    'field_bom_map.internal_id': self._field_internal_id or ''}
+        return [('pcb_export_ipc2581', settings, name)]
+
 
 @output_class
 class IPC2581(BaseOutput):  # noqa: F821
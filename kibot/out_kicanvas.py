@@ -211,6 +211,7 @@ class KiCanvas(BaseOutput):  # noqa: F821
         super().__init__()
         self._category = ['PCB/docs', 'Schematic/docs']
         self._any_related = True
+        self._cacheable = False
         with document:
             self.output = GS.def_global_output
             """ *Filename for the output (%i=kicanvas, %x=html) """
@@ -238,6 +238,7 @@ class KiCost(BaseOutput):  # noqa: F821
     def __init__(self):
         super().__init__()
         self._sch_related = True
+        self._cacheable = False
         with document:
             self.options = KiCostOptions
             """ *[dict={}] Options for the `kicost` output """
@@ -404,6 +404,7 @@ class KiKit_Present(BaseOutput):
             self.options = KiKit_PresentOptions
             """ *[dict={}] Options for the `kikit_present` output """
         self._category = 'PCB/docs'
+        self._cacheable = False
 
     def get_navigate_targets(self, out_dir):
         return self.options.get_navigate_targets(out_dir), None
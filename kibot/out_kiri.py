@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-# Copyright (c) 2022-2024 Salvador E. Tropea
-# Copyright (c) 2022-2024 Instituto Nacional de Tecnología Industrial
+# Copyright (c) 2022-2025 Salvador E. Tropea
+# Copyright (c) 2022-2025 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 """
@@ -19,6 +19,7 @@ Dependencies:
     role: Compare schematics
     version: 2.2.0
 """
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import glob
 try:
@@ -27,7 +28,8 @@ try:
 except Exception:
     pass
 import os
-from shutil import copy2, rmtree
+from shutil import copy2, copytree, rmtree
+import threading
 from .error import KiPlotConfigurationError
 from .gs import GS
 from .kicad.color_theme import load_color_theme
@@ -71,6 +73,10 @@ class KiRiOptions(AnyDiffOptions):
                 Note that this can be a revision-range, consult the gitrevisions manual for more information """
             self.keep_generated = False
             """ *Avoid PCB and SCH images regeneration. Useful for incremental usage """
+            self.workers = 1
+            """ [0,1000] Number of commits rendered at the same time, each one in its own git worktree.
+                Use 0 for the number of CPUs. Note that each worker runs KiCad, so this also multiplies the
+                memory usage """
         super().__init__()
         self.add_to_doc("zones", "Be careful with the *keep_generated* option when changing this setting")
         self._kiri_mode = True
@@ -271,6 +277,99 @@ class KiRiOptions(AnyDiffOptions):
         pcb_dirty = self.git_dirty(GS.pcb_file)
         return hashes, sch_dirty, pcb_dirty, sch_files
 
+    def get_blobs(self, hash, files):
+        """ Git objects for the files in the commit, commits using the same objects generate the same images """
+        return self.run_git(['ls-tree', '-r', hash, '--']+files)
+
+    def plan_renders(self, hashes, sch_files):
+        """ Decide which commits must be rendered and which ones can reuse the images from another commit.
+            Returns the commits to render, with the parts to render, and the ones to copy from other commits """
+        common = [GS.pro_file] if GS.pro_file else []
+        pcb_files = [GS.pcb_file]+common
+        sch_files = sch_files+common
+        pcb_owners = {}
+        sch_owners = {}
+        renders = []
+        reuses = []
+        for h in hashes:
+            hash = h[0]
+            pcb_src = pcb_owners.setdefault(self.get_blobs(hash, pcb_files), hash)
+            sch_src = sch_owners.setdefault(self.get_blobs(hash, sch_files), hash)
+            dst_dir = os.path.join(self.cache_dir, hash[:7])
+            already_generated = os.path.isdir(dst_dir)
+            if self.keep_generated and already_generated:
+                logger.debug(f'- Images for {hash} already generated')
+                continue
+            if already_generated:
+                rmtree(dst_dir)
+            if pcb_src == hash or sch_src == hash:
+                renders.append((hash, pcb_src == hash, sch_src == hash))
+            if pcb_src != hash or sch_src != hash:
+                reuses.append((hash, None if pcb_src == hash else pcb_src, None if sch_src == hash else sch_src))
+        return renders, reuses
+
+    def render_commit(self, hash, do_pcb, do_sch):
+        # Git operations in the same repo can't be done at the same time
+        with self._git_lock:
+            git_tmp_wd = GS.mkdtemp('kiri-checkout')
+            logger.debug('Checking out '+hash+' to '+git_tmp_wd)
+            self.run_git(['worktree', 'add', '--detach', '--force', git_tmp_wd, hash])
+        try:
+            with self._git_lock:
+                self.run_git(['submodule', 'update', '--init', '--recursive'], cwd=git_tmp_wd)
+            # Generate SVGs for the schematic
+            if do_sch:
+                name_sch = self.do_cache(self.sch_rel_name, git_tmp_wd, hash)
+            # Generate SVGs for the PCB
+            if do_pcb:
+                self.do_cache(self.pcb_rel_name, git_tmp_wd, hash)
+                # List of layers
+                self.save_pcb_layers(hash)
+            # Schematic hierarchy
+            if do_sch:
+                # The schematic loader isn't thread safe
+                with self._sch_lock:
+                    self.save_sch_sheet(hash, name_sch)
+        finally:
+            with self._git_lock:
+                self.remove_git_worktree(git_tmp_wd)
+
+    def reuse_render(self, hash, pcb_src, sch_src):
+        """ Copy the images from a commit with the same PCB and/or SCH """
+        dst_dir = os.path.join(self.cache_dir, hash[:7], '_KIRI_')
+        os.makedirs(dst_dir, exist_ok=True)
+        for src, kind, index in ((pcb_src, 'pcb', 'pcb_layers'), (sch_src, 'sch', 'sch_sheets')):
+            if src is None:
+                continue
+            logger.debug(f'- Using the {kind.upper()} images from {src} for {hash}')
+            src_dir = os.path.join(self.cache_dir, src[:7], '_KIRI_')
+            if os.path.isdir(os.path.join(src_dir, kind)):
+                copytree(os.path.join(src_dir, kind), os.path.join(dst_dir, kind))
+            copy2(os.path.join(src_dir, index), os.path.join(dst_dir, index))
+
+    def render_commits(self, hashes, sch_files):
+        renders, reuses = self.plan_renders(hashes, sch_files)
+        self._git_lock = threading.Lock()
+        self._sch_lock = threading.Lock()
+        workers = min(self.workers or os.cpu_count() or 1, len(renders))
+        if workers > 1:
+            logger.debug(f'Rendering {len(renders)} commits using {workers} workers')
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self.render_commit, *r) for r in renders]
+                try:
+                    for f in futures:
+                        f.result()
+                except BaseException:
+                    # Don't start new renders
+                    for f in futures:
+                        f.cancel()
+                    raise
+        else:
+            for r in renders:
+                self.render_commit(*r)
+        for r in reuses:
+            self.reuse_render(*r)
+
     def run(self, name):
         self.init_tools(self._parent.output_dir)
         hashes, sch_dirty, pcb_dirty, sch_files = self.collect_hashes()
@@ -283,34 +382,7 @@ class KiRiOptions(AnyDiffOptions):
         self.create_layers_incl(self.layers)
         self.solve_layer_colors()
         try:
-            git_tmp_wd = None
-            try:
-                for h in hashes:
-                    hash = h[0]
-                    dst_dir = os.path.join(self.cache_dir, hash[:7])
-                    already_generated = os.path.isdir(dst_dir)
-                    if self.keep_generated and already_generated:
-                        logger.debug(f'- Images for {hash} already generated')
-                        continue
-                    if already_generated:
-                        rmtree(dst_dir)
-                    git_tmp_wd = GS.mkdtemp('kiri-checkout')
-                    logger.debug('Checking out '+hash+' to '+git_tmp_wd)
-                    self.run_git(['worktree', 'add', '--detach', '--force', git_tmp_wd, hash])
-                    self.run_git(['submodule', 'update', '--init', '--recursive'], cwd=git_tmp_wd)
-                    # Generate SVGs for the schematic
-                    name_sch = self.do_cache(self.sch_rel_name, git_tmp_wd, hash)
-                    # Generate SVGs for the PCB
-                    self.do_cache(self.pcb_rel_name, git_tmp_wd, hash)
-                    # List of layers
-                    self.save_pcb_layers(hash)
-                    # Schematic hierarchy
-                    self.save_sch_sheet(hash, name_sch)
-                    self.remove_git_worktree(git_tmp_wd)
-                    git_tmp_wd = None
-            finally:
-                if git_tmp_wd:
-                    self.remove_git_worktree(git_tmp_wd)
+            self.render_commits(hashes, sch_files)
             # Do we have modifications?
             if sch_dirty or pcb_dirty:
                 # Include the current files
@@ -355,6 +427,7 @@ class KiRi(BaseOutput):  # noqa: F821
         super().__init__()
         self._category = ['PCB/docs', 'Schematic/docs']
         self._both_related = True
+        self._cacheable = False
         with document:
             self.options = KiRiOptions
             """ *[dict={}] Options for the `diff` output """
@@ -493,3 +493,7 @@ class Navigate_Results(BaseOutput):  # noqa: F821
         # The help is inherited and already mentions the default priority
         self.fix_priority_help()
         self._any_related = True
+
+    def get_output_dependencies(self, names):
+        # We collect the results from all the other outputs
+        return set(names)-{self.name}
@@ -1728,6 +1728,10 @@ class Navigate_Results_RB(BaseOutput):  # noqa: F821
         self.fix_priority_help()
         self._any_related = True
 
+    def get_output_dependencies(self, names):
+        # We collect the results from all the other outputs
+        return set(names)-{self.name}
+
     @staticmethod
     def get_conf_examples(name, layers):
         outs = BaseOutput.simple_conf_examples(name, 'Web page to browse the results', 'Browse')  # noqa: F821
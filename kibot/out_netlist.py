@@ -71,6 +71,13 @@ class NetlistOptions(VariantOptions):
         cmd = ['kicad-cli', 'sch', 'export', 'netlist', '--format', format, '--output', name, sch_file]
         run_command(cmd)
 
+    def get_jobset_jobs(self, name):
+        """ Jobs used to generate the output using a KiCad jobset, None if not possible """
+        if not GS.ki9 or self.uses_filters() or self.format == 'ipc':
+            return None
+        format = 'kicadsexpr' if self.format == 'classic' else self.format
+        return [('sch_export_netlist', {'format': format}, name)]
+
     def run(self, name):
         if self.format == 'classic' and GS.ki8:
             self.run_cli(name, 'kicadsexpr')
@@ -5,7 +5,7 @@
 # Project: KiBot (formerly KiPlot)
 from .gs import GS
 from .out_base import VariantOptions
-from .misc import MISSING_TOOL, UNITS_2_KICAD
+from .misc import MISSING_TOOL, UNITS_2_KICAD, UNITS_2_JOBSET
 from .kiplot import run_command
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
@@ -55,6 +55,14 @@ class ODBOptions(VariantOptions):
                UNITS_2_KICAD[self.units], '--precision', str(int(self.precision)), board_name]
         run_command(cmd)
 
+    def get_jobset_jobs(self, name):
+        """ Jobs used to generate the output using a KiCad jobset, None if not possible """
+        if not GS.ki9 or self.uses_filters():
+            return None
+        settings = {'units': UNITS_2_JOBSET[self.units], 'precision': int(self.precision),
+                    'compression': self.compression}
+        return [('pcb_export_odb', settings, self.fix_dir_name(name))]
+
 
 @output_class
 class ODB(BaseOutput):  # noqa: F821
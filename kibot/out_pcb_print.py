@@ -36,6 +36,7 @@ import io
 import re
 import os
 import importlib
+import multiprocessing
 from pcbnew import B_Cu, B_Mask, F_Cu, F_Mask, FromMM, IsCopperLayer, LSET, PLOT_CONTROLLER, PLOT_FORMAT_SVG
 from shutil import rmtree, copy2
 import sys
@@ -64,6 +65,7 @@ from .kicad.pcb_draw_helpers import draw_drill_map
 from .pre_include_table import IncludeTableOptions, update_table
 from .layer import Layer, get_priority
 from .kiplot import run_command, load_board, get_all_components, look_for_output, get_output_targets, run_output
+from .scheduler import parallel_available
 from .svgutils.transform import ImageElement, GroupElement
 from . import __version__
 from . import log
@@ -78,6 +80,8 @@ GSPNERROR = re.compile(r'%\d*d[0-9a-fA-F]')
 # They are just helpers and we solve their dependencies
 svgutils = None  # Will be loaded during dependency check
 kicad_worksheet = None  # Also needs svgutils
+# Options of the output we are merging in parallel, the workers are forked, so they get it without pickling it
+merge_options = None
 
 
 @dataclass
@@ -88,6 +92,30 @@ class ImageGroup:
     items: list
 
 
+@dataclass
+class PlottedPage:
+    """ A page with all its layers already plotted, ready to be merged and converted """
+    page: object
+    base_dir: str
+    temp_dir: str
+    filelist: list
+    assembly_file: str
+    file: str
+    worksheet: object
+    images: list
+
+
+def _merge_page_worker(n):
+    """ Runs in the forked process, returns the error level and the warnings we found """
+    log_counters = log.get_warn_counters()
+    ret = 0
+    try:
+        merge_options.merge_page(merge_options._plotted_pages[n])
+    except SystemExit as e:
+        ret = e.code if isinstance(e.code, int) else 1
+    return ret, log.diff_warn_counters(log_counters)
+
+
 def pcbdraw_warnings(tag, msg):
     logger.warning('{}({}) {}'.format(W_PCBDRAW, tag, msg))
 
@@ -471,6 +499,10 @@ class PCB_PrintOptions(VariantOptions):
             self.drill = DrillOptions
             """ [boolean|dict=false] Use a boolean for simple cases or fine-tune its behavior.
                 Used to customize the `drill_pairs` option to print drill maps """
+            self.parallel_pages = 1
+            """ [0,1000] Number of pages merged and converted at the same time, using separated processes.
+                Use 0 for the number of CPUs and 1 to disable it. The layers are always plotted one by one.
+                Note that each output generated in parallel (`--jobs`) can start this number of processes """
         add_drill_marks(self)
         super().__init__()
         self._expand_id = 'assembly'
@@ -1042,8 +1074,9 @@ class PCB_PrintOptions(VariantOptions):
                 item[0].SetLayer(item[1])
         self._image_groups = []
 
-    def add_output_images(self, svg, page):
-        """ Look for groups named kibot_image_OUTPUT and paste images from the referred OUTPUTs """
+    def get_output_images(self, page):
+        """ Look for groups named kibot_image_OUTPUT and get the images from the referred OUTPUTs """
+        images = []
         # Check which layers we printed
         layers = {la._id for la in page._layers}
         # Look for groups
@@ -1080,7 +1113,13 @@ class PCB_PrintOptions(VariantOptions):
             except TypeError as e:
                 raise KiPlotConfigurationError(f'Error reading {fname} size: {e} for PCB group `{name}`')
             logger.debugl(2, f'- PNG: {w}x{h} {dpi} PPIs')
-            x1, y1, x2, y2 = g.bbox
+            images.append((s, g.bbox))
+        return images
+
+    def add_output_images(self, svg, images):
+        """ Paste the images from the kibot_image_OUTPUT groups """
+        for s, bbox in images:
+            x1, y1, x2, y2 = bbox
             logger.debugl(2, f'- Box: {x1},{y1} {x2},{y2} IUs')
             # Convert pixels to mm and then to KiCad units
             # w = GS.from_mm(w/dpi*25.4)
@@ -1097,7 +1136,7 @@ class PCB_PrintOptions(VariantOptions):
             #  Add the group to the SVG
             svg.append(g)
 
-    def merge_svg(self, input_folder, input_files, output_folder, output_file, p):
+    def merge_svg(self, input_folder, input_files, output_folder, output_file, p, images):
         """ Merge all layers into one page """
         first = True
         texts = []
@@ -1121,7 +1160,7 @@ class PCB_PrintOptions(VariantOptions):
                 first = False
                 self.process_background(svg_out, width, height)
                 self.add_frame_images(svg_out, p.monochrome)
-                self.add_output_images(svg_out, p)
+                self.add_output_images(svg_out, images)
             else:
                 root = new_layer.getroot()
                 # Adjust the coordinates of this section to the main width
@@ -1340,16 +1379,48 @@ class PCB_PrintOptions(VariantOptions):
                 _run_command(cmd)
 
     def create_pdf_from_svg_pages(self, input_folder, input_files, output_fn):
-        """ Convert individual SVG files into individual PDF files using 360 dpi.
-            Then join the individual PDF files into one PDF file scaled to the right page size. """
-        svg_files = []
-        for svg_file in input_files:
-            pdf_file = svg_file.replace('.svg', '.pdf')
-            logger.debug('- Creating {} from {}'.format(pdf_file, svg_file))
-            self.svg_to_pdf(input_folder, svg_file, pdf_file)
-            svg_files.append(os.path.join(input_folder, pdf_file))
-        logger.debug('- Joining {} into {} ({}x{})'.format(svg_files, output_fn, self.pcb.paper_w, self.pcb.paper_h))
-        create_pdf_from_pages(svg_files, output_fn, forced_width=self.pcb.paper_w)
+        """ Join the individual PDF files, already converted by `merge_page`, into one PDF file scaled to the right
+            page size. """
+        pdf_files = [os.path.join(input_folder, svg_file.replace('.svg', '.pdf')) for svg_file in input_files]
+        logger.debug('- Joining {} into {} ({}x{})'.format(pdf_files, output_fn, self.pcb.paper_w, self.pcb.paper_h))
+        create_pdf_from_pages(pdf_files, output_fn, forced_width=self.pcb.paper_w)
+
+    def merge_page(self, pp):
+        """ Stack all the layers of a page in one file and convert it to PDF.
+            Doesn't use the PCB, so we can do it in parallel """
+        self.last_worksheet = pp.worksheet
+        logger.debug('- Merging layers to {}'.format(pp.assembly_file))
+        self.merge_svg(pp.temp_dir, pp.filelist, pp.temp_dir, pp.assembly_file, pp.page, pp.images)
+        if self.format != 'SVG':
+            # Convert individual SVG files into individual PDF files using 360 dpi.
+            pdf_file = pp.file.replace('.svg', '.pdf')
+            logger.debug('- Creating {} from {}'.format(pdf_file, pp.file))
+            self.svg_to_pdf(pp.base_dir, pp.file, pdf_file)
+
+    def merge_pages(self, pages):
+        """ Merge and convert the pages, using a pool of processes when possible """
+        jobs = self.parallel_pages or os.cpu_count() or 1
+        jobs = min(jobs, len(pages))
+        if jobs < 2 or not parallel_available():
+            for pp in pages:
+                self.merge_page(pp)
+            return
+        logger.debug(f'- Merging {len(pages)} pages using {jobs} processes')
+        global merge_options
+        merge_options = self
+        self._plotted_pages = pages
+        try:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                # map keeps the order, so the join is deterministic
+                results = pool.map(_merge_page_worker, range(len(pages)))
+        finally:
+            merge_options = None
+            self._plotted_pages = None
+        for ret, counters in results:
+            log.add_warn_counters(counters)
+        errors = [ret for ret, _ in results if ret]
+        if errors:
+            GS.exit_with_error(None, errors[0])
 
     def check_tools(self):
         if self.format != 'SVG':
@@ -1604,15 +1675,15 @@ class PCB_PrintOptions(VariantOptions):
                     else:
                         self.plot_frame_internal(pc, po, p, len(pages)+1, len(self._pages))
                 filelist.append((GS.pcb_basename+"-frame.svg", color))
-            # 3) Stack all layers in one file
+            # 3) Collect what we need to stack all layers in one file, done later for all the pages
             if self.format == 'SVG':
                 id, ext = self.get_id_and_ext(n, p.page_id)
                 assembly_file = self.expand_filename(output_dir, self.output, id, ext)
             else:
                 assembly_file = GS.pcb_basename+".svg"
-            logger.debug('- Merging layers to {}'.format(assembly_file))
-            self.merge_svg(temp_dir, filelist, temp_dir, assembly_file, p)
-            pages.append(os.path.join(page_str, assembly_file))
+            worksheet = self.last_worksheet if self.plot_sheet_reference and self.frame_plot_mechanism == 'internal' else None
+            pages.append(PlottedPage(p, temp_dir_base, temp_dir, filelist, assembly_file,
+                                     os.path.join(page_str, assembly_file), worksheet, self.get_output_images(p)))
             self.restore_title()
             # If we forced a refill and the user doesn't want it just reload the PCB
             if re_filled_zones and not BasePreFlight.get_option('check_zone_fills'):
@@ -1626,6 +1697,9 @@ class PCB_PrintOptions(VariantOptions):
                     # Make visible only the layers we need
                     self.set_visible(edge_id)
 
+        # Stack the layers of each page and convert them to PDF
+        self.merge_pages(pages)
+        pages = [pp.file for pp in pages]
         # Join all pages in one file
         if self.format != 'SVG':
             if self.format == 'PDF':
@@ -8,6 +8,7 @@
 import os
 from re import compile
 from datetime import datetime
+from .fp_snapshot import get_fp_snapshot
 from .gs import GS
 from .kiplot import run_command
 from .misc import UI_SMD, UI_VIRTUAL, MOD_THROUGH_HOLE, MOD_SMD, MOD_EXCLUDE_FROM_POS_FILES
@@ -115,20 +116,33 @@ class PositionOptions(VariantOptions):
         self._columns = new_columns
         self._expand_ext = 'pos' if self.format == 'ASCII' else self.format.lower()
 
-    def _do_position_plot_ascii(self, output_dir, columns, modulesStr, maxSizes, modules_side):
+    def _open_files(self, output_dir, ext):
         topf = None
         botf = None
         bothf = None
         if self.separate_files_for_front_and_back:
-            topf_name = self.expand_filename(output_dir, self.output, 'top_pos', 'pos')
-            botf_name = self.expand_filename(output_dir, self.output, 'bottom_pos', 'pos')
+            topf_name = self.expand_filename(output_dir, self.output, 'top_pos', ext)
+            botf_name = self.expand_filename(output_dir, self.output, 'bottom_pos', ext)
             check_names(topf_name, botf_name)
             topf = open(topf_name, 'w')
             botf = open(botf_name, 'w')
         else:
-            fname = self.expand_filename(output_dir, self.output, 'both_pos', 'pos')
-            bothf = open(fname, 'w')
+            bothf = open(self.expand_filename(output_dir, self.output, 'both_pos', ext), 'w')
+        return topf, botf, bothf
+
+    def _do_position_plot_ascii(self, output_dir, columns, cells, rows):
+        # The width of the columns is needed before writing the first row
+        cells = [c.format for c in cells]
+        maxSizes = [len(c) for c in columns]
+        modulesStr = []
+        modules_side = []
+        for args, is_bottom in rows:
+            m = [c(*args) for c in cells]
+            maxSizes = list(map(max, maxSizes, map(len, m)))
+            modulesStr.append(m)
+            modules_side.append(is_bottom)
 
+        topf, botf, bothf = self._open_files(output_dir, 'pos')
         files = [f for f in [topf, botf, bothf] if f is not None]
         for f in files:
             f.write('### Module positions - created on {} ###\n'.format(datetime.now().strftime("%a %d %b %Y %X %Z")))
@@ -143,81 +157,70 @@ class PositionOptions(VariantOptions):
         if bothf is not None:
             bothf.write('## Side : both\n')
 
+        header = '# '+'   '.join('{{:<{}}}'.format(w) for w in maxSizes)+'\n'
         for f in files:
-            f.write('# ')
-            for idx, col in enumerate(columns):
-                if idx > 0:
-                    f.write("   ")
-                f.write("{0: <{width}}".format(col, width=maxSizes[idx]))
-            f.write('\n')
+            f.write(header.format(*columns))
 
         # Account for the "# " at the start of the comment column
         maxSizes[0] = maxSizes[0] + 2
+        line = '   '.join('{{:<{}}}'.format(w) for w in maxSizes)+'\n'
 
         for (m, is_bottom) in zip(modulesStr, modules_side):
             file = bothf if bothf is not None else (botf if is_bottom else topf)
-            for idx, col in enumerate(m):
-                if idx > 0:
-                    file.write("   ")
-                file.write("{0: <{width}}".format(col, width=maxSizes[idx]))
-            file.write("\n")
+            file.write(line.format(*m))
 
         for f in files:
             f.write("## End\n")
 
-        if topf is not None:
-            topf.close()
-        if botf is not None:
-            botf.close()
-        if bothf is not None:
-            bothf.close()
-
-    def _do_position_plot_csv(self, output_dir, columns, modulesStr, modules_side):
-        topf = None
-        botf = None
-        bothf = None
-        if self.separate_files_for_front_and_back:
-            topf_name = self.expand_filename(output_dir, self.output, 'top_pos', 'csv')
-            botf_name = self.expand_filename(output_dir, self.output, 'bottom_pos', 'csv')
-            check_names(topf_name, botf_name)
-            topf = open(topf_name, 'w')
-            botf = open(botf_name, 'w')
-        else:
-            bothf = open(self.expand_filename(output_dir, self.output, 'both_pos', 'csv'), 'w')
+        for f in files:
+            f.close()
 
+    def _do_position_plot_csv(self, output_dir, columns, cells, rows):
+        topf, botf, bothf = self._open_files(output_dir, 'csv')
         files = [f for f in [topf, botf, bothf] if f is not None]
 
         for f in files:
             f.write(",".join(columns))
             f.write("\n")
 
-        for (m, is_bottom) in zip(modulesStr, modules_side):
+        # The rows are written as soon as we get them
+        line = ",".join(cells)+"\n"
+        for args, is_bottom in rows:
             file = bothf if bothf is not None else (botf if is_bottom else topf)
-            file.write(",".join('{}'.format(e) for e in m))
-            file.write("\n")
+            file.write(line.format(*args))
 
-        if topf is not None:
-            topf.close()
-        if botf is not None:
-            botf.close()
-        if bothf is not None:
-            bothf.close()
+        for f in files:
+            f.close()
+
+    def compile_cells(self):
+        """ Format string for each column. They use the values from `get_rows` """
+        quote_char = '"' if self.format == 'CSV' else ''
+        quote_char_extra = quote_char if self.quote_all else ''
+        float_format = ':.{}f'.format(self.right_digits) if self.right_digits != 0 else ''
+        formats = {'Ref': quote_char+'{0}'+quote_char,
+                   'Val': quote_char+'{1}'+quote_char,
+                   'Package': quote_char+'{2}'+quote_char,
+                   'PosX': quote_char_extra+'{3'+float_format+'}'+quote_char_extra,
+                   'PosY': quote_char_extra+'{4'+float_format+'}'+quote_char_extra,
+                   'Rot': quote_char_extra+'{5'+float_format+'}'+quote_char_extra,
+                   'Side': quote_char_extra+'{6}'+quote_char_extra}
+        return [formats[col.id] for col in self._columns]
 
     @staticmethod
-    def is_pure_smd_5(m):
-        return m.GetAttributes() == UI_SMD
+    def is_pure_smd_5(attrs):
+        return attrs == UI_SMD
 
     @staticmethod
-    def is_pure_smd_6(m):
-        return m.GetAttributes() & (MOD_THROUGH_HOLE | MOD_SMD | MOD_EXCLUDE_FROM_POS_FILES) == MOD_SMD
+    def is_pure_smd_6(attrs):
+        return attrs & (MOD_THROUGH_HOLE | MOD_SMD | MOD_EXCLUDE_FROM_POS_FILES) == MOD_SMD
 
     @staticmethod
-    def is_not_virtual_5(m):
-        return m.GetAttributes() != UI_VIRTUAL
+    def is_not_virtual_5(attrs):
+        return attrs != UI_VIRTUAL
 
     @staticmethod
-    def is_not_virtual_6(m):
-        return not (m.GetAttributes() & MOD_EXCLUDE_FROM_POS_FILES)
+    def is_not_virtual_6(attrs):
+        return not (attrs & MOD_EXCLUDE_FROM_POS_FILES)
 
     @staticmethod
     def get_attr_tests():
@@ -250,30 +253,36 @@ class PositionOptions(VariantOptions):
         fname = self.expand_filename(output_dir, self.output, 'bottom_pos', self._expand_ext)
         run_command(cmd_base+['back', '-o', fname, pcb_name])
 
-    def run(self, fname):
-        super().run(fname)
-        output_dir = os.path.dirname(fname)
-        if self.format == 'GBR':
-            self.run_gerber(output_dir)
-            return
-        self.filter_pcb_components()
-        columns = tuple(o.name for o in self._columns)
+    def get_jobset_jobs(self, name):
+        """ Jobs used to generate the output using a KiCad jobset, None if not possible """
+        if not GS.ki9 or self.format != 'GBR' or self.uses_filters():
+            return None
+        output_dir = os.path.dirname(name)
+        jobs = []
+        for side, id in (('front', 'top_pos'), ('back', 'bottom_pos')):
+            settings = {'format': 'gerber', 'side': side, 'use_drill_place_file_origin': self.use_aux_axis_as_origin,
+                        'gerber_board_edge': self.gerber_board_edge}
+            jobs.append(('pcb_export_pos', settings, self.expand_filename(output_dir, self.output, id, self._expand_ext)))
+        return jobs
+
+    def get_rows(self):
+        """ Generates the data for each row: (ref, value, footprint, pos_x, pos_y, rotation, side), is_bottom """
         conv = GS.unit_name_to_scale_factor(self.units)
-        # Format all strings
         comps_hash = self.get_refs_hash_multi()
-        modules = []
-        modules_side = []
         is_pure_smd, is_not_virtual = self.get_attr_tests()
-        quote_char = '"' if self.format == 'CSV' else ''
-        quote_char_extra = quote_char if self.quote_all else ''
         x_origin = 0.0
         y_origin = 0.0
         if self.use_aux_axis_as_origin:
             (x_origin, y_origin) = GS.get_aux_origin()
             logger.debug('Using auxiliary origin: x={} y={}'.format(x_origin, y_origin))
-        for m in sorted(GS.get_modules(), key=lambda c: _ref_key(c.GetReference())):
-            ref = m.GetReference()
-            logger.debug('P&P ref: {}'.format(ref))
+        negative_x = self.bottom_negative_x
+        # Avoid formatting the debug messages for each footprint
+        debug = GS.debug_enabled
+        fps = get_fp_snapshot()
+        for i in sorted(range(len(fps)), key=lambda i: _ref_key(fps.refs[i])):
+            ref = fps.refs[i]
+            if debug:
+                logger.debug('P&P ref: {}'.format(ref))
             value = None
             # Apply any filter or variant data
             if comps_hash:
@@ -281,7 +290,8 @@ class PositionOptions(VariantOptions):
                 if c:
                     # Multiple components with the same reference is "normal" for a panel
                     c = c.pop()
-                    logger.debug('- fit: {} include: {}'.format(c.fitted, c.included))
+                    if debug:
+                        logger.debug('- fit: {} include: {}'.format(c.fitted, c.included))
                     if not c.fitted or not c.included:
                         continue
                     value = c.value
@@ -289,66 +299,46 @@ class PositionOptions(VariantOptions):
                     is_bottom = c.bottom
                     rotation = c.footprint_rot
                     # Here we can't use c.footprint_x/y because this doesn't work for panels
-                    center = GS.get_center(m)
-                    center_x = center.x
-                    center_y = center.y
+                    center_x = fps.x[i]
+                    center_y = fps.y[i]
                     if c.pos_offset_x is not None:
                         # Offset from the rotation filter
                         # logger.error(f"{center_x},{center_y} -> {center_x+c.pos_offset_x},{center_y+c.pos_offset_y}")
                         center_x += c.pos_offset_x
                         center_y += c.pos_offset_y
             if value is None:
-                value = m.GetValue()
-                footprint = str(m.GetFPID().GetLibItemName())  # pcbnew.UTF8 type
-                is_bottom = m.IsFlipped()
-                rotation = m.GetOrientationDegrees()
-                center = GS.get_center(m)
-                center_x = center.x
-                center_y = center.y
+                value = fps.values[i]
+                footprint = fps.fp_names[i]
+                is_bottom = fps.bottom[i]
+                rotation = fps.rotations[i]
+                center_x = fps.x[i]
+                center_y = fps.y[i]
             # If passed check the position options
-            if (self.only_smd and is_pure_smd(m)) or (not self.only_smd and (is_not_virtual(m) or self.include_virtual)):
+            attrs = fps.attrs[i]
+            if ((self.only_smd and is_pure_smd(attrs)) or
+               (not self.only_smd and (is_not_virtual(attrs) or self.include_virtual))):
                 # KiCad: PLACE_FILE_EXPORTER::GenPositionData() in export_footprints_placefile.cpp
-                row = []
-                if self.right_digits != 0:
-                    float_format = "{{:.{}f}}".format(self.right_digits)
-                else:
-                    float_format = "{}"
-                for col in self._columns:
-                    k = col.id
-                    if k == 'Ref':
-                        row.append(quote_char+ref+quote_char)
-                    elif k == 'Val':
-                        row.append(quote_char+value+quote_char)
-                    elif k == 'Package':
-                        row.append(quote_char+footprint+quote_char)
-                    elif k == 'PosX':
-                        pos_x = (center_x - x_origin) * conv
-                        if self.bottom_negative_x and is_bottom:
-                            pos_x = -pos_x
-                        row.append(quote_char_extra+float_format.format(pos_x, rd=self.right_digits)+quote_char_extra)
-                    elif k == 'PosY':
-                        row.append(quote_char_extra+float_format.format(-(center_y - y_origin) * conv, rd=self.right_digits) +
-                                   quote_char_extra)
-                    elif k == 'Rot':
-                        row.append(quote_char_extra+float_format.format(rotation, rd=self.right_digits)+quote_char_extra)
-                    elif k == 'Side':
-                        row.append(quote_char_extra+("bottom" if is_bottom else "top")+quote_char_extra)
-                modules.append(row)
-                modules_side.append(is_bottom)
-            else:
-                logger.debug('- pure_smd: {} not_virtual {}'.format(is_pure_smd(m), is_not_virtual(m)))
-        # Find max width for all columns
-        maxlengths = []
-        for col, name in enumerate(columns):
-            max_l = len(name)
-            for row in modules:
-                max_l = max(max_l, len(row[col]))
-            maxlengths.append(max_l)
+                pos_x = (center_x - x_origin) * conv
+                if negative_x and is_bottom:
+                    pos_x = -pos_x
+                pos_y = -(center_y - y_origin) * conv
+                yield (ref, value, footprint, pos_x, pos_y, rotation, "bottom" if is_bottom else "top"), is_bottom
+            elif debug:
+                logger.debug('- pure_smd: {} not_virtual {}'.format(is_pure_smd(attrs), is_not_virtual(attrs)))
+
+    def run(self, fname):
+        super().run(fname)
+        output_dir = os.path.dirname(fname)
+        if self.format == 'GBR':
+            self.run_gerber(output_dir)
+            return
+        self.filter_pcb_components()
+        columns = tuple(o.name for o in self._columns)
         # Note: the parser already checked the format is ASCII or CSV
         if self.format == 'ASCII':
-            self._do_position_plot_ascii(output_dir, columns, modules, maxlengths, modules_side)
+            self._do_position_plot_ascii(output_dir, columns, self.compile_cells(), self.get_rows())
         else:  # if self.format == 'CSV':
-            self._do_position_plot_csv(output_dir, columns, modules, modules_side)
+            self._do_position_plot_csv(output_dir, columns, self.compile_cells(), self.get_rows())
         self.unfilter_pcb_components()
 
 
@@ -14,6 +14,12 @@ Dependencies:
     extra_deb: ['texlive', 'texlive-latex-base', 'texlive-latex-recommended']
     extra_arch: ['texlive-core']
     comments: 'In CI/CD environments: the `kicad_auto_test` docker image contains it.'
+  - name: numpy
+    python_module: true
+    debian: python3-numpy
+    arch: python-numpy
+    downloader: python
+    role: Faster statistics for big boards
 """
 import math
 import os
@@ -21,6 +27,7 @@ import re
 import pcbnew
 
 from .gs import GS
+from .fp_snapshot import FootprintSnapshot, get_fp_snapshot
 from .misc import (UI_SMD, UI_VIRTUAL, MOD_THROUGH_HOLE, MOD_SMD, MOD_EXCLUDE_FROM_POS_FILES, W_WRONGEXT, W_UNKPADSH,
                    W_WRONGOAR, W_ECCLASST, VIATYPE_THROUGH, VIATYPE_BLIND_BURIED, VIATYPE_MICROVIA, W_BLINDVIAS, W_MICROVIAS)
 from .registrable import RegOutput
@@ -38,6 +45,8 @@ INF = float('inf')
 EC_SMALL_OAR = GS.from_mm(0.125)
 # The minimum drill tool
 EC_MIN_DRILL = GS.from_mm(0.1)
+# Boards with less tracks, vias and drilled pads are faster without NumPy
+NUMPY_MIN_ITEMS = 5000
 YES_NO = ['no', 'yes']
 
 
@@ -174,6 +183,25 @@ def adjust_drill(val, is_pth=True, pad=None):
     return res
 
 
+def adjust_drill_np(np, val, extra):
+    """ Vectorized version of adjust_drill, `extra` is the amount added to the holes (0 for NPTH) """
+    step = GS.from_mm(GS.global_drill_size_increment)
+    val = val+extra
+    return np.trunc((val+step/2)/step).astype(np.int64)*step
+
+
+def add_counts(np, counts, values):
+    """ Adds the occurrences of each element in `values` to the `counts` dict.
+        The elements can be scalars or rows (used as tuples) """
+    if not len(values):
+        return
+    keys, n = np.unique(values, axis=0, return_counts=True)
+    for k, c in zip(keys.tolist(), n.tolist()):
+        if isinstance(k, list):
+            k = tuple(k)
+        counts[k] = counts.get(k, 0) + c
+
+
 def list_nice(names):
     if len(names) == 1:
         return '`{}`'.format(names[0])
@@ -537,20 +565,20 @@ class ReportOptions(VariantOptions):
         return self._context_individual_images(line, self._schematic_svgs)
 
     @staticmethod
-    def is_pure_smd_5(m):
-        return m.GetAttributes() == UI_SMD
+    def is_pure_smd_5(attrs):
+        return attrs == UI_SMD
 
     @staticmethod
-    def is_pure_smd_6(m):
-        return m.GetAttributes() & (MOD_THROUGH_HOLE | MOD_SMD) == MOD_SMD
+    def is_pure_smd_6(attrs):
+        return attrs & (MOD_THROUGH_HOLE | MOD_SMD) == MOD_SMD
 
     @staticmethod
-    def is_not_virtual_5(m):
-        return m.GetAttributes() != UI_VIRTUAL
+    def is_not_virtual_5(attrs):
+        return attrs != UI_VIRTUAL
 
     @staticmethod
-    def is_not_virtual_6(m):
-        return not (m.GetAttributes() & MOD_EXCLUDE_FROM_POS_FILES)
+    def is_not_virtual_6(attrs):
+        return not (attrs & MOD_EXCLUDE_FROM_POS_FILES)
 
     def get_attr_tests(self):
         if GS.ki5:
@@ -579,9 +607,22 @@ class ReportOptions(VariantOptions):
             hole_ec = hole
         return oar, oar_ec, hole_ec
 
-    def analyze_oar(self, oar_t, oar_ec_t, is_pth, min_oar, pad, dr_x_real, dr_y_real, pad_sz, dr):
+    def compute_oar_np(self, np, pad, hole):
+        """ Vectorized version of compute_oar """
+        oar = (pad-hole)/2
+        small = (oar < EC_SMALL_OAR) & (oar > 0) & (hole < GS.from_mm(self.eurocircuits_reduce_holes))
+        hole_ec = np.where(small, np.maximum(adjust_drill_np(np, pad-2*EC_SMALL_OAR, 0), EC_MIN_DRILL), hole)
+        oar_ec = np.where(small, (pad-hole_ec)/2, oar)
+        if GS.debug_level > 2:
+            for i in np.flatnonzero(small):
+                logger.debug('Adjusting drill from {} to {} to get an OAR of {}'.
+                             format(to_mm(int(hole[i])), to_mm(int(hole_ec[i])), to_mm(float(oar_ec[i]))))
+        return oar, oar_ec, hole_ec
+
+    def analyze_oar(self, oar_t, oar_ec_t, is_pth, min_oar, pad, dr_x_real, dr_y_real, same_size):
         """ Check the computed OAR and choose if we use it or not.
-            Inform anomalies to the user. """
+            Inform anomalies to the user.
+            `same_size` means the pad and the drill have the same size """
         if oar_t > 0:
             if is_pth:
                 # For plated holes we always use it and report anomalies
@@ -590,21 +631,163 @@ class ReportOptions(VariantOptions):
                 if oar_t < min_oar:
                     logger.warning(W_WRONGOAR+"Really small OAR detected ({} mm) for pad {} using drill tool ({}, {})".
                                    format(to_mm(oar_t, 4), get_pad_info(pad), to_mm(dr_x_real), to_mm(dr_y_real)))
-                    if pad_sz == dr:
+                    if same_size:
                         logger.warning(W_WRONGOAR+"Try adjusting the drill size to an available drill tool")
             else:
-                # For non plated holes KiCad doesn't even create a pad if pad_sz == dr
-                if pad_sz != dr:
+                # For non plated holes KiCad doesn't even create a pad if the sizes are the same
+                if not same_size:
                     self.oar_pads = min(self.oar_pads, oar_t)
                     self.oar_pads_ec = min(self.oar_pads_ec, oar_ec_t)
         elif oar_t < 0:
             # The negative value can be a result of converting the drill size to a real drill size
             # So we inform it only if the pad and drill are different
-            if pad_sz != dr and is_pth:
+            if not same_size and is_pth:
                 logger.warning(W_WRONGOAR+"Negative OAR detected for pad "+get_pad_info(pad))
         elif oar_t == 0 and is_pth:
             logger.warning(W_WRONGOAR+"Plated pad without copper "+get_pad_info(pad))
 
+    def get_numpy(self, items):
+        """ The NumPy module, only for boards big enough to get a benefit """
+        if items < NUMPY_MIN_ITEMS:
+            return None
+        return self.check_tool('numpy')
+
+    def track_stats_py(self, track_widths, via_drills, via_widths):
+        """ Tracks and vias stats, using a loop """
+        for w in track_widths:
+            self.track = min(w, self.track)
+            self._tracks_m[w] = self._tracks_m.get(w, 0) + 1
+        for via_id in zip(via_drills, via_widths):
+            self._vias[via_id] = self._vias.get(via_id, 0) + 1
+            d = adjust_drill(via_id[0])
+            oar, oar_ec, d_ec = self.compute_oar(via_id[1], d)
+            via_id_ec = (d_ec, via_id[1])
+            self._vias_ec[via_id_ec] = self._vias_ec.get(via_id_ec, 0) + 1
+            self.oar_vias = min(self.oar_vias, oar)
+            self.oar_vias_ec = min(self.oar_vias_ec, oar_ec)
+            self._drills_real[d] = self._drills_real.get(d, 0) + 1
+            self._drills_ec[d_ec] = self._drills_ec.get(d_ec, 0) + 1
+
+    def track_stats_np(self, np, track_widths, via_drills, via_widths):
+        """ Tracks and vias stats, using NumPy arrays """
+        if track_widths:
+            widths = np.array(track_widths, dtype=np.int64)
+            self.track = int(widths.min())
+            add_counts(np, self._tracks_m, widths)
+        if not via_drills:
+            return
+        drills = np.array(via_drills, dtype=np.int64)
+        widths = np.array(via_widths, dtype=np.int64)
+        add_counts(np, self._vias, np.stack((drills, widths), axis=1))
+        d = adjust_drill_np(np, drills, GS.from_mm(GS.global_extra_pth_drill))
+        oar, oar_ec, d_ec = self.compute_oar_np(np, widths, d)
+        add_counts(np, self._vias_ec, np.stack((d_ec, widths), axis=1))
+        self.oar_vias = float(oar.min())
+        self.oar_vias_ec = float(oar_ec.min())
+        add_counts(np, self._drills_real, d)
+        add_counts(np, self._drills_ec, d_ec)
+
+    def pad_stats_py(self, pads, drill_x, drill_y, pads_pth, size_x, size_y, min_oar):
+        """ Drilled pads stats, using a loop """
+        for pad, dr_x, dr_y, is_pth, pad_sz_x, pad_sz_y in zip(pads, drill_x, drill_y, pads_pth, size_x, size_y):
+            self.pad_drill = min(dr_x, self.pad_drill)
+            self.pad_drill = min(dr_y, self.pad_drill)
+            # Compute the drill size to get it after plating
+            if is_pth:
+                self.pad_drill_pth = min(dr_x, self.pad_drill_pth)
+                self.pad_drill_pth = min(dr_y, self.pad_drill_pth)
+            else:
+                self.pad_drill_npth = min(dr_x, self.pad_drill_npth)
+                self.pad_drill_npth = min(dr_y, self.pad_drill_npth)
+
+            dr_x_real = adjust_drill(dr_x, is_pth, pad)
+            dr_y_real = adjust_drill(dr_y, is_pth, pad)
+            self.pad_drill_real = min(dr_x_real, self.pad_drill_real)
+            self.pad_drill_real = min(dr_y_real, self.pad_drill_real)
+
+            if is_pth:
+                self.pad_drill_pth_real = min(dr_x_real, self.pad_drill_pth_real)
+                self.pad_drill_pth_real = min(dr_y_real, self.pad_drill_pth_real)
+            else:
+                self.pad_drill_npth_real = min(dr_x_real, self.pad_drill_npth_real)
+                self.pad_drill_npth_real = min(dr_y_real, self.pad_drill_npth_real)
+
+            if dr_x == dr_y:
+                self._drills[dr_x] = self._drills.get(dr_x, 0) + 1
+                self._drills_real[dr_x_real] = self._drills_real.get(dr_x_real, 0) + 1
+            else:
+                if dr_x < dr_y:
+                    m = (dr_x, dr_y)
+                    d_r = dr_x_real
+                else:
+                    m = (dr_y, dr_x)
+                    d_r = dr_y_real
+                self._drills_oval[m] = self._drills_oval.get(m, 0) + 1
+                self.slot = min(self.slot, m[0])
+                self._drills_real[d_r] = self._drills_real.get(d_r, 0) + 1
+            oar_x, oar_ec_x, dr_x_ec = self.compute_oar(pad_sz_x, dr_x_real)
+            oar_y, oar_ec_y, dr_y_ec = self.compute_oar(pad_sz_y, dr_y_real)
+            dr_ec = min(dr_x_ec, dr_y_ec)
+            self._drills_ec[dr_ec] = self._drills_ec.get(dr_ec, 0) + 1
+            self.pad_drill_real_ec = min(dr_ec, self.pad_drill_real_ec)
+            oar_t = min(oar_x, oar_y)
+            oar_ec_t = min(oar_ec_x, oar_ec_y)
+            same_size = pad_sz_x == dr_x and pad_sz_y == dr_y
+            self.analyze_oar(oar_t, oar_ec_t, is_pth, min_oar, pad, dr_x_real, dr_y_real, same_size)
+
+    def pad_stats_np(self, np, pads, drill_x, drill_y, pads_pth, size_x, size_y, min_oar):
+        """ Drilled pads stats, using NumPy arrays """
+        if not pads:
+            return
+        dr_x = np.array(drill_x, dtype=np.int64)
+        dr_y = np.array(drill_y, dtype=np.int64)
+        is_pth = np.array(pads_pth, dtype=bool)
+        pad_sz_x = np.array(size_x, dtype=np.int64)
+        pad_sz_y = np.array(size_y, dtype=np.int64)
+        dr_min = np.minimum(dr_x, dr_y)
+        dr_max = np.maximum(dr_x, dr_y)
+        self.pad_drill = int(dr_min.min())
+        if is_pth.any():
+            self.pad_drill_pth = int(dr_min[is_pth].min())
+        if not is_pth.all():
+            self.pad_drill_npth = int(dr_min[~is_pth].min())
+        # Compute the drill size to get it after plating
+        extra = np.where(is_pth, GS.from_mm(GS.global_extra_pth_drill), 0)
+        dr_x_real = adjust_drill_np(np, dr_x, extra)
+        dr_y_real = adjust_drill_np(np, dr_y, extra)
+        # adjust_drill keeps the order, so this is the real size for the smaller side
+        dr_min_real = np.minimum(dr_x_real, dr_y_real)
+        self.pad_drill_real = int(dr_min_real.min())
+        if is_pth.any():
+            self.pad_drill_pth_real = int(dr_min_real[is_pth].min())
+        if not is_pth.all():
+            self.pad_drill_npth_real = int(dr_min_real[~is_pth].min())
+        round_holes = dr_x == dr_y
+        add_counts(np, self._drills, dr_x[round_holes])
+        add_counts(np, self._drills_real, dr_min_real)
+        oval_holes = ~round_holes
+        if oval_holes.any():
+            add_counts(np, self._drills_oval, np.stack((dr_min[oval_holes], dr_max[oval_holes]), axis=1))
+            self.slot = min(self.slot, int(dr_min[oval_holes].min()))
+        oar_x, oar_ec_x, dr_x_ec = self.compute_oar_np(np, pad_sz_x, dr_x_real)
+        oar_y, oar_ec_y, dr_y_ec = self.compute_oar_np(np, pad_sz_y, dr_y_real)
+        dr_ec = np.minimum(dr_x_ec, dr_y_ec)
+        add_counts(np, self._drills_ec, dr_ec)
+        self.pad_drill_real_ec = int(dr_ec.min())
+        oar_t = np.minimum(oar_x, oar_y)
+        oar_ec_t = np.minimum(oar_ec_x, oar_ec_y)
+        same_size = (pad_sz_x == dr_x) & (pad_sz_y == dr_y)
+        # The OARs used by analyze_oar
+        used = (oar_t > 0) & (is_pth | ~same_size)
+        if used.any():
+            self.oar_pads = min(self.oar_pads, float(oar_t[used].min()))
+            self.oar_pads_ec = min(self.oar_pads_ec, float(oar_ec_t[used].min()))
+        # Anomalies reported by analyze_oar, in the same order
+        wrong = is_pth & (((oar_t > 0) & (oar_t < min_oar)) | ((oar_t < 0) & ~same_size) | (oar_t == 0))
+        for i in np.flatnonzero(wrong):
+            self.analyze_oar(float(oar_t[i]), float(oar_ec_t[i]), True, min_oar, pads[i], int(dr_x_real[i]),
+                             int(dr_y_real[i]), bool(same_size[i]))
+
     def collect_data(self, board):
         ds = board.GetDesignSettings()
         self.extra_pth_drill = GS.from_mm(GS.global_extra_pth_drill)
@@ -656,38 +839,28 @@ class ReportOptions(VariantOptions):
         self._drills_ec = {}
         track_type = 'TRACK' if GS.ki5 else 'PCB_TRACK'
         via_type = 'VIA' if GS.ki5 else 'PCB_VIA'
-        self.thru_vias_count = self.blind_vias_count = self.micro_vias_count = self.vias_count = 0
+        track_widths = []
+        via_drills = []
+        via_widths = []
+        via_types = []
         for t in tracks:
             tclass = t.GetClass()
             if tclass == track_type:
-                w = t.GetWidth()
-                self.track = min(w, self.track)
-                self._tracks_m[w] = self._tracks_m.get(w, 0) + 1
+                track_widths.append(t.GetWidth())
             elif tclass == via_type:
                 via = t.Cast()
-                via_id = (via.GetDrill(), get_via_width(via))
-                self._vias[via_id] = self._vias.get(via_id, 0) + 1
-                d = adjust_drill(via_id[0])
-                oar, oar_ec, d_ec = self.compute_oar(via_id[1], d)
-                via_id_ec = (d_ec, via_id[1])
-                self._vias_ec[via_id_ec] = self._vias.get(via_id_ec, 0) + 1
-                self.oar_vias = min(self.oar_vias, oar)
-                self.oar_vias_ec = min(self.oar_vias_ec, oar_ec)
-                self._drills_real[d] = self._drills_real.get(d, 0) + 1
-                self._drills_ec[d_ec] = self._drills_ec.get(d_ec, 0) + 1
-                self.vias_count += 1
-                via_t = via.GetViaType()
-                if via_t == VIATYPE_THROUGH:
-                    self.thru_vias_count += 1
-                elif via_t == VIATYPE_BLIND_BURIED:
-                    self.blind_vias_count += 1
-                elif via_t == VIATYPE_MICROVIA:
-                    self.micro_vias_count += 1
-        self.track_min = min(self.track_d, self.track)
+                via_drills.append(via.GetDrill())
+                via_widths.append(get_via_width(via))
+                via_types.append(via.GetViaType())
+        self.vias_count = len(via_types)
+        self.thru_vias_count = via_types.count(VIATYPE_THROUGH)
+        self.blind_vias_count = via_types.count(VIATYPE_BLIND_BURIED)
+        self.micro_vias_count = via_types.count(VIATYPE_MICROVIA)
         ###########################################################
         # Drill (min)
         ###########################################################
-        modules = board.GetModules() if GS.ki5 else board.GetFootprints()
+        fps = get_fp_snapshot() if board is GS.board else FootprintSnapshot(board)
+        modules = fps.modules
         self._drills = {}
         self._drills_oval = {}
         self.oar_pads = self.oar_pads_ec = self.pad_drill = self.pad_drill_real = self.pad_drill_real_ec = INF
@@ -704,12 +877,19 @@ class ReportOptions(VariantOptions):
         npth_attrib = 3 if GS.ki5 else pcbnew.PAD_ATTRIB_NPTH
         min_oar = GS.from_mm(0.1)
         pad_properties = []
-        for m in modules:
-            ref = m.GetReference()
+        drilled_pads = []
+        drill_x = []
+        drill_y = []
+        pads_pth = []
+        size_x = []
+        size_y = []
+        for i, m in enumerate(modules):
+            ref = fps.refs[i]
             comp = self._comps_hash.get(ref, None) if self._comps and self._comps_hash else None
-            layer = m.GetLayer()
+            layer = fps.layers[i]
+            attrs = fps.attrs[i]
             if layer == top_layer:
-                if is_pure_smd(m):
+                if is_pure_smd(attrs):
                     self.top_smd += 1
                     if comp:
                         if not comp.included:
@@ -719,7 +899,7 @@ class ReportOptions(VariantOptions):
                                 self.top_smd_dnp += 1
                             if comp.fixed:
                                 self.top_smd_dnc += 1
-                elif is_not_virtual(m):
+                elif is_not_virtual(attrs):
                     self.top_tht += 1
                     if comp:
                         if not comp.included:
@@ -730,7 +910,7 @@ class ReportOptions(VariantOptions):
                             if comp.fixed:
                                 self.top_tht_dnc += 1
             elif layer == bottom_layer:
-                if is_pure_smd(m):
+                if is_pure_smd(attrs):
                     self.bot_smd += 1
                     if comp:
                         if not comp.included:
@@ -740,7 +920,7 @@ class ReportOptions(VariantOptions):
                                 self.bot_smd_dnp += 1
                             if comp.fixed:
                                 self.bot_smd_dnc += 1
-                elif is_not_virtual(m):
+                elif is_not_virtual(attrs):
                     self.bot_tht += 1
                     if comp:
                         if not comp.included:
@@ -762,54 +942,24 @@ class ReportOptions(VariantOptions):
                 dr = pad.GetDrillSize()
                 if not dr.x:
                     continue
-                self.pad_drill = min(dr.x, self.pad_drill)
-                self.pad_drill = min(dr.y, self.pad_drill)
-                # Compute the drill size to get it after plating
-                is_pth = pad.GetAttribute() != npth_attrib
-                if is_pth:
-                    self.pad_drill_pth = min(dr.x, self.pad_drill_pth)
-                    self.pad_drill_pth = min(dr.y, self.pad_drill_pth)
-                else:
-                    self.pad_drill_npth = min(dr.x, self.pad_drill_npth)
-                    self.pad_drill_npth = min(dr.y, self.pad_drill_npth)
-
-                dr_x_real = adjust_drill(dr.x, is_pth, pad)
-                dr_y_real = adjust_drill(dr.y, is_pth, pad)
-                self.pad_drill_real = min(dr_x_real, self.pad_drill_real)
-                self.pad_drill_real = min(dr_y_real, self.pad_drill_real)
-
-                if is_pth:
-                    self.pad_drill_pth_real = min(dr_x_real, self.pad_drill_pth_real)
-                    self.pad_drill_pth_real = min(dr_y_real, self.pad_drill_pth_real)
-                else:
-                    self.pad_drill_npth_real = min(dr_x_real, self.pad_drill_npth_real)
-                    self.pad_drill_npth_real = min(dr_y_real, self.pad_drill_npth_real)
-
-                if dr.x == dr.y:
-                    self._drills[dr.x] = self._drills.get(dr.x, 0) + 1
-                    self._drills_real[dr_x_real] = self._drills_real.get(dr_x_real, 0) + 1
-                else:
-                    if dr.x < dr.y:
-                        m = (dr.x, dr.y)
-                        d = dr.x
-                        d_r = dr_x_real
-                    else:
-                        m = (dr.y, dr.x)
-                        d = dr.y
-                        d_r = dr_y_real
-                    self._drills_oval[m] = self._drills_oval.get(m, 0) + 1
-                    self.slot = min(self.slot, m[0])
-                    # print('{} @ {}'.format(dr, pad.GetPosition()))
-                    self._drills_real[d_r] = self._drills_real.get(d_r, 0) + 1
                 pad_sz = pad.GetSize()
-                oar_x, oar_ec_x, dr_x_ec = self.compute_oar(pad_sz.x, dr_x_real)
-                oar_y, oar_ec_y, dr_y_ec = self.compute_oar(pad_sz.y, dr_y_real)
-                dr_ec = min(dr_x_ec, dr_y_ec)
-                self._drills_ec[dr_ec] = self._drills_ec.get(dr_ec, 0) + 1
-                self.pad_drill_real_ec = min(dr_ec, self.pad_drill_real_ec)
-                oar_t = min(oar_x, oar_y)
-                oar_ec_t = min(oar_ec_x, oar_ec_y)
-                self.analyze_oar(oar_t, oar_ec_t, is_pth, min_oar, pad, dr_x_real, dr_y_real, pad_sz, dr)
+                drilled_pads.append(pad)
+                drill_x.append(dr.x)
+                drill_y.append(dr.y)
+                pads_pth.append(pad.GetAttribute() != npth_attrib)
+                size_x.append(pad_sz.x)
+                size_y.append(pad_sz.y)
+        ###########################################################
+        # Tracks, vias and drilled pads stats
+        ###########################################################
+        np = self.get_numpy(len(track_widths)+len(via_drills)+len(drill_x))
+        if np is None:
+            self.track_stats_py(track_widths, via_drills, via_widths)
+            self.pad_stats_py(drilled_pads, drill_x, drill_y, pads_pth, size_x, size_y, min_oar)
+        else:
+            self.track_stats_np(np, track_widths, via_drills, via_widths)
+            self.pad_stats_np(np, drilled_pads, drill_x, drill_y, pads_pth, size_x, size_y, min_oar)
+        self.track_min = min(self.track_d, self.track)
         self._vias_m = sorted(self._vias.keys())
         self._vias_ec_m = sorted(self._vias_ec.keys())
         # Via Pad size
@@ -1037,7 +1187,7 @@ class ReportOptions(VariantOptions):
         for p in pad_properties:
             if p.fab_property == pcbnew.PAD_PROP_TESTPOINT:
                 self.testpoint_pads += 1
-                nets_with_tp[p.net] = nets_with_tp.get(p.net, [])+[p.name]
+                nets_with_tp.setdefault(p.net, []).append(p.name)
         cnd = GS.board.GetConnectivity()
         self.total_nets = cnd.GetNetCount()
         self.nets_with_testpoint = len(nets_with_tp)
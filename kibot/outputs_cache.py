@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Outputs cache
+
+Persistent cache for the files generated by the outputs. The key is a hash of everything that can change the result:
+the configured options, the project files, the variants, filters, preflights and global options, and the tools used by
+the output. When we find the key in the cache we just copy the files, instead of generating them again.
+"""
+import hashlib
+import json
+import os
+from shutil import copy, copytree, rmtree, which
+import tempfile
+from .gs import GS
+from .optionable import Optionable
+from .pre_base import BasePreFlight
+from .registrable import RegOutput
+from . import dep_downloader
+from . import __version__
+from . import log
+
+logger = log.get_logger()
+# Change it if the cache layout or the key changes
+CACHE_VERSION = 1
+MANIFEST = 'manifest.json'
+# Digests of the files we already hashed: path -> (mtime, size, digest)
+digests = {}
+
+
+def get_cache_dir():
+    if GS.global_cache_outputs_dir:
+        return os.path.abspath(os.path.expanduser(GS.global_cache_outputs_dir))
+    return os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'outputs')
+
+
+def file_digest(fname):
+    """ SHA256 of the file content, computed only once while the file isn't modified """
+    st = os.stat(fname)
+    cached = digests.get(fname)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    digests[fname] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def _state(obj, seen):
+    """ Converts the object to something we can serialize in a deterministic way """
+    if obj is None or isinstance(obj, (bool, int, float)):
+        return obj
+    if isinstance(obj, str):
+        # Files mentioned in the options (templates, images, configs, etc.) are also part of the key
+        if len(obj) < 1024 and os.path.isfile(obj):
+            return [obj, file_digest(obj)]
+        return obj
+    if isinstance(obj, (list, tuple)):
+        return [_state(v, seen) for v in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted(map(str, obj))
+    if isinstance(obj, dict):
+        return {str(k): _state(v, seen) for k, v in obj.items()}
+    if isinstance(obj, Optionable):
+        if id(obj) in seen:
+            return obj.__class__.__name__
+        seen.add(id(obj))
+        res = {k: _state(v, seen) for k, v in obj.get_attrs_gen()}
+        res['__class__'] = obj.__class__.__name__
+        return res
+    # Other objects, i.e. pcbnew objects
+    name = getattr(obj, 'name', None)
+    return [obj.__class__.__name__, name if isinstance(name, str) else None]
+
+
+def _trees(objs):
+    return {o.name: _state(getattr(o, '_tree', None), set()) for o in objs}
+
+
+def _tools_state(out_type):
+    """ The binaries used by this output.
+        The versions are probed when the output runs, so we use the identity of the binary (path, time and size) """
+    res = {}
+    prefix = out_type+':'
+    for name, dep in dep_downloader.used_deps.items():
+        if not name.startswith(prefix) or dep.is_python:
+            continue
+        full_name = which(dep.command)
+        st = os.stat(full_name) if full_name else None
+        res[name] = [full_name, st.st_mtime_ns if st else None, st.st_size if st else None]
+    return res
+
+
+def _rel_target(target, out_dir):
+    target = os.path.abspath(target)
+    rel = os.path.relpath(target, out_dir)
+    return target if rel.startswith('..') else rel
+
+
+def get_key(out, out_dir):
+    """ Computes the key for the output, returns the key and the targets.
+        None if we can't cache this output """
+    if not out._cacheable:
+        logger.debug(f'- `{out.name}` depends on things we can\'t track, not cached')
+        return None, None
+    names = [o.name for o in RegOutput.get_outputs()]
+    if out.get_output_dependencies(names):
+        logger.debug(f'- `{out.name}` uses other outputs, not cached')
+        return None, None
+    out_dir = os.path.abspath(out_dir)
+    try:
+        targets = [_rel_target(t, out_dir) for t in out.get_targets(out_dir)]
+        files = {f for f in out.get_dependencies() if f}
+    except Exception as e:
+        logger.debug(f'- Unable to get the targets/dependencies for `{out.name}` ({e}), not cached')
+        return None, None
+    if not targets:
+        return None, None
+    files.update(f for f in (GS.pcb_file, GS.sch_file, GS.pro_file) if f)
+    if GS.sch:
+        files.update(GS.sch.get_files())
+    variant = GS.solved_global_variant
+    data = {'cache': CACHE_VERSION,
+            'kibot': __version__,
+            'kicad': GS.kicad_version_n,
+            'output': _state(out, set()),
+            'targets': targets,
+            'files': {f: file_digest(f) for f in sorted(files) if os.path.isfile(f)},
+            'globals': _state(GS.globals_tree, set()),
+            'variant': variant.name if variant else None,
+            'variants': _trees(RegOutput._def_variants.values()),
+            'filters': _trees(RegOutput._def_filters.values()),
+            'preflights': _trees(BasePreFlight.get_in_use_objs()),
+            'tools': _tools_state(out.type)}
+    key = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    logger.debug(f'- Cache key for `{out.name}`: {key}')
+    return key, targets
+
+
+def restore(key, out_dir):
+    """ Copies the files from the cache, returns False if we don't have them """
+    entry = os.path.join(get_cache_dir(), key)
+    manifest = os.path.join(entry, MANIFEST)
+    try:
+        with open(manifest, 'rt') as f:
+            targets = json.load(f)['targets']
+        for n, target in enumerate(targets):
+            src = os.path.join(entry, 'files', str(n))
+            dest = os.path.join(out_dir, target)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if os.path.isdir(src):
+                if os.path.isdir(dest):
+                    rmtree(dest)
+                copytree(src, dest)
+            else:
+                copy(src, dest)
+        # Mark it as recently used
+        os.utime(manifest)
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f'- Cache miss for {key} ({e})')
+        return False
+    logger.debug(f'- Restored {len(targets)} files from the cache ({key})')
+    return True
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def store(key, targets, out_dir, name):
+    """ Copies the generated files to the cache """
+    cache_dir = get_cache_dir()
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Use a temporal dir and then rename it, so other processes never see an incomplete entry
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+        os.makedirs(os.path.join(tmp, 'files'))
+        stored = []
+        size = 0
+        for target in targets:
+            src = os.path.join(out_dir, target)
+            dest = os.path.join(tmp, 'files', str(len(stored)))
+            if os.path.isdir(src):
+                copytree(src, dest)
+                size += _dir_size(dest)
+            elif os.path.isfile(src):
+                copy(src, dest)
+                size += os.path.getsize(dest)
+            else:
+                continue
+            stored.append(target)
+        with open(os.path.join(tmp, MANIFEST), 'wt') as f:
+            json.dump({'output': name, 'targets': stored, 'size': size}, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process stored it
+            rmtree(tmp, ignore_errors=True)
+            return
+    except OSError as e:
+        logger.debug(f'- Failed to store `{name}` in the cache ({e})')
+        return
+    logger.debug(f'- Stored {len(stored)} files in the cache ({key})')
+    trim(cache_dir, GS.global_cache_outputs_size*1024*1024)
+
+
+def trim(cache_dir, max_size):
+    """ Removes the least recently used entries until the cache size is below `max_size` bytes """
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        manifest = os.path.join(cache_dir, name, MANIFEST)
+        try:
+            mtime = os.path.getmtime(manifest)
+            with open(manifest, 'rt') as f:
+                size = json.load(f)['size']
+        except (OSError, ValueError, KeyError):
+            continue
+        entries.append((mtime, size, name))
+        total += size
+    for _, size, name in sorted(entries):
+        if total <= max_size:
+            break
+        logger.debug(f'- Removing {name} from the outputs cache')
+        rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
@@ -225,6 +225,7 @@ class Annotate_PCB(BasePreFlight):  # noqa: F821
             else:
                 changes[old_ref] = m.new_ref_suffix
             m.footprint.SetReference(new_ref)
+        GS.fp_snapshot = None
         logger.debug('- Saving PCB')
         GS.save_pcb()
         #
@@ -12,7 +12,7 @@ from .optionable import Optionable
 from .pre_base import BasePreFlight
 from .gs import GS
 from .macros import macros, document, pre_class  # noqa: F401
-from . import log
+from . import log, timings
 
 logger = log.get_logger()
 re_git = re.compile(r'([^a-zA-Z_]|^)(git) ')
@@ -107,7 +107,8 @@ class Base_Replace(BasePreFlight):  # noqa: F821
                     bash_command = self.ensure_tool('Bash')
                 cmd = [bash_command, '-c', command]
                 logger.debugl(2, 'Running: {}'.format(cmd))
-                result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+                with timings.command(cmd):
+                    result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
                 if result.returncode:
                     GS.exit_with_error('Failed to execute:\n{r.command}\nreturn code {result.returncode}', FAILED_EXECUTE)
                 if not result.stdout:
@@ -11,6 +11,7 @@ from .optionable import Optionable
 from .error import PlotError, KiPlotConfigurationError
 from .misc import PLOT_ERROR, EXIT_BAD_CONFIG, W_KEEPTMP
 from .log import get_logger
+from . import timings
 
 logger = get_logger(__name__)
 
@@ -66,7 +67,7 @@ class BasePreFlight(Optionable, Registrable):
 
     @staticmethod
     def get_object_for(name, value=None):
-        obj = BasePreFlight._registered[name]()
+        obj = BasePreFlight.get_class_for(name)()
         assert name == obj.type
         if value is None:
             cur_doc, _, _ = obj.get_doc(name, no_basic=True)
@@ -107,6 +108,7 @@ class BasePreFlight(Optionable, Registrable):
 
     @staticmethod
     def get_registered():
+        BasePreFlight._lazy_load()
         return BasePreFlight._registered
 
     @staticmethod
@@ -151,11 +153,13 @@ class BasePreFlight(Optionable, Registrable):
                     if v.is_pcb():
                         GS.check_pcb()
                     logger.debug('Preflight apply '+k)
-                    v.apply()
+                    with timings.measure('preflight', k, stage='apply'):
+                        v.apply()
             for k, v in BasePreFlight._in_use.items():
                 if v._enabled:
                     logger.debug('Preflight run '+k)
-                    v.run()
+                    with timings.measure('preflight', k, stage='run'):
+                        v.run()
         except PlotError as e:
             GS.exit_with_error("In preflight `"+str(k)+"`: "+str(e), PLOT_ERROR)
         except KiPlotConfigurationError as e:
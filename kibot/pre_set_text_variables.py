@@ -20,7 +20,7 @@ from .optionable import Optionable
 from .pre_base import BasePreFlight
 from .gs import GS
 from .macros import macros, document, pre_class  # noqa: F401
-from . import log
+from . import log, timings
 
 logger = log.get_logger()
 re_git = re.compile(r'([^a-zA-Z_]|^)(git) ')
@@ -131,7 +131,8 @@ class Set_Text_Variables(BasePreFlight):  # noqa: F821
                     bash_command = self.ensure_tool('Bash')
                 cmd = [bash_command, '-c', command]
                 logger.debug('Executing: '+GS.pasteable_cmd(cmd))
-                result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+                with timings.command(cmd):
+                    result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
                 if result.returncode:
                     msgs = [f'Failed to execute:\n{command}\nreturn code {result.returncode}']
                     if result.stdout:
@@ -94,6 +94,9 @@ class Group(object):
 
 class Registrable(object):
     """ This class adds the mechanism to register plug-ins """
+    # Used to import the plug-ins on demand, see kiplot.load_actions
+    _lazy_loader = None
+
     def __init__(self):
         super().__init__()
 
@@ -101,16 +104,24 @@ class Registrable(object):
     def register(cl, name, aclass):
         cl._registered[name] = aclass
 
+    @classmethod
+    def _lazy_load(cl, name=None):
+        if Registrable._lazy_loader is not None and (name is None or name not in cl._registered):
+            Registrable._lazy_loader(cl._registered, name)
+
     @classmethod
     def is_registered(cl, name):
+        cl._lazy_load(name)
         return name in cl._registered
 
     @classmethod
     def get_class_for(cl, name):
+        cl._lazy_load(name)
         return cl._registered[name]
 
     @classmethod
     def get_registered(cl):
+        cl._lazy_load()
         return cl._registered
 
     def __str__(self):
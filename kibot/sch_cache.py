@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Schematic cache
+
+Persistent cache for the loaded KiCad v6+ schematics. When KiBot is invoked many times for the same project (i.e. from
+a Makefile) we can unpickle the objects created by a previous run, instead of parsing all the sheets again.
+An entry is used only when the content of all the files in the hierarchy, the KiBot version and the context used to
+expand the text variables are the same.
+We pickle the whole object graph, so the objects shared by the instances of a sheet used more than once (sheet_paths,
+symbol_instances, etc.) keep their identity.
+"""
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+from .gs import GS
+from .kicad import v6_sch
+from .kicad.v6_sch import UUID_Validator
+from . import __version__
+from . import log
+
+logger = log.get_logger()
+# Change it if the format of the entries changes
+CACHE_VERSION = 1
+VARS_REGEX = re.compile(rb'\$\{([^\}]+)\}')
+
+
+def get_cache_dir():
+    if GS.global_cache_schematics_dir:
+        return os.path.abspath(os.path.expanduser(GS.global_cache_schematics_dir))
+    return os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'schematics')
+
+
+def _entry_name(fname, project):
+    """ One entry for each top-level schematic """
+    name = hashlib.sha256((os.path.abspath(fname)+'\0'+project).encode()).hexdigest()
+    return os.path.join(get_cache_dir(), name+'.pickle')
+
+
+def _files_data(files):
+    """ Digests for the files and the names of the text variables used in them """
+    digests = []
+    variables = set()
+    for fname in files:
+        with open(fname, 'rb') as f:
+            data = f.read()
+        digests.append((fname, hashlib.sha256(data).hexdigest()))
+        variables.update(VARS_REGEX.findall(data))
+    return digests, variables
+
+
+def _context(fname, project, variables):
+    """ Things, other than the files, that can change the loaded schematic """
+    env = None
+    if GS.global_use_os_env_for_expand:
+        env = {v: os.environ.get(v.decode(errors='replace')) for v in variables}
+    return (CACHE_VERSION, __version__, sys.version_info[:2], fname, os.getcwd(), project, GS.load_pro_variables(), env,
+            GS.global_date_format, GS.global_date_time_format, GS.global_time_reformat)
+
+
+def _refresh_dates(sch):
+    """ Sheets without title block use the file date, which isn't part of the key """
+    for sheet in sch.sheet_paths.values():
+        if not sheet.title_ori and not sheet.date_ori:
+            sheet.date = GS.format_date('', sheet.fname, 'SCH')
+
+
+def load(fname, project):
+    """ Returns the cached schematic or None """
+    entry = _entry_name(fname, project)
+    if not os.path.isfile(entry):
+        return None
+    try:
+        with open(entry, 'rb') as f:
+            files, context = pickle.load(f)
+            digests, variables = _files_data(n for n, _ in files)
+            if digests != files or context != _context(fname, project, variables):
+                logger.debug('Schematic cache entry for `{}` is outdated'.format(fname))
+                return None
+            version, known_uuids, sch = pickle.load(f)
+    except Exception as e:
+        # Missing sub-sheets, corrupted entries, incompatible classes, etc.
+        logger.debug('Discarding schematic cache entry `{}` ({})'.format(entry, e))
+        return None
+    logger.debug('Using the cached schematic for `{}`'.format(fname))
+    # Module level state created during the load
+    v6_sch.version = version
+    UUID_Validator.known_UUIDs = known_uuids
+    _refresh_dates(sch)
+    return sch
+
+
+def store(fname, project, sch):
+    cache_dir = get_cache_dir()
+    tmp = None
+    try:
+        digests, variables = _files_data(sch.get_files())
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            # The key goes first, so we can check it without loading the schematic
+            pickle.dump((digests, _context(fname, project, variables)), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump((v6_sch.version, UUID_Validator.known_UUIDs, sch), f, pickle.HIGHEST_PROTOCOL)
+        # Other processes could be using the cache
+        os.replace(tmp, _entry_name(fname, project))
+        tmp = None
+    except (OSError, pickle.PicklingError, RecursionError, TypeError, AttributeError) as e:
+        logger.debug('Failed to store `{}` in the schematic cache ({})'.format(fname, e))
+    finally:
+        if tmp is not None and os.path.isfile(tmp):
+            os.remove(tmp)
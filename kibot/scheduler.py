@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Parallel outputs scheduler
+
+Builds a dependency graph of the outputs we are going to generate and runs the independent outputs in separated
+processes. Each worker is a fork of the main process, so it starts with the configuration, the preflights results
+and the loaded PCB/SCH, but any change applied to them is local to the worker.
+The variants can be also generated in parallel, using one worker for each variant.
+"""
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import sys
+import time
+from .gs import GS
+from .kiplot import config_output, run_output, get_output_dir, set_variant, reset_outputs
+from .misc import W_NOPARALLEL, FAILED_EXECUTE
+from . import log, timings
+
+logger = log.get_logger()
+
+
+class OutputJob(object):
+    """ A node in the outputs dependency graph """
+    def __init__(self, out, order):
+        self.out = out
+        self.order = order
+        self.deps = set()
+        self.users = set()
+        self.process = None
+        self.conn = None
+        self.start = 0
+        self.elapsed = 0
+        self.cpu = 0
+        self.ret = 0
+
+
+def parallel_available():
+    return not GS.on_windows and 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _get_targets_and_deps(out):
+    """ Files generated and needed by this output. Errors are ignored, they will be reported when we run the output """
+    try:
+        targets = {os.path.realpath(f) for f in out.get_targets(get_output_dir(out.dir, out, dry=True))}
+    except Exception as e:
+        logger.debug(f'- Unable to get the targets for `{out.name}` ({e})')
+        targets = set()
+    try:
+        deps = {os.path.realpath(f) for f in out.get_dependencies() if f}
+    except Exception as e:
+        logger.debug(f'- Unable to get the dependencies for `{out.name}` ({e})')
+        deps = set()
+    return targets, deps
+
+
+def build_graph(targets, dont_stop):
+    """ Creates the dependency graph for the list of outputs.
+        An output depends on another if it mentions it in its options (i.e. `compress` or `pdfunite`), or if it
+        needs a file generated by the other output """
+    jobs = {}
+    for n, out in enumerate(targets):
+        if config_output(out, dont_stop=dont_stop):
+            jobs[out.name] = OutputJob(out, n)
+    names = set(jobs.keys())
+    files = {name: _get_targets_and_deps(job.out) for name, job in jobs.items()}
+    for name, job in jobs.items():
+        deps = set(job.out.get_output_dependencies(names))
+        needed = files[name][1]
+        if needed:
+            deps.update(n for n, f in files.items() if n != name and not needed.isdisjoint(f[0]))
+        deps.discard(name)
+        for d in deps:
+            job.deps.add(d)
+            jobs[d].users.add(name)
+        if deps:
+            logger.debug(f'- `{name}` depends on {sorted(deps)}')
+    return jobs
+
+
+def _run_in_worker(out, dont_stop, conn):
+    """ Runs in the forked process, the exit code is the error level """
+    log_counters = log.get_warn_counters()
+    timings_mark = timings.mark()
+    start = time.process_time()
+    ret = 0
+    try:
+        logger.info('- '+str(out))
+        run_output(out, dont_stop)
+    except SystemExit as e:
+        ret = e.code if isinstance(e.code, int) else 1
+    # Inform the warnings we found, so the main process can report the totals
+    conn.send((log.diff_warn_counters(log_counters), time.process_time()-start, timings.since(timings_mark)))
+    conn.close()
+    if ret:
+        sys.exit(ret)
+
+
+def _start_job(ctx, job, dont_stop):
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    job.process = ctx.Process(target=_run_in_worker, args=(job.out, dont_stop, child_conn), name=job.out.name)
+    job.conn = parent_conn
+    job.start = time.perf_counter()
+    job.process.start()
+    child_conn.close()
+
+
+def _finish_job(job):
+    job.process.join()
+    job.elapsed = time.perf_counter()-job.start
+    job.ret = job.process.exitcode
+    if job.conn.poll():
+        try:
+            counters, job.cpu, job_times = job.conn.recv()
+            log.add_warn_counters(counters)
+            timings.merge(job_times)
+        except EOFError:
+            pass
+    job.conn.close()
+    # Tell the next workers this output is already done, they must not run it again
+    job.out._done = job.ret == 0
+
+
+def error_level(exitcode):
+    """ The error level for the exit code of a worker. Negative values mean the worker was killed by a signal """
+    return FAILED_EXECUTE if exitcode < 0 else exitcode
+
+
+def report_timings(jobs, total):
+    logger.info('Outputs timing (wall/CPU seconds):')
+    for job in sorted(jobs, key=lambda j: j.elapsed, reverse=True):
+        logger.info(f'- {job.out.name}: {job.elapsed:.2f}/{job.cpu:.2f}')
+    logger.info(f'Total: {total:.2f} seconds')
+
+
+def run_outputs_parallel(targets, n_jobs, dont_stop):
+    """ Runs the outputs using up to `n_jobs` concurrent workers. The `targets` are sorted by priority """
+    if not parallel_available():
+        logger.warning(W_NOPARALLEL+'Parallel outputs generation not available on this platform, using one job')
+        return False
+    ctx = multiprocessing.get_context('fork')
+    jobs = build_graph(targets, dont_stop)
+    pending = sorted(jobs.values(), key=lambda j: j.order)
+    running = []
+    done = []
+    failed = None
+    start = time.perf_counter()
+    while (pending or running) and failed is None:
+        # Start all the jobs we can
+        ready = [j for j in pending if not j.deps]
+        if not ready and not running:
+            # Circular references, break them using the declared order
+            logger.debug('Circular references between outputs: '+str([j.out.name for j in pending]))
+            pending[0].deps = set()
+            continue
+        for job in ready:
+            if len(running) >= n_jobs or GS.get_stop_flag():
+                break
+            pending.remove(job)
+            _start_job(ctx, job, dont_stop)
+            running.append(job)
+        if not running:
+            break
+        # Wait for one or more jobs to finish
+        finished = wait([j.process.sentinel for j in running])
+        for job in [j for j in running if j.process.sentinel in finished]:
+            running.remove(job)
+            _finish_job(job)
+            done.append(job)
+            logger.debug(f'- `{job.out.name}` finished in {job.elapsed:.2f} s (return {job.ret})')
+            if job.ret and not dont_stop:
+                failed = job
+            for user in job.users:
+                jobs[user].deps.discard(job.out.name)
+    if failed is not None:
+        for job in running:
+            job.process.terminate()
+            job.process.join()
+        msg = f'Failed to generate `{failed.out.name}`'
+        if failed.ret < 0:
+            msg += f' (killed by signal {-failed.ret})'
+        GS.exit_with_error(msg, error_level(failed.ret))
+    report_timings(done, time.perf_counter()-start)
+    return True
+
+
+def _run_variant_in_worker(name, obj, run, conn):
+    """ Runs in the forked process, the exit code is the error level """
+    log_counters = log.get_warn_counters()
+    timings_mark = timings.mark()
+    start = time.process_time()
+    ret = 0
+    set_variant(name, obj)
+    # The preflights configured some outputs (i.e. include_table) using the first variant
+    reset_outputs()
+    # Each variant uses its own directory
+    GS.out_dir = os.path.join(GS.out_dir, name or 'NONE')
+    # The main process restores it when all the variants are done
+    GS.global_restore_project = False
+    try:
+        logger.info(f'Variant `{name}`:')
+        run()
+    except SystemExit as e:
+        ret = e.code if isinstance(e.code, int) else 1
+    conn.send((log.diff_warn_counters(log_counters), time.process_time()-start, timings.since(timings_mark)))
+    conn.close()
+    if ret:
+        sys.exit(ret)
+
+
+def run_variants_parallel(variants, n_workers, run, dont_stop):
+    """ Calls `run` for each variant (name -> solved variant), using up to `n_workers` concurrent workers.
+        When `dont_stop` is True a failed variant doesn't stop the rest, but we still exit with error """
+    ctx = multiprocessing.get_context('fork')
+    pending = list(variants.items())
+    running = {}
+    times = []
+    failed = None
+    start = time.perf_counter()
+    while (pending or running) and (failed is None or dont_stop):
+        while pending and len(running) < n_workers and not GS.get_stop_flag():
+            name, obj = pending.pop(0)
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_run_variant_in_worker, args=(name, obj, run, child_conn), name=name or 'NONE')
+            process.start()
+            child_conn.close()
+            running[process.sentinel] = (name, process, parent_conn, time.perf_counter())
+        if not running:
+            break
+        for sentinel in wait(list(running.keys())):
+            name, process, conn, started = running.pop(sentinel)
+            process.join()
+            cpu = 0
+            if conn.poll():
+                try:
+                    counters, cpu, variant_times = conn.recv()
+                    log.add_warn_counters(counters)
+                    timings.merge(variant_times)
+                except EOFError:
+                    pass
+            conn.close()
+            times.append((name, time.perf_counter()-started, cpu))
+            logger.debug(f'- Variant `{name}` finished (return {process.exitcode})')
+            if process.exitcode and failed is None:
+                failed = (name, process.exitcode)
+    if failed is not None:
+        for _, process, _, _ in running.values():
+            process.terminate()
+            process.join()
+        msg = f'Failed to generate the `{failed[0]}` variant'
+        if failed[1] < 0:
+            msg += f' (killed by signal {-failed[1]})'
+        GS.exit_with_error(msg, error_level(failed[1]))
+    logger.info('Variants timing (wall/CPU seconds):')
+    for name, elapsed, cpu in sorted(times, key=lambda t: t[1], reverse=True):
+        logger.info(f'- {name or "NONE"}: {elapsed:.2f}/{cpu:.2f}')
+    logger.info(f'Total: {time.perf_counter()-start:.2f} seconds')
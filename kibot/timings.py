@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025 Salvador E. Tropea
+# Copyright (c) 2025 Instituto Nacional de Tecnología Industrial
+# License: AGPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Instrumentation
+
+Collects the wall and CPU time used by each preflight and output. Also the time spent running external commands (KiAuto,
+kicad-cli, Ghostscript, etc.), grouped by command.
+The OS only reports the peak memory of the whole process (and the biggest child), which never goes down. So for each
+entry we report this peak at the end of the entry (`process_max_rss`) and how much the entry raised it
+(`max_rss_growth`). An entry that didn't use more memory than the previous ones has 0 growth.
+The results are stored in a JSON file (`--timings`). The outputs can be also profiled using cProfile (`--profile`), we
+create a pstats file for each output.
+"""
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import json
+import os
+import sys
+import threading
+import time
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+from .gs import GS
+from . import __version__
+from . import log
+
+logger = log.get_logger()
+# Format of the JSON file
+TIMINGS_VERSION = 2
+enabled = False
+timings_file = None
+profile_dir = None
+_entries = []
+# Command name -> [count, wall]
+_commands = {}
+_current = None
+# An output is being profiled, only one profiler can be active
+_profiling = False
+_start = None
+_lock = threading.Lock()
+
+
+def init(timings, profile):
+    global enabled, timings_file, profile_dir, _start, _current, _profiling
+    timings_file = os.path.abspath(timings) if timings else None
+    profile_dir = os.path.abspath(profile) if profile else None
+    enabled = bool(timings_file or profile_dir)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    _start = (time.perf_counter(), os.times())
+    _entries.clear()
+    _commands.clear()
+    _current = None
+    _profiling = False
+
+
+def _max_rss(who):
+    """ Peak resident set size in KiB """
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    # macOS reports it in bytes
+    return rss//1024 if sys.platform == 'darwin' else rss
+
+
+def _cpu(t):
+    return t.user+t.system, t.children_user+t.children_system
+
+
+def command_name(cmd):
+    """ The name used to group the commands. For kicad-cli we include the sub-commands (i.e. `kicad-cli pcb export svg`) """
+    if isinstance(cmd, str):
+        cmd = cmd.split()
+    name = os.path.basename(cmd[0]) if cmd else ''
+    if name.startswith('kicad-cli'):
+        for arg in cmd[1:4]:
+            if arg.startswith('-'):
+                break
+            name += ' '+arg
+    return name
+
+
+@contextmanager
+def measure(kind, name, **extra):
+    """ Measures a preflight or an output, the outputs are profiled if requested.
+        Outputs can run other outputs, their profile is included in the profile of the outermost one """
+    global _current, _profiling
+    if not enabled:
+        yield
+        return
+    entry = {'kind': kind, 'name': name}
+    entry.update(extra)
+    if GS.variant:
+        entry['variant'] = GS.variant
+    entry['commands'] = {}
+    prev = _current
+    _current = entry
+    prof = None
+    if profile_dir and kind == 'output' and not _profiling:
+        prof = cProfile.Profile()
+        prof.enable()
+        _profiling = True
+    start_rss = _max_rss(resource.RUSAGE_SELF) if resource is not None else None
+    start = time.perf_counter()
+    start_cpu, start_children = _cpu(os.times())
+    try:
+        yield
+    finally:
+        end_cpu, end_children = _cpu(os.times())
+        entry['wall'] = time.perf_counter()-start
+        entry['cpu'] = end_cpu-start_cpu
+        entry['children_cpu'] = end_children-start_children
+        if prof is not None:
+            prof.disable()
+            _profiling = False
+            fname = GS.variant+'-'+name if GS.variant else name
+            entry['profile'] = os.path.join(profile_dir, fname.replace(os.sep, '_')+'.pstats')
+            prof.dump_stats(entry['profile'])
+        if resource is not None:
+            # Peaks since the process started, not just for this entry
+            entry['process_max_rss'] = _max_rss(resource.RUSAGE_SELF)
+            entry['max_rss_growth'] = entry['process_max_rss']-start_rss
+            entry['children_max_rss'] = _max_rss(resource.RUSAGE_CHILDREN)
+        _current = prev
+        _entries.append(entry)
+
+
+@contextmanager
+def command(cmd):
+    """ Measures an external command """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter()-start
+        name = command_name(cmd)
+        with _lock:
+            _add_command(_commands, name, 1, elapsed)
+            if _current is not None:
+                _add_command(_current['commands'], name, 1, elapsed)
+
+
+def _add_command(commands, name, count, wall):
+    data = commands.setdefault(name, [0, 0.0])
+    data[0] += count
+    data[1] += wall
+
+
+def mark():
+    """ Current state, used by the workers to send only the new data """
+    return len(_entries), {k: list(v) for k, v in _commands.items()}
+
+
+def since(mark):
+    """ Data collected after the `mark` """
+    n, commands = mark
+    new_commands = {}
+    for k, (count, wall) in _commands.items():
+        old = commands.get(k, (0, 0.0))
+        if count > old[0]:
+            new_commands[k] = (count-old[0], wall-old[1])
+    return _entries[n:], new_commands
+
+
+def merge(data):
+    """ Adds the data collected by a worker """
+    entries, commands = data
+    _entries.extend(entries)
+    for k, (count, wall) in commands.items():
+        _add_command(_commands, k, count, wall)
+
+
+def _commands_dict(commands):
+    return {k: {'count': v[0], 'wall': v[1]} for k, v in sorted(commands.items(), key=lambda x: x[1][1], reverse=True)}
+
+
+def write():
+    if not timings_file:
+        return
+    start, start_times = _start
+    end_cpu, end_children = _cpu(os.times())
+    start_cpu, start_children = _cpu(start_times)
+    entries = []
+    for e in _entries:
+        e = dict(e)
+        e['commands'] = _commands_dict(e['commands'])
+        entries.append(e)
+    data = {'version': TIMINGS_VERSION,
+            'kibot_version': __version__,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'command_line': sys.argv,
+            'total': {'wall': time.perf_counter()-start, 'cpu': end_cpu-start_cpu, 'children_cpu': end_children-start_children,
+                      'max_rss': _max_rss(resource.RUSAGE_SELF) if resource else None},
+            'preflights': [e for e in entries if e['kind'] == 'preflight'],
+            'outputs': [e for e in entries if e['kind'] == 'output'],
+            'commands': _commands_dict(_commands)}
+    for e in data['preflights']+data['outputs']:
+        del e['kind']
+    os.makedirs(os.path.dirname(timings_file), exist_ok=True)
+    with open(timings_file, 'wt') as f:
+        json.dump(data, f, indent=2)
+    logger.debug('Timings stored in `{}`'.format(timings_file))
@@ -250,3 +250,39 @@ def test_check_tool_python_2(test_dir, caplog, monkeypatch):
     """ Download enabled, but fails """
     ctx = context.TestContext(test_dir, 'bom', 'bom')
     try_function(ctx, caplog, monkeypatch, do_check_tool_python, dep=DEP_PYTHON_MODULE_FOOBAR, disable_download=False)
+
+
+def do_check_versions_cache(mod, cache_file):
+    mod.versions_cache_file = cache_file
+    dep = mod.used_deps['test:git']
+    full_name = shutil.which(dep.command)
+    # First time we run the tool
+    cmd, ver = mod.check_tool_binary_version(full_name, dep)
+    assert os.path.isfile(cache_file)
+    # Now we use the persistent cache, even when the memory cache is empty
+    mod.binary_tools_cache = {}
+    mod.versions_cache = None
+    run_command = mod.run_command
+    mod.run_command = None
+    assert mod.check_tool_binary_version(full_name, dep) == (cmd, ver)
+    # A failed probe isn't stored
+    os.remove(cache_file)
+    mod.binary_tools_cache = {}
+    mod.versions_cache = None
+    mod.run_command = lambda cmd, no_err_2=False: None
+    assert mod.check_tool_binary_version(full_name, dep) == (None, None)
+    assert not os.path.isfile(cache_file)
+    mod.run_command = run_command
+    return ver
+
+
+@pytest.mark.indep
+def test_tools_versions_cache(test_dir, caplog, monkeypatch):
+    """ Check the persistent cache for the versions of the tools """
+    caplog.set_level(logging.DEBUG)
+    ctx = context.TestContext(test_dir, 'bom', 'bom')
+    dep = '  - from: Git\n    role: mandatory\n'
+    cache_file = ctx.get_out_path('tools_versions.json')
+    ver = try_function(ctx, caplog, monkeypatch, lambda mod: do_check_versions_cache(mod, cache_file), dep=dep)
+    assert ver is not None
+    assert 'Version from the persistent cache' in caplog.text
@@ -1390,6 +1390,41 @@ def test_int_bom_variant_t4(test_dir):
     ctx.clean_up()
 
 
+@pytest.mark.skipif(not context.ki8(), reason="Target is v8+")
+def test_int_bom_variant_t4_parallel(test_dir):
+    """ Like test_int_bom_variant_t4, but generating the variants in parallel, each one in its own dir """
+    prj = 'kibom-variante'
+    ctx = context.TestContextSCH(test_dir, prj, 'int_bom_var_t4_csv', BOM_DIR)
+    ctx.run(extra=['--variant', 'NONE', '--variant', 'ALL', '--variant-jobs', '3'])
+    for var, suffix, groups, exclude, comps in (('NONE', '', 2, ['R4'], ['R1', 'R2', 'R3']),
+                                                ('t1_v1', '_(V1)', 2, ['R3', 'R4'], ['R1', 'R2']),
+                                                ('t1_v2', '_(V2)', 1, ['R2', 'R4'], ['R1', 'R3']),
+                                                ('t1_v3', '_V3', 1, ['R2', 'R3'], ['R1', 'R4']),
+                                                ('bla bla', '_bla_bla', 1, ['R2', 'R3'], ['R1', 'R4'])):
+        logging.debug("* `{}` variant".format(var))
+        rows, header, info = ctx.load_csv(os.path.join('..', var, BOM_DIR, prj+'-bom'+suffix+'.csv'))
+        check_kibom_test_netlist(rows, header.index(REF_COLUMN_NAME), groups, exclude, comps)
+    # The warnings from the workers are reported by the main process
+    ctx.search_err(r'Field Config of component (.*) contains extra spaces')
+    ctx.search_err(r'Found \d+ unique warning/s')
+    ctx.clean_up()
+
+
+@pytest.mark.skipif(not context.ki8(), reason="Target is v8+")
+def test_int_bom_variant_include_table_parallel(test_dir):
+    """ The include_table preflight configures the BoM using the first variant, the workers must discard it """
+    prj = 'kibom-variante'
+    ctx = context.TestContext(test_dir, prj, 'int_bom_var_include_table', BOM_DIR)
+    ctx.run(extra=['--variant', 't1_v1', '--variant', 't1_v2', '--variant-jobs', '2'])
+    for var, suffix, groups, exclude, comps in (('t1_v1', '_(V1)', 2, ['R3', 'R4'], ['R1', 'R2']),
+                                                ('t1_v2', '_(V2)', 1, ['R2', 'R4'], ['R1', 'R3'])):
+        logging.debug("* `{}` variant".format(var))
+        rows, header, info = ctx.load_csv(os.path.join('..', var, BOM_DIR, prj+'-bom'+suffix+'.csv'))
+        check_kibom_test_netlist(rows, header.index(REF_COLUMN_NAME), groups, exclude, comps)
+    ctx.search_err(r'No `kibot_table\*` groups found')
+    ctx.clean_up()
+
+
 def check_value(rows, r_col, ref, v_col, val):
     for r in rows:
         refs = r[r_col].split(' ')
@@ -1459,6 +1459,18 @@ def test_dependencies_1(test_dir):
     ctx.search_out('`'+dep+' <')
 
 
+def test_dependencies_2(test_dir):
+    """ The second run uses the plug-ins manifest, the dependencies must be the same """
+    ctx = context.TestContext(test_dir, 'bom', 'netlist_ipc_1')
+    ctx.run(extra=['--help-dependencies', '--json'], no_board_file=True, no_out_dir=True, no_yaml_file=True)
+    with open(ctx.get_out_path('output.txt'), 'rt') as f:
+        first = json.load(f)
+    ctx.run(extra=['--help-dependencies', '--json'], no_board_file=True, no_out_dir=True, no_yaml_file=True)
+    with open(ctx.get_out_path('output.txt'), 'rt') as f:
+        second = json.load(f)
+    assert sorted(first.keys()) == sorted(second.keys())
+
+
 def test_dont_stop_1(test_dir):
     """ The first target fails, check we get the second """
     ctx = context.TestContext(test_dir, 'light_control', 'dont_stop_1', 'positiondir')
@@ -2097,3 +2109,16 @@ def test_ipc2581_xml(test_dir):
     ctx.run()
     ctx.expect_out_file(prj+'-IPC-2581.xml', sub=True)
     ctx.clean_up(keep_project=True)
+
+
+# Outputs using kicad-cli generated using one jobset
+@pytest.mark.skipif(not context.ki9(), reason="Needs KiCad 9")
+def test_kicad_cli_jobset(test_dir):
+    prj = 'light_control'
+    ctx = context.TestContext(test_dir, prj, 'kicad_cli_jobset', '')
+    ctx.run()
+    ctx.search_err('Generating 4 outputs using a KiCad jobset')
+    ctx.expect_out_file([os.path.join('Export', prj+'-odb.zip'), os.path.join('Export', prj+'-IPC-2581.zip'),
+                         os.path.join('Export', prj+'-netlist.xml'), os.path.join('Position', prj+'-top_pos.gbr'),
+                         os.path.join('Position', prj+'-bottom_pos.gbr')])
+    ctx.clean_up(keep_project=True)
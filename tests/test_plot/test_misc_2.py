@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from decimal import Decimal as D
 import os
 import re
@@ -5,26 +6,62 @@ import pytest
 import coverage
 import logging
 import requests
+import copy
+import hashlib
+import http.server
+import json
+import random
+import shutil
 import subprocess
 import sys
+import threading
+import time
+import zipfile
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+import pcbnew
 from . import context
 from kibot.layer import Layer
 from kibot.pre_base import BasePreFlight
 from kibot.out_base import BaseOutput
 from kibot.gs import GS
-from kibot.kiplot import load_actions, _import, load_board, generate_makefile, get_columns
+from kibot.optionable import Optionable
+from kibot import outputs_cache
+from kibot import out_base_3d
+from kibot.out_base_3d import Base3DOptions
+from kibot.kiplot import load_actions, _import, load_board, generate_makefile, get_columns, load_any_sch
 from kibot.dep_downloader import search_as_plugin
 from kibot.registrable import RegOutput, RegFilter
-from kibot.misc import (WRONG_INSTALL, BOM_ERROR, DRC_ERROR, ERC_ERROR, PDF_PCB_PRINT, KICAD2STEP_ERR)
+from kibot import fil_base
+from kibot.fil_base import BaseFilter, MultiFilter, reset_filters, apply_exclude_filter
+from kibot.misc import (WRONG_INSTALL, BOM_ERROR, DRC_ERROR, ERC_ERROR, PDF_PCB_PRINT, KICAD2STEP_ERR, FAILED_EXECUTE)
+from kibot.bom.bom import ComponentGroup, GroupsIndex
 from kibot.bom.columnlist import ColumnList
 from kibot.bom.units import get_prefix, comp_match
 import kibot.bom.units as units
 from kibot.bom.electro_grammar import parse
+from kibot.bom import electro_grammar, parse_cache
 from kibot.__main__ import detect_kicad
 from kibot.kicad.config import KiConf
+from kibot.fp_snapshot import get_fp_snapshot
+from kibot.kicad.v5_sch import SchematicComponent, SchematicField
+from kibot.kicad import v6_sch
+from kibot.kicad.v6_sch import SchematicV6, find_sheet_files
 from kibot.globals import Globals
 from kibot.PcbDraw.unit import read_resistance
+from kibot.out_compress import CompressOptions
+from kibot.out_pcb_print import PCB_PrintOptions, PlottedPage
+from kibot.out_kiri import KiRiOptions
+from kibot.out_diff import DiffOptions
+from kibot import out_diff
+from kibot.out_report import ReportOptions, get_via_width, INF
+from kibot.create_pdf import create_pdf_from_pages
+from kibot import PyPDF2
+from kibot import timings
+from kibot.scheduler import error_level
 from kibot.out_download_datasheets import Download_Datasheets_Options
+from kibot.download_cache import Downloader
+from kibot.kicad import sexpdata
+from kibot.kicad.sexpdata import Parser, FastParser, Symbol, SExpList, sexp_iter
 
 cov = coverage.Coverage()
 mocked_check_output_FNF = True
@@ -565,12 +602,53 @@ def test_electro_grammar_1():
                 logging.debug(c+" Ok")
 
 
+def test_electro_grammar_cache(test_dir, monkeypatch):
+    """ Persistent cache for the values parsed using the grammar """
+    cache_file = os.path.join(test_dir, 'values.json')
+    with context.cover_it(cov):
+        # Disabled by default
+        monkeypatch.setattr(GS, 'global_cache_values', False)
+        assert parse_cache.get_cache_file() is None
+        monkeypatch.setattr(GS, 'global_cache_values', True)
+        monkeypatch.setattr(GS, 'global_cache_values_dir', test_dir)
+        assert parse_cache.get_cache_file() == cache_file
+        try:
+            electro_grammar.parser = None
+            electro_grammar.initialize()
+            text = 'C 100nF 50V X7R 0402 foo'
+            ref = parse(text, with_extra=True)
+            assert parse_cache.get(text) is not None
+            parse_cache.save()
+            assert os.path.isfile(cache_file)
+            # A new run, the Decimal values are restored
+            electro_grammar.parser = None
+            electro_grammar.initialize()
+            assert parse(text, with_extra=True) == ref
+            assert isinstance(parse_cache.get(text)[1]['val'], D)
+            # Another grammar
+            parse_cache.load('grammar', electro_grammar.__file__)
+            assert parse_cache.get(text) is None
+            parse_cache.put(text, ({'type': 'capacitor'}, {'discarded': ['foo']}))
+            parse_cache.save()
+            parse_cache.load('grammar', electro_grammar.__file__)
+            assert parse(text) == {'type': 'capacitor'}
+            assert parse(text, with_extra=True) == {'type': 'capacitor', 'discarded': ['foo']}
+            # Another grammar discards the entries
+            parse_cache.load('other grammar', electro_grammar.__file__)
+            assert parse_cache.get(text) is None
+            assert parse(text, with_extra=True) == ref
+        finally:
+            monkeypatch.setattr(GS, 'global_cache_values', False)
+            electro_grammar.parser = None
+            electro_grammar.initialize()
+
+
 class Comp:
     def __init__(self):
         self.ref = 'R1'
 
 
-def mocked_requests_get(url, allow_redirects=True, headers=None, timeout=20):
+def mocked_requests_get(self, url, allow_redirects=True, headers=None, timeout=20):
     res = requests.Response()
     if url == '1':
         res.status_code = 666
@@ -592,6 +670,14 @@ def mocked_requests_get(url, allow_redirects=True, headers=None, timeout=20):
     return res
 
 
+def ds_download(o, c, url, name):
+    o._pending = []
+    o._links = []
+    o._created = []
+    o.download(c, url, 'pp', name, None)
+    o.download_pending()
+
+
 @pytest.mark.indep
 def test_ds_net_error(test_dir, caplog, monkeypatch):
     ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
@@ -602,8 +688,9 @@ def test_ds_net_error(test_dir, caplog, monkeypatch):
         o = Download_Datasheets_Options()
         o._downloaded = {'dnl'}
         o._created = []
+        o.use_cache = False
         c = Comp()
-        o.download(c, '1N1234.pdf', 'pp', '1N1234', None)
+        ds_download(o, c, '1N1234.pdf', '1N1234')
         assert 'Invalid URL' in caplog.text
         with monkeypatch.context() as m:
             caplog.clear()
@@ -614,22 +701,731 @@ def test_ds_net_error(test_dir, caplog, monkeypatch):
             o.download(c, 'ok', '', dummy, None)
             o._dry = False
             assert dummy in o._created
-            m.setattr('requests.get', mocked_requests_get)
+            m.setattr('requests.Session.get', mocked_requests_get)
             caplog.clear()
-            o.download(c, '1', 'pp', '1N1234', None)
+            ds_download(o, c, '1', '1N1234')
             assert 'Failed with status 666' in caplog.text
+            assert not o._created
             caplog.clear()
-            o.download(c, '2', 'pp', '1N1234', None)
+            ds_download(o, c, '2', '1N1234')
             assert 'Timeout' in caplog.text
             caplog.clear()
-            o.download(c, '3', 'pp', '1N1234', None)
+            ds_download(o, c, '3', '1N1234')
             assert 'SSL Error' in caplog.text
             caplog.clear()
-            o.download(c, '4', 'pp', '1N1234', None)
+            ds_download(o, c, '4', '1N1234')
             assert 'More than 30 redirections' in caplog.text
             caplog.clear()
-            o.download(c, '5', 'pp', '1N1234', None)
+            ds_download(o, c, '5', '1N1234')
             assert 'Connection' in caplog.text
             caplog.clear()
-            o.download(c, '6', 'pp', '1N1234', None)
+            ds_download(o, c, '6', '1N1234')
             assert 'Hello!' in caplog.text
+
+
+class DSRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Stand-in for the servers containing datasheets """
+    files = {'/a.pdf': b'PDF A', '/b.pdf': b'PDF B', '/c.pdf': b'PDF C'}
+    stats = {'200': 0, '304': 0, 'active': 0, 'max_active': 0}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.stats['active'] += 1
+            self.stats['max_active'] = max(self.stats['max_active'], self.stats['active'])
+        time.sleep(0.05)
+        data = self.files.get(self.path)
+        etag = '"{}"'.format(hash(data))
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == etag:
+            self.stats['304'] += 1
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.stats['200'] += 1
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        with self.lock:
+            self.stats['active'] -= 1
+
+    def log_message(self, format, *args):
+        return
+
+
+@pytest.mark.indep
+def test_ds_download_cache(test_dir):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DSRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    urls = [base+n for n in ('a.pdf', 'b.pdf', 'c.pdf', 'missing.pdf')]
+    stats = DSRequestHandler.stats
+    try:
+        with context.cover_it(cov):
+            cache_dir = ctx.get_out_path('cache')
+            dl = Downloader(cache_dir, workers=4, per_host=2)
+            res = dl.fetch_all(urls)
+            dl.close()
+            assert res[urls[3]] == (None, 'Failed with status 404')
+            for url in urls[:3]:
+                with open(res[url][0], 'rb') as f:
+                    assert f.read() == DSRequestHandler.files['/'+os.path.basename(url)]
+            assert stats['200'] == 3 and stats['304'] == 0
+            assert stats['max_active'] <= 2
+            # Another run, the server says the files didn't change
+            dl = Downloader(cache_dir, workers=4, per_host=2)
+            res2 = dl.fetch_all(urls)
+            dl.close()
+            assert res2 == res
+            assert stats['200'] == 3 and stats['304'] == 3
+            # A file changed
+            DSRequestHandler.files['/a.pdf'] = b'PDF A2'
+            dl = Downloader(cache_dir)
+            fname, error = dl.fetch(urls[0])
+            dl.close()
+            assert error is None
+            with open(fname, 'rb') as f:
+                assert f.read() == b'PDF A2'
+            assert stats['200'] == 4
+            # Trim the cache: `b` is old, `c` is the least recently used and `a` fits
+            data = {u: dl._entry(u) for u in urls[:3]}
+            now = time.time()
+            os.utime(data[urls[1]][1], (now-10*24*3600, now-10*24*3600))
+            os.utime(data[urls[2]][1], (now-3600, now-3600))
+            dl = Downloader(cache_dir, max_size=len(b'PDF A2'), max_age=24*3600)
+            dl.close()
+            assert [os.path.isfile(data[u][0]) for u in urls[:3]] == [True, False, False]
+            assert [os.path.isfile(data[u][1]) for u in urls[:3]] == [True, False, False]
+            # Can't store in the cache: we still get the file, removed when closing
+            dl = Downloader(cache_dir)
+            dl.cache_dir = os.path.join(cache_dir, 'missing')
+            fname, error = dl.fetch(urls[1])
+            assert error is None and not fname.startswith(cache_dir)
+            with open(fname, 'rb') as f:
+                assert f.read() == b'PDF B'
+            dl.close()
+            assert not os.path.isfile(fname)
+            # The server says not modified, but we don't have it
+            dl = Downloader(cache_dir)
+            dl._get_requests = lambda url, headers: (304, None, None, None, None)
+            assert dl.fetch(urls[2])[0] is None
+            dl.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.indep
+def test_sexp_fast_parser():
+    with context.cover_it(cov):
+        # Both parsers must generate the same tree
+        for name in ('kicad_8/light_control.kicad_sch', 'kicad_8/light_control.kicad_pcb'):
+            with open(os.path.join(os.path.dirname(__file__), '..', 'board_samples', name), 'rt') as f:
+                text = f.read()
+            assert FastParser(text).parse() == Parser(text).parse()
+        # Special cases
+        text = '(a "b\\"c" 1 -2.5 1e3 nil t inf) ; comment\n'
+        assert FastParser(text).parse() == Parser(text).parse()
+        # Symbols are interned
+        res = sexpdata.parse('(at 1 2) (at 3 4)')
+        assert res[0][0] is res[1][0]
+        # Not supported by the fast parser, but still parsed
+        assert sexpdata.parse("(a 'b)") == Parser("(a 'b)").parse()
+        assert sexpdata.parse('(a [b])')[0][0] == Symbol('a')
+
+
+@pytest.mark.indep
+def test_sexp_index():
+    with context.cover_it(cov):
+        text = '(sch (lib (symbol "a") (symbol "b")) (wire 1) (symbol "c") (wire 2) ())'
+        indexed = sexpdata.parse(text)
+        plain = Parser(text).parse()
+        assert isinstance(indexed[0], SExpList)
+        for path in ('sch/wire', 'sch/symbol', 'sch/lib/symbol', 'sch/none', 'none/symbol'):
+            res_i = sexp_iter(indexed, path)
+            res_p = sexp_iter(plain, path)
+            assert (res_i is None and res_p is None) or list(res_i) == list(res_p)
+        root = indexed[0]
+        assert root.positions('wire') == [2, 4]
+        # Changes must invalidate the index
+        root.append([Symbol('wire'), 3])
+        assert len(root.find_all('wire')) == 3
+        root.pop()
+        root.append([Symbol('bus'), 1])
+        assert len(root.find_all('wire')) == 2
+        root[2] = [Symbol('bus'), 2]
+        assert root.find_all('bus') == [[Symbol('bus'), 2], [Symbol('bus'), 1]]
+        # Copies don't share the index
+        assert copy.deepcopy(root).find_all('bus') == root.find_all('bus')
+
+
+class FakeGroupingComp(object):
+    def __init__(self, rnd, n):
+        self.ref = 'R'+str(rnd.randint(1, n))
+        self.project = rnd.choice(['', 'p2'])
+        self.fitted = rnd.random() < 0.8
+        self.fixed = rnd.random() < 0.1
+        self.value = rnd.choice(['10k', '10K', '10000', '~', '', 'conn', '1uF'])
+        self.value_sort = self.value.lower() if self.value[:1] == '1' and rnd.random() < 0.7 else None
+        self.lib = rnd.choice(['Device', 'Connector'])
+        self.name = rnd.choice(['R', 'r_small', 'C', 'cap', 'X'])
+        self.fields = {k: rnd.choice(['', 'A', 'a', 'B']) for k in ('footprint', 'voltage', 'alt')}
+
+    def get_field_value(self, field):
+        return self.fields.get(field, '')
+
+
+@pytest.mark.indep
+def test_bom_groups_index():
+    """ The indexed grouping must give the same result we get comparing against all the groups """
+    with context.cover_it(cov):
+        rnd = random.Random(1)
+        for _ in range(500):
+            cfg = type('FakeBoMCfg', (object, ), {})()
+            cfg.group_fields = rnd.choice([[], ['value'], ['part', 'value', 'footprint', 'voltage'], ['footprint', 'value']])
+            cfg.group_fields_fallbacks = [rnd.choice(['', '', 'alt']) for _ in cfg.group_fields]
+            cfg.merge_blank_fields = rnd.random() < 0.5
+            cfg.merge_both_blank = rnd.random() < 0.5
+            cfg.group_not_fitted = rnd.random() < 0.5
+            cfg.group_connectors = rnd.random() < 0.5
+            cfg.component_aliases = [['r', 'r_small', 'res', 'resistor'], ['c', 'c_small', 'cap', 'capacitor']]
+            n = rnd.randint(1, 40)
+            comps = [FakeGroupingComp(rnd, n) for _ in range(n)]
+            # Pairwise comparison
+            ref_groups = []
+            for c in comps:
+                for g in ref_groups:
+                    if g.match_component(c):
+                        g.add_component(c)
+                        break
+                else:
+                    g = ComponentGroup(cfg)
+                    g.add_component(c)
+                    ref_groups.append(g)
+            index = GroupsIndex(cfg)
+            for c in comps:
+                index.add(c)
+            assert [g.components for g in index.groups] == [g.components for g in ref_groups]
+
+
+class FakeCachedOutput(Optionable):
+    def __init__(self, name, out_dir):
+        super().__init__()
+        self.name = name
+        self.type = 'fake'
+        self.value = 1
+        self._cacheable = True
+        self._out_dir = out_dir
+
+    def get_output_dependencies(self, names):
+        return set()
+
+    def get_targets(self, out_dir):
+        return [os.path.join(out_dir, self.name+'.txt')]
+
+    def get_dependencies(self):
+        return [GS.pcb_file]
+
+
+@pytest.mark.indep
+def test_outputs_cache(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        out_dir = ctx.get_out_path('out')
+        os.makedirs(out_dir, exist_ok=True)
+        monkeypatch.setattr(GS, 'global_cache_outputs_dir', ctx.get_out_path('cache'))
+        monkeypatch.setattr(GS, 'global_cache_outputs_size', 1)
+        monkeypatch.setattr(GS, 'pcb_file', os.path.join(out_dir, 'fake.kicad_pcb'))
+        monkeypatch.setattr(GS, 'sch_file', None)
+        monkeypatch.setattr(GS, 'pro_file', None)
+        monkeypatch.setattr(GS, 'sch', None)
+        with open(GS.pcb_file, 'wt') as f:
+            f.write('(kicad_pcb)')
+        out = FakeCachedOutput('o1', out_dir)
+        key, targets = outputs_cache.get_key(out, out_dir)
+        assert targets == ['o1.txt']
+        assert not outputs_cache.restore(key, out_dir)
+        with open(os.path.join(out_dir, 'o1.txt'), 'wt') as f:
+            f.write('hello')
+        outputs_cache.store(key, targets, out_dir, out.name)
+        os.remove(os.path.join(out_dir, 'o1.txt'))
+        assert outputs_cache.restore(key, out_dir)
+        with open(os.path.join(out_dir, 'o1.txt'), 'rt') as f:
+            assert f.read() == 'hello'
+        # Changes in the options or the PCB must change the key
+        out.value = 2
+        assert outputs_cache.get_key(out, out_dir)[0] != key
+        out.value = 1
+        assert outputs_cache.get_key(out, out_dir)[0] == key
+        with open(GS.pcb_file, 'wt') as f:
+            f.write('(kicad_pcb 2)')
+        assert outputs_cache.get_key(out, out_dir)[0] != key
+        # Entries are removed when we exceed the size
+        big = FakeCachedOutput('big', out_dir)
+        with open(os.path.join(out_dir, 'big.txt'), 'wt') as f:
+            f.write('x'*(2 << 20))
+        outputs_cache.store(*outputs_cache.get_key(big, out_dir), out_dir, big.name)
+        assert not outputs_cache.restore(key, out_dir)
+
+
+@pytest.mark.indep
+def test_3d_models_index(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        models_dir = os.path.abspath(ctx.get_out_path('models'))
+        os.makedirs(models_dir, exist_ok=True)
+        with open(os.path.join(models_dir, 'a.step'), 'wt') as f:
+            f.write('3D')
+        monkeypatch.setattr(GS, 'pcb_dir', models_dir)
+        monkeypatch.setattr(KiConf, 'kicad_env', {'MY3D': models_dir})
+        monkeypatch.setattr(KiConf, 'aliases_3D', {})
+        monkeypatch.setattr(KiConf, 'fp_aliases', {})
+        calls = []
+        ori_do_expand_env = out_base_3d.do_expand_env
+        monkeypatch.setattr(out_base_3d, 'do_expand_env', lambda *args: calls.append(args) or ori_do_expand_env(*args))
+        o = Base3DOptions()
+        o._tmp_dir = ctx.get_out_path('store')
+        keys = {('${MY3D}/a.step', 'lib1'), ('${MY3D}/a.step', 'lib2'), ('${MY3D}/b.step', 'lib1')}
+        res = o.resolve_models(keys, False)
+        assert len(calls) == 3
+        assert res[('${MY3D}/a.step', 'lib1')] == (os.path.join(models_dir, 'a.step'), False, False, True)
+        assert not res[('${MY3D}/b.step', 'lib1')][3]
+        # Next run: only the missing model is solved again
+        calls.clear()
+        assert o.resolve_models(keys, False) == res
+        assert len(calls) == 1
+        # A change in the environment invalidates the index
+        KiConf.kicad_env = {'MY3D': ctx.get_out_path('other')}
+        calls.clear()
+        o.resolve_models(keys, False)
+        assert len(calls) == 3
+
+
+@pytest.mark.indep
+@pytest.mark.skipif(context.ki5(), reason="Only KiCad 6+ schematics are cached")
+def test_sch_cache(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        monkeypatch.setattr(GS, 'global_cache_schematics', True)
+        monkeypatch.setattr(GS, 'global_cache_schematics_dir', ctx.get_out_path('cache'))
+        monkeypatch.setattr(GS, 'global_time_reformat', False)
+        monkeypatch.setattr(GS, 'pro_file', None)
+        # Copy the hierarchy, sub-sheet.kicad_sch is used twice
+        sch_dir = ctx.get_out_path('sch')
+        os.makedirs(sch_dir, exist_ok=True)
+        for f in ('test_v5.kicad_sch', 'sub-sheet.kicad_sch', 'deeper.kicad_sch'):
+            shutil.copy2(os.path.join(ctx.get_board_dir(), f), sch_dir)
+        fname = os.path.join(sch_dir, 'test_v5.kicad_sch')
+
+        def summary(sch):
+            return ([(c.ref, c.sheet_path, c.sheet_path_h, c.value) for c in sch.get_components()],
+                    sorted(sch.sheet_paths.keys()), [(s.sheet_path_h, s.sheet) for s in sch.all_sheets])
+
+        ref = summary(load_any_sch(fname, 'test_v5'))
+        loaded = []
+        ori_load = SchematicV6.load
+        monkeypatch.setattr(SchematicV6, 'load', lambda *args, **kw: loaded.append(args[1]) or ori_load(*args, **kw))
+        sch = load_any_sch(fname, 'test_v5')
+        assert not loaded
+        assert summary(sch) == ref
+        # Any change in a sub-sheet invalidates the entry
+        with open(os.path.join(sch_dir, 'deeper.kicad_sch'), 'at') as f:
+            f.write('\n')
+        assert summary(load_any_sch(fname, 'test_v5')) == ref
+        assert len(loaded) == 5
+
+
+@pytest.mark.indep
+@pytest.mark.skipif(context.ki5(), reason="Only for KiCad 6+ schematics")
+def test_sch_parallel_load(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        monkeypatch.setattr(GS, 'global_time_reformat', False)
+        monkeypatch.setattr(GS, 'pro_file', None)
+        fname = os.path.join(ctx.get_board_dir(), 'test_v5.kicad_sch')
+        # sub-sheet.kicad_sch is used twice, but parsed once
+        files = find_sheet_files(fname)
+        assert sorted(map(os.path.basename, files)) == ['deeper.kicad_sch', 'sub-sheet.kicad_sch', 'test_v5.kicad_sch']
+
+        def summary(sch):
+            return ([(c.ref, c.sheet_path, c.sheet_path_h, c.value) for c in sch.get_components()],
+                    sorted(sch.sheet_paths.keys()), [(s.sheet_path_h, s.sheet) for s in sch.all_sheets])
+
+        ref = SchematicV6()
+        ref.load(fname, 'test_v5')
+        sch = SchematicV6()
+        sch.load(fname, 'test_v5', jobs=2)
+        assert summary(sch) == summary(ref)
+        # Each instance has its own objects
+        s1, s2 = [s.sheet for s in sch.sheets]
+        assert s1.fname == s2.fname and s1.symbols[0] is not s2.symbols[0]
+        # sch_parse_jobs: 0 means all the CPUs, not serial
+        jobs_used = []
+        orig_parse_sheets = v6_sch.parse_sheets
+
+        def spy_parse_sheets(fname, jobs):
+            jobs_used.append(jobs)
+            return orig_parse_sheets(fname, jobs)
+
+        monkeypatch.setattr(v6_sch, 'parse_sheets', spy_parse_sheets)
+        monkeypatch.setattr(GS, 'global_cache_schematics', False)
+        monkeypatch.setattr(GS, 'global_sch_parse_jobs', 0)
+        assert summary(load_any_sch(fname, 'test_v5')) == summary(ref)
+        assert jobs_used == [0]
+
+
+@pytest.mark.indep
+def test_compress_zip_workers(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        src = ctx.get_out_path('src')
+        os.makedirs(os.path.join(src, 'sub'), exist_ok=True)
+        files = OrderedDict()
+        for n in range(12):
+            fname = os.path.join(src, 'sub' if n % 2 else '', 'f{}.{}'.format(n, 'png' if n % 3 == 0 else 'gbr'))
+            with open(fname, 'wb') as f:
+                f.write(('G01 X{0} Y{0}\n'.format(n)*(n*5000)).encode())
+            files[fname] = os.path.relpath(fname, src)
+        for workers in (1, 3, 'fallback'):
+            o = CompressOptions()
+            o.workers = workers
+            if workers == 'fallback':
+                # Without the zipfile internals we use the standard path
+                monkeypatch.delattr(zipfile, '_get_compressor')
+                o.workers = 3
+            output = ctx.get_out_path('test_{}.zip'.format(workers))
+            o.create_zip(output, files)
+            with ZipFile(output) as z:
+                assert z.testzip() is None
+                assert [i.filename for i in z.infolist()] == list(files.values())
+                for fname, dest in files.items():
+                    info = z.getinfo(dest)
+                    assert info.compress_type == (ZIP_STORED if dest.endswith('.png') else ZIP_DEFLATED)
+                    with open(fname, 'rb') as f:
+                        assert z.read(dest) == f.read()
+
+
+@pytest.mark.indep
+def test_pcb_print_merge_pages(test_dir, monkeypatch):
+    """ Merging the pages in parallel must give the same pages, in the same order """
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+
+        def fake_merge_page(self, pp):
+            # Stand-in for the layers merge and the PDF conversion
+            with open(pp.file, 'wt') as f:
+                f.write('{} {}'.format(pp.page, os.getpid()))
+
+        monkeypatch.setattr(PCB_PrintOptions, 'merge_page', fake_merge_page)
+        results = {}
+        for jobs in (1, 3):
+            out_dir = ctx.get_out_path('pages_{}'.format(jobs))
+            os.makedirs(out_dir, exist_ok=True)
+            pages = [PlottedPage('page{}'.format(n), out_dir, out_dir, [], '', os.path.join(out_dir, '{}.svg'.format(n)),
+                                 None, []) for n in range(5)]
+            o = PCB_PrintOptions()
+            o.parallel_pages = jobs
+            o.merge_pages(pages)
+            results[jobs] = []
+            for pp in pages:
+                with open(pp.file, 'rt') as f:
+                    results[jobs].append(f.read().split())
+        assert [page for page, _ in results[1]] == [page for page, _ in results[3]] == ['page{}'.format(n) for n in range(5)]
+        assert all(int(pid) == os.getpid() for _, pid in results[1])
+        if sys.platform != 'win32':
+            assert all(int(pid) != os.getpid() for _, pid in results[3])
+
+
+@pytest.mark.indep
+def test_create_pdf_from_pages(test_dir):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        src = os.path.join(ctx.get_board_dir(), '..', '..', 'reference', '8_0_0', 'PCB_Bot.pdf')
+        output = ctx.get_out_path('joined.pdf')
+        create_pdf_from_pages([src]*3, output, forced_width=600)
+        with open(src, 'rb') as f:
+            page = PyPDF2.PdfFileReader(f).getPage(0)
+            data = page.getContents().getData()
+        with open(output, 'rb') as f:
+            pdf = PyPDF2.PdfFileReader(f)
+            assert pdf.getNumPages() == 3
+            for n in range(3):
+                page = pdf.getPage(n)
+                assert abs(float(page.mediaBox.getWidth())*25.4/72-600) < 0.1
+                # Scaled, but the original content stream is copied verbatim
+                contents = page['/Contents']
+                assert len(contents) == 3 and contents[1].getObject().getData() == data
+        # The resources are shared by the 3 pages
+        assert os.path.getsize(output) < os.path.getsize(src)*1.5
+
+
+@pytest.mark.indep
+def test_kiri_reuse_renders(test_dir, monkeypatch):
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        repo = os.path.abspath(ctx.get_out_path('repo'))
+        os.makedirs(repo)
+        pcb = os.path.join(repo, 'b.kicad_pcb')
+        sch = os.path.join(repo, 'b.kicad_sch')
+        git = ['git', '-C', repo, '-c', 'user.name=KiBot', '-c', 'user.email=kibot@example.com']
+        subprocess.run(git+['init', '-q'], check=True)
+
+        def commit(pcb_txt, sch_txt):
+            for fname, txt in ((pcb, pcb_txt), (sch, sch_txt)):
+                with open(fname, 'wt') as f:
+                    f.write(txt)
+            subprocess.run(git+['add', '.'], check=True)
+            subprocess.run(git+['commit', '-q', '--allow-empty', '-m', 'x'], check=True)
+            return subprocess.run(git+['rev-parse', 'HEAD'], check=True, capture_output=True, text=True).stdout.strip()
+
+        c1 = commit('pcb1', 'sch1')
+        c2 = commit('pcb1', 'sch2')
+        c3 = commit('pcb2', 'sch2')
+        c4 = commit('pcb1', 'sch1')
+        monkeypatch.setattr(GS, 'pcb_file', pcb)
+        monkeypatch.setattr(GS, 'pro_file', None)
+        o = KiRiOptions()
+        o.git_command = 'git'
+        o.repo_dir = repo
+        o.cache_dir = os.path.abspath(ctx.get_out_path('cache'))
+        # Newest first, like git log
+        renders, reuses = o.plan_renders([[c4], [c3], [c2], [c1]], [sch])
+        assert renders == [(c4, True, True), (c3, True, True)]
+        assert reuses == [(c2, c4, c3), (c1, c4, c4)]
+        # Fake renders
+        for h in (c4, c3):
+            for kind, index in (('pcb', 'pcb_layers'), ('sch', 'sch_sheets')):
+                d = os.path.join(o.cache_dir, h[:7], '_KIRI_')
+                os.makedirs(os.path.join(d, kind))
+                for fname in (os.path.join(d, kind, 'image.svg'), os.path.join(d, index)):
+                    with open(fname, 'wt') as f:
+                        f.write(kind+h)
+        for r in reuses:
+            o.reuse_render(*r)
+        for h, pcb_src, sch_src in reuses:
+            for kind, index, src in (('pcb', 'pcb_layers', pcb_src), ('sch', 'sch_sheets', sch_src)):
+                d = os.path.join(o.cache_dir, h[:7], '_KIRI_')
+                for fname in (os.path.join(d, kind, 'image.svg'), os.path.join(d, index)):
+                    with open(fname, 'rt') as f:
+                        assert f.read() == kind+src
+
+
+@pytest.mark.indep
+def test_fp_snapshot(test_dir):
+    ctx = context.TestContext(test_dir, 'light_control', 'empty_zip', '')
+    with context.cover_it(cov):
+        GS.set_pcb(ctx.board_file)
+        GS.board = None
+        load_board()
+        fps = get_fp_snapshot()
+        # Created once
+        assert get_fp_snapshot() is fps
+        modules = list(GS.get_modules())
+        assert len(fps) == len(modules)
+        for i, m in enumerate(modules):
+            assert fps.refs[i] == m.GetReference()
+            assert fps.values[i] == m.GetValue()
+            assert fps.fp_names[i] == str(m.GetFPID().GetLibItemName())
+            assert (fps.x[i], fps.y[i]) == (GS.get_center(m).x, GS.get_center(m).y)
+            assert fps.rotations[i] == m.GetOrientationDegrees()
+            assert fps.bottom[i] == m.IsFlipped()
+            assert fps.attrs[i] == m.GetAttributes()
+            assert fps.pad_counts[i] == m.GetPadCount()
+            assert (fps.widths[i], fps.heights[i]) == GS.get_fp_size(m)
+        # Discarded when the PCB is loaded again
+        load_board(forced=True)
+        assert get_fp_snapshot() is not fps
+
+
+@pytest.mark.indep
+def test_report_stats_numpy(test_dir):
+    """ The tracks, vias and pads stats computed using NumPy must be the same we get using loops """
+    np = pytest.importorskip('numpy')
+    ctx = context.TestContext(test_dir, 'light_control', 'empty_zip', '')
+    with context.cover_it(cov):
+        GS.set_pcb(ctx.board_file)
+        GS.board = None
+        load_board()
+        load_actions()
+        track_type = 'TRACK' if GS.ki5 else 'PCB_TRACK'
+        via_type = 'VIA' if GS.ki5 else 'PCB_VIA'
+        tracks = [t.GetWidth() for t in GS.board.GetTracks() if t.GetClass() == track_type]
+        vias = [t.Cast() for t in GS.board.GetTracks() if t.GetClass() == via_type]
+        pads = [p for m in GS.get_modules() for p in m.Pads() if p.GetDrillSize().x]
+        assert pads
+        npth_attrib = 3 if GS.ki5 else pcbnew.PAD_ATTRIB_NPTH
+        # Repeat the data, so we have more than one item of each size
+        via_drills = [v.GetDrill() for v in vias]*3
+        via_widths = [get_via_width(v) for v in vias]*3
+        pads = pads*3
+        pad_data = (pads, [p.GetDrillSize().x for p in pads], [p.GetDrillSize().y for p in pads],
+                    [p.GetAttribute() != npth_attrib for p in pads], [p.GetSize().x for p in pads],
+                    [p.GetSize().y for p in pads], GS.from_mm(0.1))
+        res = []
+        for use_np in (False, True):
+            o = ReportOptions()
+            for k in ('oar_vias', 'oar_vias_ec', 'track', 'oar_pads', 'oar_pads_ec', 'pad_drill', 'pad_drill_real',
+                      'pad_drill_real_ec', 'pad_drill_pth', 'pad_drill_pth_real', 'pad_drill_npth', 'pad_drill_npth_real',
+                      'slot'):
+                setattr(o, k, INF)
+            for k in ('_vias', '_vias_ec', '_tracks_m', '_drills_real', '_drills_ec', '_drills', '_drills_oval'):
+                setattr(o, k, {})
+            if use_np:
+                o.track_stats_np(np, tracks, via_drills, via_widths)
+                o.pad_stats_np(np, *pad_data)
+            else:
+                o.track_stats_py(tracks, via_drills, via_widths)
+                o.pad_stats_py(*pad_data)
+            res.append({k: v for k, v in vars(o).items() if k not in ('_tree', '_parent')})
+        assert res[0] == res[1]
+        assert res[0]['_drills_real']
+
+
+@pytest.mark.indep
+def test_timings(test_dir):
+    """ The --timings JSON and the --profile stats """
+    ctx = context.TestContext(test_dir, 'light_control', 'empty_zip', '')
+    fname = ctx.get_out_path('timings.json')
+    prof_dir = ctx.get_out_path('profile')
+    with context.cover_it(cov):
+        timings.init(fname, prof_dir)
+        try:
+            with timings.measure('preflight', 'update_xml', stage='run'):
+                pass
+            with timings.measure('output', 'pdf/1', type='pcb_print'):
+                with timings.command(['/usr/bin/kicad-cli', 'pcb', 'export', 'pdf', '-o', 'x.pdf', 'b.kicad_pcb']):
+                    subprocess.run(['true'])
+                with timings.command('gs -q'):
+                    pass
+                # Outputs can run other outputs, only one profiler can be active (Python 3.12+)
+                with timings.measure('output', 'inner', type='svg'):
+                    pass
+            # Data from a worker
+            mark = timings.mark()
+            with timings.command(['gs', '-sDEVICE=png16m']):
+                pass
+            worker = timings.since(mark)
+            assert worker[0] == [] and list(worker[1].keys()) == ['gs'] and worker[1]['gs'][0] == 1
+            # Here the worker is the same process, so this command is counted twice
+            timings.merge(worker)
+            timings.write()
+        finally:
+            timings.init(None, None)
+    # init() discards the collected data
+    assert timings.mark() == (0, {})
+    with open(fname, 'rt') as f:
+        data = json.load(f)
+    assert data['version'] == 2
+    assert [(e['name'], e['stage']) for e in data['preflights']] == [('update_xml', 'run')]
+    inner, out = data['outputs']
+    assert inner['name'] == 'inner' and 'profile' not in inner
+    assert out['name'] == 'pdf/1' and out['type'] == 'pcb_print'
+    if 'process_max_rss' in out:
+        assert out['max_rss_growth'] >= 0 and out['process_max_rss'] >= out['max_rss_growth']
+    assert set(out['commands'].keys()) == {'kicad-cli pcb export pdf', 'gs'}
+    assert os.path.isfile(out['profile']) and os.path.dirname(out['profile']) == os.path.abspath(prof_dir)
+    assert data['commands']['gs']['count'] == 3
+    assert data['commands']['kicad-cli pcb export pdf']['count'] == 1
+    ctx.clean_up()
+
+
+def _filter_comp(ref, value, fields={}):
+    c = SchematicComponent()
+    c.ref = c.f_ref = ref
+    c.ref_prefix = ref.rstrip('0123456789')
+    c.value = value
+    fields = dict({'Reference': ref, 'Value': value, 'Footprint': '', 'Datasheet': ''}, **fields)
+    for n, (name, val) in enumerate(fields.items()):
+        f = SchematicField()
+        f.name = name
+        f.value = val
+        f.number = n
+        c.add_field(f)
+    return c
+
+
+@pytest.mark.indep
+def test_filters_pipeline():
+    """ Compiled generic filters applied to the whole list and the memoized results """
+    with context.cover_it(cov):
+        load_actions()
+        comps = [_filter_comp('R1', '10k'), _filter_comp('TP1', 'TestPoint'), _filter_comp('C1', 'DNF'),
+                 _filter_comp('U1', 'LM358', {'Config': 'opt1,no_asm'}), _filter_comp('#PWR1', 'GND')]
+        mech = BaseFilter.solve_filter('_mechanical', 'test')
+        dnf = BaseFilter.solve_filter('_kibom_dnf_Config', 'test')
+        fil = MultiFilter([mech, dnf], False)
+        expected = [True, False, False, True, False]
+        assert fil.filter_list(comps) == expected
+        assert [fil.filter(c) for c in comps] == expected
+        # Memoized across filter chains using the same filters
+        fil_base._memo.clear()
+        reset_filters(comps)
+        apply_exclude_filter(comps, fil)
+        assert [c.included for c in comps] == expected
+        assert len(fil_base._memo) == 1
+        reset_filters(comps)
+        apply_exclude_filter(comps, MultiFilter([mech, dnf], False))
+        assert [c.included for c in comps] == expected
+        assert len(fil_base._memo) == 1
+        # Changed after the reset (i.e. by a transform filter), we can't use the memoized results
+        reset_filters(comps)
+        comps[0].value = 'DNF'
+        comps[0].pristine = False
+        apply_exclude_filter(comps, fil)
+        assert not comps[0].included
+        assert len(fil_base._memo) == 1
+
+
+def test_scheduler_error_level():
+    """ Workers killed by a signal have a negative exit code, we must use a valid error level """
+    assert error_level(BOM_ERROR) == BOM_ERROR
+    assert error_level(-9) == FAILED_EXECUTE
+
+
+@pytest.mark.indep
+def test_diff_render_cache(test_dir):
+    """ Keys used for the persistent cache of the diff output, and its trimming """
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    with context.cover_it(cov):
+        o = DiffOptions()
+        o.pcb = False
+        o.zones = 'none'
+        o._tools_versions = [(2, 6, 0), (2, 3, 10)]
+        key = o.get_render_key()
+        assert o.get_render_key() == key
+        o._tools_versions = [(2, 6, 1), (2, 3, 10)]
+        assert o.get_render_key() != key
+        o.only_first_sch_page = True
+        key2 = o.get_render_key()
+        assert key2 != key
+        # The files are identified using their git blob id
+        fname = ctx.get_out_path('a.kicad_sch')
+        content = b'(kicad_sch)'
+        with open(fname, 'wb') as f:
+            f.write(content)
+        o._git_clean_dir = None
+        o._render_key = key
+        blob = hashlib.sha1(b'blob %d\0' % len(content)+content).hexdigest()
+        digest = o.get_digest([fname])
+        assert digest == hashlib.sha1(key.encode()+blob.encode()).hexdigest()
+        assert o.get_digest([fname]) == digest
+        o._render_key = key2
+        assert o.get_digest([fname]) != digest
+        # Reused entries are marked as recently used
+        cache_dir = o.cache_dir = ctx.get_out_path('diff_cache')
+        now = time.time()
+        for n, age in enumerate((1, 200, 2, 3)):
+            entry = os.path.join(cache_dir, 'e{}'.format(n))
+            os.makedirs(entry)
+            with open(os.path.join(entry, 'render.png'), 'wb') as f:
+                f.write(b'x'*1000)
+            os.utime(entry, (now-age*24*3600, now-age*24*3600))
+        o.touch_cache_entry('e3')
+        # e1 is too old, e2 is the least recently used
+        out_diff.trim(cache_dir, 2000, 100*24*3600)
+        assert sorted(os.listdir(cache_dir)) == ['e0', 'e3']